@@ -3,7 +3,7 @@ import os
 # Qt import
 from PySide.QtGui import QMessageBox
 # Maya import
-from maya import cmds
+from maya import cmds, OpenMaya as om
 # custom import
 from mttConfig import WINDOW_TITLE, MTTSettings, WS_KEY
 
@@ -46,6 +46,28 @@ def get_attr(node, attr, default_value=None):
         return default_value
 
 
+def get_attr_values(nodes, attr):
+    """ Return string value of attr for each node, in nodes order
+
+    Nodes are resolved through a single MSelectionList instead of one
+    cmds.getAttr call per node.
+
+    :param nodes: (list) node names
+    :param attr: (string) string attribute name
+    """
+    sel = om.MSelectionList()
+    for node in nodes:
+        sel.add(node)
+
+    values = []
+    m_node = om.MObject()
+    for i in xrange(sel.length()):
+        sel.getDependNode(i, m_node)
+        values.append(om.MFnDependencyNode(m_node).findPlug(attr).asString())
+
+    return values
+
+
 def set_attr(node, attr, value, attr_type=None):
     attr_name = '{}.{}'.format(node, attr)
     state = cmds.getAttr(attr_name, lock=True)
@@ -5,6 +5,8 @@ import os
 from PySide.QtCore import QSettings
 # Maya import
 from maya import cmds
+# Custom import
+from mttPathResolver import DEFAULT_RULES, RESOLVE_RULES
 
 
 WINDOW_DOCK_NAME = 'dbMayaTextureToolkitDock'
@@ -20,16 +22,27 @@ CREATE_NODE_TITLE = 'MTT Create Node'
 TAG = 'MTT'
 WS_KEY = '<WORKSPACE>'
 
-COLUMN_COUNT = 6
-NODE_NAME, NODE_TYPE, NODE_REFERENCE, FILE_STATE, FILE_COUNT, NODE_FILE = range(
-    COLUMN_COUNT)
+COLUMN_COUNT = 14
+(NODE_NAME, NODE_TYPE, NODE_REFERENCE, FILE_STATE, FILE_COUNT, NODE_FILE,
+    FILE_TILES, IMAGE_WIDTH, IMAGE_HEIGHT, IMAGE_CHANNELS, IMAGE_DEPTH,
+    IMAGE_FORMAT, FILE_SIZE, FILE_CONTENT) = range(COLUMN_COUNT)
+IMAGE_COLUMNS = (IMAGE_WIDTH, IMAGE_HEIGHT, IMAGE_CHANNELS, IMAGE_DEPTH,
+                 IMAGE_FORMAT, FILE_SIZE)
 VIEW_COLUMN_LABEL = {
     NODE_NAME: 'Node Name',
     NODE_TYPE: 'Type',
     NODE_REFERENCE: 'R',
     FILE_STATE: 'W',
     FILE_COUNT: '#',
-    NODE_FILE: 'File'
+    NODE_FILE: 'File',
+    FILE_TILES: 'Tiles',
+    IMAGE_WIDTH: 'W',
+    IMAGE_HEIGHT: 'H',
+    IMAGE_CHANNELS: 'Ch',
+    IMAGE_DEPTH: 'Bits',
+    IMAGE_FORMAT: 'Format',
+    FILE_SIZE: 'Size',
+    FILE_CONTENT: 'Content'
 }
 VIEW_COLUMN_CONTEXT = {
     NODE_NAME: 'Node Name',
@@ -37,7 +50,15 @@ VIEW_COLUMN_CONTEXT = {
     NODE_REFERENCE: 'Reference',
     FILE_STATE: 'Writable',
     FILE_COUNT: '# Instance Count',
-    NODE_FILE: 'File'
+    NODE_FILE: 'File',
+    FILE_TILES: 'Tile Count',
+    IMAGE_WIDTH: 'Image Width',
+    IMAGE_HEIGHT: 'Image Height',
+    IMAGE_CHANNELS: 'Channel Count',
+    IMAGE_DEPTH: 'Bit Depth',
+    IMAGE_FORMAT: 'Image Format',
+    FILE_SIZE: 'File Size',
+    FILE_CONTENT: 'Duplicate Content'
 }
 VIEW_COLUMN_SIZE = {
     NODE_NAME: 150,
@@ -45,7 +66,15 @@ VIEW_COLUMN_SIZE = {
     NODE_REFERENCE: 20,
     FILE_STATE: 20,
     FILE_COUNT: 20,
-    NODE_FILE: 200
+    NODE_FILE: 200,
+    FILE_TILES: 40,
+    IMAGE_WIDTH: 45,
+    IMAGE_HEIGHT: 45,
+    IMAGE_CHANNELS: 25,
+    IMAGE_DEPTH: 30,
+    IMAGE_FORMAT: 60,
+    FILE_SIZE: 60,
+    FILE_CONTENT: 80
 }
 DB_COLUMN_LABEL = {
     NODE_NAME: 'Name',
@@ -53,7 +82,15 @@ DB_COLUMN_LABEL = {
     NODE_REFERENCE: 'IsRef',
     FILE_STATE: 'State',
     FILE_COUNT: 'InstanceCount',
-    NODE_FILE: 'Attribute'
+    NODE_FILE: 'Attribute',
+    FILE_TILES: 'TileCount',
+    IMAGE_WIDTH: 'Width',
+    IMAGE_HEIGHT: 'Height',
+    IMAGE_CHANNELS: 'Channels',
+    IMAGE_DEPTH: 'BitDepth',
+    IMAGE_FORMAT: 'Format',
+    FILE_SIZE: 'FileSize',
+    FILE_CONTENT: 'ContentHash'
 }
 
 (PROMPT_INSTANCE_ASK, PROMPT_INSTANCE_WAIT, PROMPT_INSTANCE_SESSION,
@@ -87,6 +124,7 @@ DEFAULT_VALUES = {
     'autoReload': False,
     'autoRename': False,
     'onlyWritableState': False,
+    'onlyDuplicateState': False,
     'onlySelectionState': False,
     'viewerState': False,
     'Viewer/isFloating': False,
@@ -99,6 +137,32 @@ DEFAULT_VALUES = {
     'filterFocus': False,
     'filterRE': False,
     'filterType': 0,
+    'fileStateCacheTTL': 5,
+    'fileStateWorkers': 8,
+    'virtualRowsThreshold': 50000,
+    'virtualRowsPageSize': 500,
+    'imageInfoWorkers': 4,
+    'contentHashWorkers': 0,
+    'relinkWorkers': 0,
+    'columnVisibility_7': False,
+    'columnVisibility_8': False,
+    'columnVisibility_9': False,
+    'columnVisibility_10': False,
+    'columnVisibility_11': False,
+    'columnVisibility_12': False,
+    'columnVisibility_13': False,
+    'sceneCache': False,
+    'sceneCacheMaxEntries': 20,
+    'sceneCacheMaxAge': 30,
+    'nodeEventDelay': 100,
+    'fileReloadDelay': 500,
+    'fileReloadMaxWait': 10,
+    'fileWatchLimit': 4096,
+    'nativeFileWatch': False,
+    'pollingFileWatch': False,
+    'pollInterval': 2,
+    'pollMaxInterval': 30,
+    'pollCpuBudget': 10,
     'powerUser': False,
     'suspendCallbacks': False,
     'suspendRenameCallbacks': False,
@@ -106,6 +170,8 @@ DEFAULT_VALUES = {
     'FilterFileDialog/bookmarks': '',
     'filterQuickWordsWildcard': '',
     'filterQuickWordsRegExp': '',
+    'exportExtraColumns': '',
+    'relinkRoots': '',
     'filterGroup': True,
     'visibilityGroup': True,
     'folderGroup': True,
@@ -120,20 +186,30 @@ BOOL_VALUES_KEYS = (
     'showNamespaceState', 'filterInstances', 'forceRelativePath',
     'browserFirstStart',
     'autoSelect', 'autoReload', 'autoRename',
-    'onlyWritableState', 'onlySelectionState', 'viewerState',
+    'onlyWritableState', 'onlyDuplicateState', 'onlySelectionState',
+    'viewerState',
     'Viewer/isFloating', 'Viewer/autoFit', 'Viewer/autoReset',
     'Viewer/autoLock', 'Viewer/premultiply', 'Viewer/recoverMode',
     'switchEdit', 'filterFocus', 'filterRE',
     'powerUser',
     'suspendCallbacks', 'suspendRenameCallbacks',
-    'defaultQuickFilterWords',
+    'defaultQuickFilterWords', 'sceneCache', 'nativeFileWatch',
+    'pollingFileWatch',
     'filterGroup', 'visibilityGroup', 'folderGroup', 'autoGroup', 'toolGroup',
     'mayaGroup',
     'columnVisibility_0', 'columnVisibility_1', 'columnVisibility_2',
     'columnVisibility_3', 'columnVisibility_4', 'columnVisibility_5',
+    'columnVisibility_6', 'columnVisibility_7', 'columnVisibility_8',
+    'columnVisibility_9', 'columnVisibility_10', 'columnVisibility_11',
+    'columnVisibility_12', 'columnVisibility_13',
 )
 INT_VALUES_KEYS = (
-    'filterType',
+    'filterType', 'fileStateCacheTTL', 'fileStateWorkers',
+    'sceneCacheMaxEntries', 'sceneCacheMaxAge', 'nodeEventDelay',
+    'fileReloadDelay', 'fileReloadMaxWait', 'fileWatchLimit',
+    'pollInterval', 'pollMaxInterval', 'pollCpuBudget',
+    'virtualRowsThreshold', 'virtualRowsPageSize', 'imageInfoWorkers',
+    'contentHashWorkers', 'relinkWorkers',
 )
 
 # theme found at http://www.colourlovers.com/ exclude Flashy Theme
@@ -177,6 +253,12 @@ DEFAULT_JSON_CONTENT = '''{
   ],
   "import_policy":"from dbMayaTextureToolkit.mttImportPolicy import exec_import_policy",
   "path_pattern":"E:\\CG_Projects\\Demo_MTT",
+  "path_resolution":{
+    "rules":["absolute", "workspace", "environment", "sourceimages",
+             "custom_roots"],
+    "custom_roots":[
+    ]
+  },
   "VCS": {
     "checkout": "from dbMayaTextureToolkit.mttSourceControlTemplate import checkout",
     "submit": "from dbMayaTextureToolkit.mttSourceControlTemplate import submit",
@@ -194,6 +276,8 @@ class MTTSettings(object):
     CUSTOM_BUTTONS = []
     IMPORT_POLICY = ''
     PATH_PATTERN = '.*'
+    PATH_RULES = DEFAULT_RULES
+    CUSTOM_ROOTS = []
     VCS = {}
 
     def __init__(self):
@@ -260,6 +344,13 @@ class MTTSettings(object):
             # convert string to raw string
             MTTSettings.PATH_PATTERN = ('%r' % json_settings['path_pattern'])[2:-1]
 
+        # get path resolution rules
+        path_resolution = json_settings.get('path_resolution', {})
+        MTTSettings.PATH_RULES = [
+            rule for rule in path_resolution.get('rules', DEFAULT_RULES)
+            if rule in RESOLVE_RULES]
+        MTTSettings.CUSTOM_ROOTS = path_resolution.get('custom_roots', [])
+
         # get VCS commands
         if 'VCS' in json_settings:
             MTTSettings.VCS = json_settings['VCS']
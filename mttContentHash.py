@@ -0,0 +1,280 @@
+# Python import
+import os
+import sqlite3
+from hashlib import md5
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from threading import Lock, Thread, current_thread
+
+
+# bytes read at once, digest updates of big buffers release the GIL so
+# threads hash on all cores
+HASH_CHUNK_SIZE = 1048576
+# bytes hashed to tell same size files apart before hashing them whole
+HEAD_SIZE = 65536
+# digests written to the persistent cache per transaction
+SAVE_CHUNK_SIZE = 200
+
+
+def get_file_digest(file_path, size=None):
+    """ Return md5 hex digest of file_path content, None if unreadable
+
+    :param file_path: (string) file path
+    :param size: (int) bytes hashed from file start, whole file if None
+    """
+    digest = md5()
+    remaining = size
+    try:
+        with open(file_path, 'rb') as f:
+            while remaining is None or remaining > 0:
+                chunk = f.read(HASH_CHUNK_SIZE if remaining is None
+                               else min(HASH_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+    except (IOError, OSError):
+        return None
+
+    return digest.hexdigest()
+
+
+def get_head_digest(file_path):
+    return get_file_digest(file_path, HEAD_SIZE)
+
+
+def _group(values):
+    """ Return dict of key and list of items from (item, key) pairs """
+    groups = dict()
+    for item, key in values:
+        groups.setdefault(key, []).append(item)
+    return groups
+
+
+class MTTContentHashCache(object):
+    """ Content digests of files computed in background
+
+    Only files sharing their size with another requested file are read.
+    Same size files are first told apart by a digest of their first bytes,
+    whole content is hashed only for files still colliding. Digests are
+    stored with the size and modification time they were computed at in a
+    SQLite file, written as hashing goes, so a run interrupted by a restart
+    resumes with the files not hashed yet.
+    """
+
+    def __init__(self, db_path=None, workers=0):
+        """
+        :param db_path: (string) persistent cache file, memory only if None
+        :param workers: (int) hashing threads, processor count if 0
+        """
+        self.db_path = db_path
+        self.workers = workers or cpu_count()
+        # files of last run read from cache and hashed
+        self.hits = 0
+        self.misses = 0
+        # bytes hashed and bytes to hash by current run
+        self.progress = (0, 0)
+        # file path: (size, mtime, digest), loaded by first run
+        self._entries = None
+        self._results = dict()
+        self._requested = None
+        self._is_closed = False
+        self._lock = Lock()
+        self._thread = None
+        # message of the error that stopped last run, see pop_error
+        self._error = None
+
+    @property
+    def is_running(self):
+        return self._thread is not None
+
+    @property
+    def result_count(self):
+        return len(self._results)
+
+    def request(self, file_paths):
+        """ Hash content of file_paths in background
+
+        Results are collected with pop_results: a digest for files having
+        the same size and first bytes as another file, None for the others.
+        A request made while running replaces pending requests and is
+        processed when current run ends.
+
+        :param file_paths: (iterable) paths of files compared together
+        """
+        with self._lock:
+            self._requested = list(file_paths)
+            self._is_closed = False
+            if self._thread is not None:
+                return
+            self._thread = Thread(target=self._run)
+            self._thread.daemon = True
+        self._thread.start()
+
+    def pop_results(self, limit=None):
+        """ Return dict of file path and digest computed since last call
+
+        :param limit: (int) maximum result count, all results if None
+        """
+        with self._lock:
+            if limit is None or len(self._results) <= limit:
+                results, self._results = self._results, dict()
+            else:
+                results = dict()
+                for file_path in self._results.keys()[:limit]:
+                    results[file_path] = self._results.pop(file_path)
+        return results
+
+    def pop_error(self):
+        """ Return message of the error that stopped last run, None if it
+        ended normally
+        """
+        with self._lock:
+            error, self._error = self._error, None
+        return error
+
+    def close(self):
+        """ Stop current run, digests already computed stay on disk """
+        with self._lock:
+            self._is_closed = True
+            self._requested = None
+            self._results.clear()
+
+    def _run(self):
+        db = None
+        try:
+            if self.db_path is not None:
+                folder = os.path.dirname(self.db_path)
+                if folder and not os.path.isdir(folder):
+                    os.makedirs(folder)
+                db = sqlite3.connect(self.db_path)
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS Hashes('
+                    'Path TEXT PRIMARY KEY, Size INTEGER, MTime REAL, '
+                    'Digest TEXT)')
+            if self._entries is None:
+                self._entries = dict()
+                if db is not None:
+                    for data in db.execute(
+                            'SELECT Path, Size, MTime, Digest FROM Hashes'):
+                        self._entries[data[0]] = data[1:]
+
+            while True:
+                with self._lock:
+                    file_paths, self._requested = self._requested, None
+                    if file_paths is None or self._is_closed:
+                        self._thread = None
+                        return
+                self._hash_files(file_paths, db)
+        except (sqlite3.Error, IOError, OSError), e:
+            # Maya commands are not thread safe, error is logged by caller
+            with self._lock:
+                self._error = str(e)
+        finally:
+            if db is not None:
+                db.close()
+            # a new run may have started once requests were exhausted
+            with self._lock:
+                if self._thread is current_thread():
+                    self._thread = None
+
+    def _add_results(self, results):
+        with self._lock:
+            if not self._is_closed:
+                self._results.update(results)
+
+    def _hash_files(self, file_paths, db):
+        self.hits = 0
+        self.misses = 0
+        # files sharing their size with another file
+        signatures = dict()
+        for file_path in set(file_paths):
+            try:
+                file_stat = os.stat(file_path)
+            except (OSError, TypeError, ValueError):
+                continue
+            signatures[file_path] = (file_stat.st_size, file_stat.st_mtime)
+        size_groups = _group(
+            [(file_path, signature[0])
+             for file_path, signature in signatures.iteritems()])
+        self._add_results(dict.fromkeys(
+            [file_path for file_path in file_paths
+             if len(size_groups.get(signatures.get(file_path, (None, ))[0],
+                                    ())) < 2],
+            None))
+
+        # cached digests, heads of groups with files to hash
+        digests = dict()
+        head_paths = []
+        for size, group in size_groups.iteritems():
+            if len(group) < 2:
+                continue
+            for file_path in group:
+                entry = self._entries.get(file_path)
+                if entry is not None and entry[:2] == signatures[file_path]:
+                    digests[file_path] = entry[2]
+            if len(digests.viewkeys() & set(group)) < len(group):
+                head_paths.extend(group)
+        self.hits += len(digests)
+        self._add_results(digests)
+        if not head_paths:
+            return
+
+        pool = ThreadPool(self.workers)
+        try:
+            self._hash_collisions(pool, head_paths, signatures, digests, db)
+        finally:
+            pool.close()
+
+    def _hash_collisions(self, pool, head_paths, signatures, digests, db):
+        heads = pool.map(get_head_digest, head_paths, 16)
+        head_groups = _group(
+            [(file_path, (signatures[file_path][0], head))
+             for file_path, head in zip(head_paths, heads)])
+
+        # files still colliding are hashed whole, biggest first
+        hashed_paths = []
+        unique_paths = []
+        for (size, head), group in head_groups.iteritems():
+            for file_path in group:
+                if file_path in digests:
+                    continue
+                if len(group) < 2 or head is None:
+                    unique_paths.append(file_path)
+                else:
+                    hashed_paths.append(file_path)
+        self._add_results(dict.fromkeys(unique_paths, None))
+        hashed_paths.sort(key=lambda path: signatures[path][0], reverse=True)
+        self.progress = (
+            0, sum([signatures[file_path][0] for file_path in hashed_paths]))
+
+        # queued files are skipped once closed
+        def hash_file(path):
+            return path, None if self._is_closed else get_file_digest(path)
+
+        saved_entries = []
+        for file_path, digest in pool.imap_unordered(hash_file, hashed_paths):
+            if self._is_closed:
+                continue
+            self.misses += 1
+            self.progress = (
+                self.progress[0] + signatures[file_path][0], self.progress[1])
+            self._add_results({file_path: digest})
+            if digest is None:
+                continue
+            entry = signatures[file_path] + (digest, )
+            self._entries[file_path] = entry
+            saved_entries.append((file_path, ) + entry)
+            if db is not None and len(saved_entries) >= SAVE_CHUNK_SIZE:
+                self._save(db, saved_entries)
+                saved_entries = []
+
+        if db is not None and saved_entries:
+            self._save(db, saved_entries)
+
+    @staticmethod
+    def _save(db, entries):
+        db.executemany(
+            'INSERT OR REPLACE INTO Hashes VALUES (?, ?, ?, ?)', entries)
+        db.commit()
@@ -0,0 +1,199 @@
+# Python import
+import os
+from time import time
+# PySide import
+from PySide.QtCore import QObject, QTimer
+
+
+# signature of a file never checked
+_UNKNOWN = object()
+
+
+def get_file_signature(file_path):
+    """ Return size and modification time of file_path, None if missing """
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
+        return None
+
+    return file_stat.st_size, file_stat.st_mtime
+
+
+class MTTNodeEventQueue(QObject):
+    """ Coalesce node added, removed and renamed events
+
+    Events are merged per node name and flushed once Qt is idle again, so a
+    scene import or a mass deletion ends in a single database update.
+    Pending changes are expressed against database names:
+
+    - removed: database names to remove
+    - renamed: dict of new name and database name
+    - added: dict of node name and caller payload
+    """
+
+    def __init__(self, flush_callback, delay=0, parent=None):
+        """
+        :param flush_callback: (callable) receive removed, renamed, added
+        :param delay: (int) milliseconds to wait after last event
+        """
+        super(MTTNodeEventQueue, self).__init__(parent)
+        self.flush_callback = flush_callback
+        self.removed = set()
+        self.renamed = dict()
+        self.added = dict()
+
+        # stats
+        self.received_count = 0
+        self.merged_count = 0
+        self.flush_count = 0
+        self.last_batch_size = 0
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+
+    def __len__(self):
+        return len(self.removed) + len(self.renamed) + len(self.added)
+
+    def _schedule(self):
+        self.received_count += 1
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def add(self, node_name, payload=None):
+        self._schedule()
+        if node_name in self.added:
+            self.merged_count += 1
+        self.added[node_name] = payload
+
+    def remove(self, node_name):
+        self._schedule()
+        if node_name in self.added:
+            # node never reached database
+            del self.added[node_name]
+            self.merged_count += 2
+        elif node_name in self.renamed:
+            self.removed.add(self.renamed.pop(node_name))
+            self.merged_count += 1
+        else:
+            self.removed.add(node_name)
+
+    def rename(self, old_name, new_name):
+        self._schedule()
+        if old_name in self.added:
+            self.added[new_name] = self.added.pop(old_name)
+            self.merged_count += 1
+        elif old_name in self.renamed:
+            database_name = self.renamed.pop(old_name)
+            if database_name != new_name:
+                self.renamed[new_name] = database_name
+            self.merged_count += 1
+        else:
+            self.renamed[new_name] = old_name
+
+    def flush(self):
+        """ Send pending events to flush callback """
+        self.timer.stop()
+        if not len(self):
+            return
+
+        removed, renamed, added = self.removed, self.renamed, self.added
+        self.removed, self.renamed, self.added = set(), dict(), dict()
+        self.flush_count += 1
+        self.last_batch_size = len(removed) + len(renamed) + len(added)
+
+        self.flush_callback(removed, renamed, added)
+
+    def clear(self):
+        """ Drop pending events """
+        self.timer.stop()
+        self.removed.clear()
+        self.renamed.clear()
+        self.added.clear()
+
+    def get_stats(self):
+        return {
+            'received': self.received_count,
+            'merged': self.merged_count,
+            'flushes': self.flush_count,
+            'last_batch': self.last_batch_size,
+        }
+
+
+class MTTFileChangeQueue(QObject):
+    """ Debounce file change events until written files are stable
+
+    Events are merged per key. A file is sent to flush callback once its size
+    and modification time did not change between two timer ticks, or after
+    max_wait seconds if it is still being written.
+    """
+
+    def __init__(self, flush_callback, delay=500, max_wait=10, parent=None):
+        """
+        :param flush_callback: (callable) receive a dict of key and file path
+        :param delay: (int) milliseconds between two stability checks
+        :param max_wait: (int) seconds before an unstable file is flushed
+        """
+        super(MTTFileChangeQueue, self).__init__(parent)
+        self.flush_callback = flush_callback
+        self.max_wait = max_wait
+        # key: [file path, last signature, first event time]
+        self.pending = dict()
+
+        # stats
+        self.received_count = 0
+        self.merged_count = 0
+        self.flush_count = 0
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.check_pending_files)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, key, file_path):
+        self.received_count += 1
+        entry = self.pending.get(key)
+        if entry is None:
+            self.pending[key] = [file_path, _UNKNOWN, time()]
+        else:
+            entry[0] = file_path
+            entry[1] = _UNKNOWN
+            self.merged_count += 1
+        # restart debounce delay
+        self.timer.start()
+
+    def check_pending_files(self):
+        """ Flush files with a stable signature """
+        now = time()
+        stable_files = dict()
+        for key, entry in self.pending.items():
+            file_path, last_signature, first_time = entry
+            signature = get_file_signature(file_path)
+            if signature == last_signature or now - first_time > self.max_wait:
+                stable_files[key] = file_path
+                del self.pending[key]
+            else:
+                entry[1] = signature
+
+        if self.pending:
+            self.timer.start()
+
+        if stable_files:
+            self.flush_count += 1
+            self.flush_callback(stable_files)
+
+    def clear(self):
+        """ Drop pending events """
+        self.timer.stop()
+        self.pending.clear()
+
+    def get_stats(self):
+        return {
+            'received': self.received_count,
+            'merged': self.merged_count,
+            'flushes': self.flush_count,
+        }
@@ -0,0 +1,197 @@
+# Python import
+import os
+import csv
+import cgi
+import json
+from collections import OrderedDict
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+# Custom import
+from mttContentHash import get_file_digest
+from mttImageInfo import read_image_info
+
+
+REPORT_HEADER = (
+    'NODE NAME', 'NODE TYPE', 'IS REF', 'MISSING', 'INSTANCE COUNT',
+    'FILE PATH')
+REPORT_CHUNK_SIZE = 1000
+
+
+def get_file_size(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return ''
+
+
+def get_file_mtime(file_path):
+    try:
+        return datetime.fromtimestamp(
+            os.path.getmtime(file_path)).isoformat(' ')
+    except (OSError, ValueError):
+        return ''
+
+
+def get_content_hash(file_path, content_hashes=None):
+    """ Return md5 digest of file_path, hashed only if not in content_hashes
+
+    :param content_hashes: dict of file path and digest already stored
+    """
+    if content_hashes:
+        content_hash = content_hashes.get(file_path)
+        if content_hash:
+            return content_hash
+    return get_file_digest(file_path) or ''
+
+
+def get_image_resolution(file_path):
+    info = read_image_info(file_path)
+    return '%dx%d' % info[:2] if info is not None else ''
+
+
+# extra column label: function receiving a file path
+EXTRA_COLUMNS = {
+    'FILE SIZE': get_file_size,
+    'MODIFIED': get_file_mtime,
+    'RESOLUTION': get_image_resolution,
+    'MD5': get_content_hash,
+}
+
+
+class MTTCsvWriter(object):
+    """ Write report rows as semicolon separated values """
+
+    def __init__(self, report_file):
+        self.writer = csv.writer(report_file, delimiter=';')
+
+    def begin(self, title, header):
+        self.writer.writerow([unicode(title).encode('utf-8')])
+        self.writer.writerow(header)
+
+    def write_rows(self, rows):
+        self.writer.writerows(
+            [[unicode(value).encode('utf-8') for value in row]
+             for row in rows])
+
+    def end(self):
+        pass
+
+
+class MTTJsonLinesWriter(object):
+    """ Write one JSON object per report row """
+
+    def __init__(self, report_file):
+        self.report_file = report_file
+        self.header = None
+
+    def begin(self, title, header):
+        self.header = header
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.report_file.write(
+                json.dumps(OrderedDict(zip(self.header, row))) + '\n')
+
+    def end(self):
+        pass
+
+
+class MTTHtmlWriter(object):
+    """ Write report rows as a HTML table """
+
+    def __init__(self, report_file):
+        self.report_file = report_file
+
+    def _write(self, text):
+        self.report_file.write(text.encode('utf-8'))
+
+    def begin(self, title, header):
+        self._write(
+            u'<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+            u'<title>%s</title></head><body>\n<h1>%s</h1>\n<table border="1">'
+            u'\n<tr>%s</tr>\n' % (
+                cgi.escape(title), cgi.escape(title),
+                u''.join([u'<th>%s</th>' % label for label in header])))
+
+    def write_rows(self, rows):
+        self._write(u''.join([
+            u'<tr>%s</tr>\n' % u''.join([
+                u'<td>%s</td>' % cgi.escape(unicode(value)) for value in row])
+            for row in rows]))
+
+    def end(self):
+        self._write(u'</table>\n</body></html>\n')
+
+
+REPORT_WRITERS = {
+    '.csv': MTTCsvWriter,
+    '.jsonl': MTTJsonLinesWriter,
+    '.html': MTTHtmlWriter,
+}
+
+
+def export_report(cursor, row_count, report_path, title, convert_row=None,
+                  extra_columns=(), progress_callback=None, workers=4,
+                  chunk_size=REPORT_CHUNK_SIZE):
+    """ Stream cursor rows to report_path
+
+    Rows are read chunk by chunk, extra columns are computed for the file
+    paths of the current chunk only so memory stays constant. Report format
+    is chosen from report_path extension.
+
+    :param cursor: executed sqlite3 cursor, file path is its last column
+    :param row_count: (int) number of rows for progress report
+    :param report_path: (string) .csv, .jsonl or .html file path
+    :param title: (string) report title
+    :param convert_row: (callable) return cleaned row from a cursor row
+    :param extra_columns: (list) labels of EXTRA_COLUMNS or
+                          (label, function) pairs
+    :param progress_callback: (callable) receive exported and total row
+                              counts, export is cancelled if it returns False
+    :param workers: (int) thread count computing extra columns
+    :return: exported row count
+    """
+    writer_class = REPORT_WRITERS[os.path.splitext(report_path)[1].lower()]
+    extra_columns = [
+        (column, EXTRA_COLUMNS[column]) if column in EXTRA_COLUMNS else column
+        for column in extra_columns]
+    header = list(REPORT_HEADER) + [label for label, func in extra_columns]
+
+    pool = ThreadPool(workers) if extra_columns else None
+    exported_count = 0
+    try:
+        with open(report_path, 'wb') as report_file:
+            writer = writer_class(report_file)
+            writer.begin(title, header)
+
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if convert_row is not None:
+                    rows = [convert_row(row) for row in rows]
+
+                if extra_columns:
+                    file_paths = list(set([row[-1] for row in rows]))
+                    values = dict()
+                    for label, func in extra_columns:
+                        values[label] = dict(
+                            zip(file_paths, pool.map(func, file_paths)))
+                    rows = [
+                        list(row) + [values[label][row[-1]]
+                                     for label, func in extra_columns]
+                        for row in rows]
+
+                writer.write_rows(rows)
+                exported_count += len(rows)
+                if progress_callback is not None \
+                        and progress_callback(exported_count, row_count) \
+                        is False:
+                    break
+
+            writer.end()
+    finally:
+        if pool is not None:
+            pool.close()
+
+    return exported_count
@@ -0,0 +1,260 @@
+# Python import
+import os
+import re
+from bisect import bisect_left
+from threading import Lock
+
+
+# file name token: regular expression group
+TILE_TOKENS = (
+    (re.compile(r'<udim>', re.I), 'udim', r'\d{4}'),
+    (re.compile(r'<uvtile>', re.I), 'uvtile', r'u\d+_v\d+'),
+    (re.compile(r'<u>', re.I), 'u', r'\d+'),
+    (re.compile(r'<v>', re.I), 'v', r'\d+'),
+    (re.compile(r'<f>', re.I), 'frame', r'-?\d+'),
+    (re.compile(r'#+'), 'frame', r'-?\d+'),
+)
+TOKEN_SPLIT = re.compile(r'(<udim>|<uvtile>|<u>|<v>|<f>|#+)', re.I)
+# Mudbox and ZBrush tiles written as concrete names, tex_u1_v1.png
+UV_TILE_NAME = re.compile(r'_u(\d+)_v(\d+)(?=[._])')
+UV_TILE_VALUE = re.compile(r'u(\d+)_v(\d+)')
+UDIM_START = 1001
+# file names are matched the way the file system compares them
+NAME_FLAGS = re.I if os.path.normcase('A') == 'a' else 0
+# missing tiles are not searched in bigger tile ranges
+MAX_TILE_RANGE = 10000
+
+
+class MTTFilePattern(object):
+    """ File name pattern of a tiled texture or an image sequence """
+
+    __slots__ = ('dir_path', 'prefix', 'regex', 'kind')
+
+    def __init__(self, dir_path, prefix, regex, kind):
+        """
+        :param dir_path: (string) folder of tiles
+        :param prefix: (string) file name start before first token, lower
+                       case if file system ignores case
+        :param regex: compiled regular expression matching tile names
+        :param kind: 'udim', 'uv' or 'frame'
+        """
+        self.dir_path = dir_path
+        self.prefix = prefix
+        self.regex = regex
+        self.kind = kind
+
+    def get_tile_key(self, match):
+        """ Return (u, v) for tiles, frame number for sequences """
+        groups = match.groupdict()
+        if 'udim' in groups:
+            udim = int(groups['udim']) - UDIM_START
+            return udim % 10, udim // 10
+        if 'uvtile' in groups:
+            u, v = UV_TILE_VALUE.match(groups['uvtile']).groups()
+            return int(u), int(v)
+        if 'u' in groups or 'v' in groups:
+            return int(groups.get('u') or 0), int(groups.get('v') or 0)
+        return int(groups['frame'])
+
+    def get_tile_label(self, tile_key):
+        if self.kind == 'udim':
+            return str(UDIM_START + tile_key[0] + tile_key[1] * 10)
+        if self.kind == 'uv':
+            return 'u%d_v%d' % tile_key
+        return str(tile_key)
+
+    def match_names(self, names):
+        """ Return dict of tile key and name of matching names """
+        tiles = dict()
+        for name in names:
+            match = self.regex.match(name)
+            if match is not None:
+                tiles[self.get_tile_key(match)] = name
+        return tiles
+
+    def match_listing(self, keys, names):
+        """ Same as match_names for a listing sorted by keys
+
+        Only names starting with prefix are matched.
+
+        :param keys: (list) sorted file names, lower case if file system
+                     ignores case
+        :param names: (list) file names in keys order
+        """
+        start = end = bisect_left(keys, self.prefix)
+        while end < len(keys) and keys[end].startswith(self.prefix):
+            end += 1
+        return self.match_names(names[start:end])
+
+    def get_missing_tiles(self, tile_keys):
+        """ Return sorted keys of holes in the range of tile_keys
+
+        Tiles are missing when they lie in the bounding box of existing
+        tiles, frames when they lie between first and last frame.
+        """
+        if not tile_keys:
+            return []
+
+        if self.kind == 'frame':
+            first, last = min(tile_keys), max(tile_keys)
+            if last - first >= MAX_TILE_RANGE:
+                return []
+            return [frame for frame in xrange(first, last + 1)
+                    if frame not in tile_keys]
+
+        u_values = [u for u, v in tile_keys]
+        v_values = [v for u, v in tile_keys]
+        u_range = xrange(min(u_values), max(u_values) + 1)
+        v_range = xrange(min(v_values), max(v_values) + 1)
+        if len(u_range) * len(v_range) > MAX_TILE_RANGE:
+            return []
+        return [(u, v) for v in v_range for u in u_range
+                if (u, v) not in tile_keys]
+
+
+def get_file_pattern(file_path):
+    """ Return MTTFilePattern of file_path, None for a single file """
+    if not file_path:
+        return None
+    dir_path, file_name = os.path.split(file_path)
+
+    parts = TOKEN_SPLIT.split(file_name)
+    if len(parts) == 1:
+        # concrete tile name
+        match = UV_TILE_NAME.search(file_name)
+        if match is None:
+            return None
+        regex = '%s_u(?P<u>\\d+)_v(?P<v>\\d+)%s$' % (
+            re.escape(file_name[:match.start()]),
+            re.escape(file_name[match.end():]))
+        return MTTFilePattern(
+            dir_path, fold_name(file_name[:match.start()]),
+            re.compile(regex, NAME_FLAGS), 'uv')
+
+    regex = []
+    groups = set()
+    for i, part in enumerate(parts):
+        if not i % 2:
+            regex.append(re.escape(part))
+            continue
+        for token, group, group_regex in TILE_TOKENS:
+            if token.match(part):
+                if group in groups:
+                    regex.append('(?P=%s)' % group)
+                else:
+                    groups.add(group)
+                    regex.append('(?P<%s>%s)' % (group, group_regex))
+                break
+
+    if 'udim' in groups:
+        kind = 'udim'
+    elif groups.intersection(('uvtile', 'u', 'v')):
+        kind = 'uv'
+    else:
+        kind = 'frame'
+
+    return MTTFilePattern(
+        dir_path, fold_name(parts[0]),
+        re.compile(''.join(regex) + '$', NAME_FLAGS), kind)
+
+
+def fold_name(file_name):
+    """ Return file_name as compared by file system """
+    return file_name.lower() if NAME_FLAGS else file_name
+
+
+class MTTTileCache(object):
+    """ Tiles of file patterns found with one directory listing
+
+    Directory listings are shared by all patterns of a directory and kept
+    sorted until the directory modification time changes, tiles of a
+    pattern are only searched among names starting with its prefix.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        # directory path: (mtime, sorted keys, names)
+        self._listings = dict()
+        # file path: (mtime, tile paths, missing tiles)
+        self._tiles = dict()
+        self._patterns = dict()
+        self._lock = Lock()
+
+    def get_pattern(self, file_path):
+        """ Return cached MTTFilePattern of file_path or None """
+        try:
+            return self._patterns[file_path]
+        except KeyError:
+            pattern = self._patterns[file_path] = get_file_pattern(file_path)
+            return pattern
+
+    def _get_listing(self, dir_path, mtime):
+        listing = self._listings.get(dir_path)
+        if listing is not None and listing[0] == mtime:
+            return listing
+
+        try:
+            names = os.listdir(dir_path or '.')
+        except OSError:
+            names = []
+        keyed_names = sorted([(fold_name(name), name) for name in names])
+        listing = (mtime, [key for key, name in keyed_names],
+                   [name for key, name in keyed_names])
+        with self._lock:
+            self._listings[dir_path] = listing
+
+        return listing
+
+    def get_tiles(self, file_path):
+        """ Return tile paths and missing tile labels of file_path pattern
+
+        :param file_path: (string) file path using tile or frame tokens
+        """
+        pattern = self.get_pattern(file_path)
+        if pattern is None:
+            return [file_path], []
+
+        try:
+            mtime = os.stat(pattern.dir_path or '.').st_mtime
+        except OSError:
+            return [], []
+
+        tiles = self._tiles.get(file_path)
+        if tiles is not None and tiles[0] == mtime:
+            self.hits += 1
+            return tiles[1], tiles[2]
+
+        self.misses += 1
+        mtime, keys, names = self._get_listing(pattern.dir_path, mtime)
+        tiles = pattern.match_listing(keys, names)
+        tile_paths = [
+            os.path.join(pattern.dir_path, tiles[tile_key])
+            for tile_key in sorted(tiles)]
+        missing_tiles = [
+            pattern.get_tile_label(tile_key)
+            for tile_key in pattern.get_missing_tiles(set(tiles))]
+        with self._lock:
+            self._tiles[file_path] = (mtime, tile_paths, missing_tiles)
+
+        return tile_paths, missing_tiles
+
+    def invalidate(self, dir_path=None):
+        """ Forget listing of dir_path or all listings if None """
+        with self._lock:
+            if dir_path is None:
+                self._listings.clear()
+                self._tiles.clear()
+                return
+
+            dir_path = normalize_dir(dir_path)
+            for listed_path in self._listings.keys():
+                if normalize_dir(listed_path) == dir_path:
+                    del self._listings[listed_path]
+            for file_path in self._tiles.keys():
+                if normalize_dir(os.path.dirname(file_path)) == dir_path:
+                    del self._tiles[file_path]
+
+
+def normalize_dir(dir_path):
+    return os.path.normcase(os.path.normpath(dir_path or '.'))
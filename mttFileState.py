@@ -0,0 +1,153 @@
+# Python import
+import os
+import stat
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from time import time
+
+
+# minimum number of stale paths before probing in the thread pool
+PARALLEL_PROBE_THRESHOLD = 16
+
+
+def probe_file_state(file_path):
+    """ Return file state and stat signature of file_path
+
+    State is 1 for writable file, 0 for read-only file and -1 for missing
+    file or directory. Signature is None when path doesn't exist.
+
+    :param file_path: (string) file path
+    """
+    try:
+        file_stat = os.stat(file_path)
+    except (OSError, TypeError, ValueError):
+        return -1, None
+
+    signature = (file_stat.st_mtime, file_stat.st_mode)
+    if stat.S_ISDIR(file_stat.st_mode):
+        file_state = -1
+    elif os.access(file_path, os.W_OK):
+        file_state = 1
+    elif os.access(file_path, os.R_OK):
+        file_state = 0
+    else:
+        file_state = -1
+
+    return file_state, signature
+
+
+class MTTFileStateCache(object):
+    """ Cached file state service
+
+    States are kept per path with their (mtime, mode) signature. Within ttl
+    seconds a cached state is returned without touching the disk, after that
+    a single stat call validates the entry and access rights are only probed
+    again when the signature changed. Missing paths are cached the same way
+    for missing_ttl seconds.
+    """
+
+    def __init__(self, ttl=5, missing_ttl=None, workers=8):
+        """
+        :param ttl: (float) seconds a state is trusted without any disk access
+        :param missing_ttl: (float) same as ttl for missing paths
+        :param workers: (int) thread pool size used by get_states
+        """
+        self.ttl = ttl
+        self.missing_ttl = ttl if missing_ttl is None else missing_ttl
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self._entries = dict()
+        self._lock = Lock()
+        self._pool = None
+
+    def _get_fresh_state(self, file_path, now):
+        """ Return cached state if it is still trusted, None otherwise """
+        entry = self._entries.get(file_path)
+        if entry is None:
+            return None
+
+        file_state, signature, timestamp = entry
+        ttl = self.ttl if signature is not None else self.missing_ttl
+        if now - timestamp <= ttl:
+            return file_state
+
+        return None
+
+    def _probe(self, file_path):
+        """ Validate cached entry with one stat call or probe file again """
+        entry = self._entries.get(file_path)
+        try:
+            file_stat = os.stat(file_path)
+            signature = (file_stat.st_mtime, file_stat.st_mode)
+        except (OSError, TypeError, ValueError):
+            signature = None
+
+        if entry is not None and entry[1] == signature:
+            file_state = entry[0]
+        elif signature is None:
+            file_state = -1
+        else:
+            file_state, signature = probe_file_state(file_path)
+
+        with self._lock:
+            self._entries[file_path] = (file_state, signature, time())
+
+        return file_state
+
+    def get_state(self, file_path):
+        """ Return state of file_path
+
+        :param file_path: (string) file path
+        """
+        file_state = self._get_fresh_state(file_path, time())
+        if file_state is not None:
+            self.hits += 1
+            return file_state
+
+        self.misses += 1
+        return self._probe(file_path)
+
+    def get_states(self, file_paths):
+        """ Return a dict of file path and state, stale paths are probed
+        in parallel
+
+        :param file_paths: (iterable) file paths
+        """
+        now = time()
+        states = dict()
+        stale_paths = []
+        for file_path in set(file_paths):
+            file_state = self._get_fresh_state(file_path, now)
+            if file_state is None:
+                stale_paths.append(file_path)
+            else:
+                states[file_path] = file_state
+
+        self.hits += len(states)
+        self.misses += len(stale_paths)
+
+        if len(stale_paths) < PARALLEL_PROBE_THRESHOLD or self.workers < 2:
+            probed_states = [self._probe(path) for path in stale_paths]
+        else:
+            if self._pool is None:
+                self._pool = ThreadPool(self.workers)
+            probed_states = self._pool.map(self._probe, stale_paths)
+
+        states.update(zip(stale_paths, probed_states))
+
+        return states
+
+    def invalidate(self, file_path=None):
+        """ Forget cached state of file_path or of all paths if None """
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(file_path, None)
+
+    def close(self):
+        """ Release thread pool """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
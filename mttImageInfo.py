@@ -0,0 +1,402 @@
+# Python import
+import os
+import struct
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+
+
+# bytes read to identify a file, enough for most headers
+HEADER_SIZE = 4096
+# EXR attributes and JPEG segments are not searched beyond this offset
+MAX_HEADER_SIZE = 262144
+# files read by one pool task
+REQUEST_CHUNK_SIZE = 32
+# (channels, bit depth) of PNG color types
+PNG_COLOR_TYPES = {0: (1, None), 2: (3, None), 3: (3, 8), 4: (2, None),
+                   6: (4, None)}
+# TIFF tags : width, height, bits per sample, samples per pixel
+TIFF_TAGS = (256, 257, 258, 277)
+# struct format of TIFF value types : byte, short, long, long8
+TIFF_VALUE_FORMATS = {1: 'B', 3: 'H', 4: 'I', 16: 'Q'}
+# bits of EXR pixel types : uint, half, float
+EXR_PIXEL_BITS = {0: 32, 1: 16, 2: 32}
+# (channels, bit depth, name) of DDS FourCC codes
+DDS_FOURCC = {
+    'DXT1': (3, 8, 'BC1'), 'DXT2': (4, 8, 'BC2'), 'DXT3': (4, 8, 'BC2'),
+    'DXT4': (4, 8, 'BC3'), 'DXT5': (4, 8, 'BC3'), 'ATI1': (1, 8, 'BC4'),
+    'BC4U': (1, 8, 'BC4'), 'BC4S': (1, 8, 'BC4'), 'ATI2': (2, 8, 'BC5'),
+    'BC5U': (2, 8, 'BC5'), 'BC5S': (2, 8, 'BC5'),
+    '$\x00\x00\x00': (4, 16, 'RGBA16'), 'o\x00\x00\x00': (1, 16, 'R16F'),
+    'p\x00\x00\x00': (2, 16, 'RG16F'), 'q\x00\x00\x00': (4, 16, 'RGBA16F'),
+    'r\x00\x00\x00': (1, 32, 'R32F'), 's\x00\x00\x00': (2, 32, 'RG32F'),
+    't\x00\x00\x00': (4, 32, 'RGBA32F'),
+}
+# (channels, bit depth, name) of DDS DX10 DXGI formats
+DDS_DXGI_FORMATS = {
+    2: (4, 32, 'RGBA32F'), 6: (3, 32, 'RGB32F'), 10: (4, 16, 'RGBA16F'),
+    11: (4, 16, 'RGBA16'), 16: (2, 32, 'RG32F'), 24: (4, 10, 'RGB10A2'),
+    26: (3, 11, 'R11G11B10F'), 28: (4, 8, 'RGBA8'), 29: (4, 8, 'RGBA8'),
+    34: (2, 16, 'RG16F'), 35: (2, 16, 'RG16'), 41: (1, 32, 'R32F'),
+    49: (2, 8, 'RG8'), 54: (1, 16, 'R16F'), 56: (1, 16, 'R16'),
+    61: (1, 8, 'R8'), 71: (3, 8, 'BC1'), 72: (3, 8, 'BC1'),
+    74: (4, 8, 'BC2'), 75: (4, 8, 'BC2'), 77: (4, 8, 'BC3'),
+    78: (4, 8, 'BC3'), 80: (1, 8, 'BC4'), 81: (1, 8, 'BC4'),
+    83: (2, 8, 'BC5'), 84: (2, 8, 'BC5'), 87: (4, 8, 'BGRA8'),
+    88: (3, 8, 'BGR8'), 91: (4, 8, 'BGRA8'), 95: (3, 16, 'BC6H'),
+    96: (3, 16, 'BC6H'), 98: (4, 8, 'BC7'), 99: (4, 8, 'BC7'),
+}
+
+
+def _read_at(image_file, header, offset, size):
+    """ Return size bytes at offset, read from header when possible """
+    if offset + size <= len(header):
+        return header[offset:offset + size]
+    image_file.seek(offset)
+    return image_file.read(size)
+
+
+def read_png_info(image_file, header):
+    if header[12:16] != 'IHDR':
+        return None
+    width, height, bit_depth, color_type = struct.unpack(
+        '>IIBB', header[16:26])
+    channels, palette_depth = PNG_COLOR_TYPES.get(color_type, (None, None))
+    return width, height, channels, palette_depth or bit_depth, 'PNG'
+
+
+def read_jpeg_info(image_file, header):
+    """ Walk JPEG segments until the start of frame """
+    offset = 2
+    while offset < MAX_HEADER_SIZE:
+        segment = _read_at(image_file, header, offset, 4)
+        if len(segment) < 2 or segment[0] != '\xff':
+            return None
+        marker = ord(segment[1])
+        if marker == 0xff:
+            # fill byte
+            offset += 1
+            continue
+        if marker == 0x01 or 0xd0 <= marker <= 0xd8:
+            # standalone markers
+            offset += 2
+            continue
+        if marker in (0xd9, 0xda) or len(segment) < 4:
+            return None
+        if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+            bit_depth, height, width, channels = struct.unpack(
+                '>BHHB', _read_at(image_file, header, offset + 4, 6))
+            return width, height, channels, bit_depth, 'JPEG'
+        offset += 2 + struct.unpack('>H', segment[2:4])[0]
+
+    return None
+
+
+def read_tga_info(image_file, header):
+    image_type = ord(header[2])
+    width, height, pixel_depth, descriptor = struct.unpack(
+        '<HHBB', header[12:18])
+    if image_type not in (1, 2, 3, 9, 10, 11) or not width or not height:
+        return None
+
+    alpha_bits = descriptor & 0x0f
+    if image_type in (1, 9):
+        # color mapped
+        return width, height, 3, 8, 'TGA'
+    if image_type in (3, 11):
+        channels = 2 if alpha_bits else 1
+    else:
+        channels = 4 if alpha_bits or pixel_depth == 32 else 3
+    return width, height, channels, pixel_depth // channels, 'TGA'
+
+
+def read_tiff_info(image_file, header):
+    """ Read first image directory of a TIFF or BigTIFF file """
+    byte_order = '<' if header[:2] == 'II' else '>'
+    if struct.unpack(byte_order + 'H', header[2:4])[0] == 43:
+        # BigTIFF : 8 bytes counts, offsets and values
+        long_format, entry_count_format = byte_order + 'Q', byte_order + 'Q'
+        ifd_offset = struct.unpack(long_format, header[8:16])[0]
+    else:
+        long_format, entry_count_format = byte_order + 'I', byte_order + 'H'
+        ifd_offset = struct.unpack(long_format, header[4:8])[0]
+    long_size = struct.calcsize(long_format)
+    entry_size = 4 + 2 * long_size
+    entry_count_size = struct.calcsize(entry_count_format)
+
+    entry_count = struct.unpack(entry_count_format, _read_at(
+        image_file, header, ifd_offset, entry_count_size))[0]
+    entries = _read_at(
+        image_file, header, ifd_offset + entry_count_size,
+        min(entry_count, 4096) * entry_size)
+
+    tags = dict()
+    for i in xrange(0, len(entries) - entry_size + 1, entry_size):
+        tag, value_type = struct.unpack(byte_order + 'HH', entries[i:i + 4])
+        value_format = TIFF_VALUE_FORMATS.get(value_type)
+        if tag not in TIFF_TAGS or value_format is None:
+            continue
+        value_size = struct.calcsize(value_format)
+        count = struct.unpack(long_format, entries[i + 4:i + 4 + long_size])[0]
+        value = entries[i + 4 + long_size:i + entry_size]
+        if value_size * count > long_size:
+            # values stored out of line, first one is enough
+            value = _read_at(image_file, header,
+                             struct.unpack(long_format, value)[0], value_size)
+        tags[tag] = struct.unpack(
+            byte_order + value_format, value[:value_size])[0]
+
+    if 256 not in tags or 257 not in tags:
+        return None
+    return (tags[256], tags[257], tags.get(277, 1), tags.get(258, 1),
+            'TIFF')
+
+
+def read_exr_info(image_file, header):
+    """ Read dataWindow and channels attributes of first EXR part """
+    data = header
+    offset = 8
+    width = height = None
+    channels = 0
+    bit_depth = None
+    while offset < MAX_HEADER_SIZE:
+        if len(data) < offset + 1024:
+            image_file.seek(len(data))
+            data += image_file.read(offset + 1024 - len(data))
+        name_end = data.find('\x00', offset)
+        if name_end == offset or name_end < 0:
+            break
+        type_end = data.find('\x00', name_end + 1)
+        if type_end < 0:
+            return None
+        name = data[offset:name_end]
+        size = struct.unpack('<i', data[type_end + 1:type_end + 5])[0]
+        value_offset = type_end + 5
+        offset = value_offset + size
+        if name not in ('channels', 'dataWindow'):
+            continue
+
+        value = _read_at(image_file, data, value_offset, size)
+        if name == 'dataWindow':
+            x_min, y_min, x_max, y_max = struct.unpack('<iiii', value[:16])
+            width, height = x_max - x_min + 1, y_max - y_min + 1
+        else:
+            position = 0
+            while position < len(value) and value[position] != '\x00':
+                channel_end = value.find('\x00', position)
+                pixel_type = struct.unpack(
+                    '<i', value[channel_end + 1:channel_end + 5])[0]
+                channels += 1
+                bit_depth = max(bit_depth, EXR_PIXEL_BITS.get(pixel_type))
+                position = channel_end + 17
+
+    if width is None:
+        return None
+    return width, height, channels or None, bit_depth, 'EXR'
+
+
+def read_psd_info(image_file, header):
+    version, channels, height, width, bit_depth = struct.unpack(
+        '>H6xHIIH', header[4:24])
+    return width, height, channels, bit_depth, 'PSB' if version == 2 else 'PSD'
+
+
+def read_dds_info(image_file, header):
+    height, width = struct.unpack('<II', header[12:20])
+    flags, four_cc, bit_count = struct.unpack('<I4sI', header[80:92])
+    if four_cc == 'DX10':
+        dxgi_format = struct.unpack('<I', header[128:132])[0]
+        channels, bit_depth, name = DDS_DXGI_FORMATS.get(
+            dxgi_format, (None, None, 'DX10'))
+    elif flags & 0x4:
+        channels, bit_depth, name = DDS_FOURCC.get(
+            four_cc, (None, None, four_cc.strip('\x00 ')))
+    else:
+        # uncompressed rgb or luminance, with optional alpha
+        channels = (1 if flags & 0x20000 else 3) + bool(flags & 0x1)
+        bit_depth = bit_count // channels or None
+        name = ''
+    return width, height, channels, bit_depth, ('DDS %s' % name).strip()
+
+
+# file signature: header reader
+IMAGE_READERS = (
+    ('\x89PNG\r\n\x1a\n', read_png_info),
+    ('\xff\xd8', read_jpeg_info),
+    ('II*\x00', read_tiff_info),
+    ('MM\x00*', read_tiff_info),
+    ('II+\x00', read_tiff_info),
+    ('MM\x00+', read_tiff_info),
+    ('v/1\x01', read_exr_info),
+    ('8BPS', read_psd_info),
+    ('DDS ', read_dds_info),
+)
+# formats without signature, chosen from file extension
+EXTENSION_READERS = {
+    '.tga': read_tga_info,
+    '.tpic': read_tga_info,
+}
+
+
+def read_image_info(file_path):
+    """ Return (width, height, channels, bit depth, format) of file_path
+
+    Only the header is read. Values a header doesn't give are None, the
+    result is None for unreadable files and unsupported formats.
+
+    :param file_path: (string) image path
+    """
+    try:
+        with open(file_path, 'rb') as image_file:
+            header = image_file.read(HEADER_SIZE)
+            for signature, reader in IMAGE_READERS:
+                if header.startswith(signature):
+                    break
+            else:
+                reader = EXTENSION_READERS.get(
+                    os.path.splitext(file_path)[1].lower())
+                if reader is None:
+                    return None
+            return reader(image_file, header)
+    except (IOError, OSError, struct.error, ValueError, IndexError,
+            TypeError):
+        return None
+
+
+class MTTImageInfoCache(object):
+    """ Image header metadata read in a thread pool
+
+    Entries are kept per file path with the size and modification time they
+    were read at, a header is read again only when one of them changed.
+    Requests are processed in background, finished results are collected by
+    the UI thread with pop_results.
+    """
+
+    def __init__(self, workers=8):
+        """
+        :param workers: (int) thread count reading headers
+        """
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        # file path: (size, mtime, image info)
+        self._entries = dict()
+        self._results = dict()
+        self._pending = set()
+        self._lock = Lock()
+        self._pool = None
+
+    def seed(self, entries):
+        """ Add entries read in a previous session
+
+        :param entries: dict of file path and (size, mtime, image info)
+        """
+        with self._lock:
+            self._entries.update(entries)
+
+    def get_info(self, file_path, disk_paths=None):
+        """ Return (size, mtime, image info) of file_path, None if missing
+
+        :param file_path: (string) file path
+        :param disk_paths: (list) files of file_path, tiles of a UDIM
+                           texture for example, sizes are summed and header
+                           is read from the first existing one
+        """
+        size = 0
+        mtime = None
+        header_path = None
+        for disk_path in disk_paths or [file_path]:
+            try:
+                file_stat = os.stat(disk_path)
+            except (OSError, TypeError, ValueError):
+                continue
+            size += file_stat.st_size
+            mtime = max(mtime, file_stat.st_mtime)
+            if header_path is None:
+                header_path = disk_path
+
+        if header_path is None:
+            with self._lock:
+                self._entries.pop(file_path, None)
+            return None
+
+        entry = self._entries.get(file_path)
+        if entry is not None and entry[0] == size and entry[1] == mtime:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = (size, mtime, read_image_info(header_path))
+        with self._lock:
+            self._entries[file_path] = entry
+
+        return entry
+
+    def _read(self, files):
+        for file_path, disk_paths in files:
+            entry = None
+            try:
+                entry = self.get_info(file_path, disk_paths)
+            finally:
+                # a file is never both pending and missing from results
+                with self._lock:
+                    self._pending.discard(file_path)
+                    self._results[file_path] = entry
+
+    def request(self, files):
+        """ Read infos of files in background
+
+        :param files: dict of file path and disk paths
+        """
+        with self._lock:
+            files = [(file_path, disk_paths)
+                     for file_path, disk_paths in files.iteritems()
+                     if file_path not in self._pending]
+            self._pending.update([file_path for file_path, d in files])
+        if not files:
+            return
+
+        if self._pool is None:
+            self._pool = ThreadPool(self.workers)
+        for i in xrange(0, len(files), REQUEST_CHUNK_SIZE):
+            self._pool.apply_async(
+                self._read, (files[i:i + REQUEST_CHUNK_SIZE], ))
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    @property
+    def result_count(self):
+        return len(self._results)
+
+    def pop_results(self, limit=None):
+        """ Return dict of file path and entry read since last call
+
+        :param limit: (int) maximum result count, all results if None
+        """
+        with self._lock:
+            if limit is None or len(self._results) <= limit:
+                results, self._results = self._results, dict()
+                return results
+
+            results = dict()
+            for file_path in self._results.keys()[:limit]:
+                results[file_path] = self._results.pop(file_path)
+            return results
+
+    def invalidate(self, file_path=None):
+        """ Forget entry of file_path or all entries if None """
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(file_path, None)
+
+    def close(self):
+        """ Release thread pool, pending requests are dropped """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        with self._lock:
+            self._pending.clear()
+            self._results.clear()
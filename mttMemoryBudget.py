@@ -0,0 +1,321 @@
+# Python import
+from collections import defaultdict
+# Custom import
+from mttTextureIndex import iter_chunks, sql_in
+
+
+(BUDGET_FILE, BUDGET_REFERENCE, BUDGET_SHADING_GROUP, BUDGET_SCENE) = range(4)
+BUDGET_CATEGORY_LABEL = {
+    BUDGET_FILE: 'File',
+    BUDGET_REFERENCE: 'Reference',
+    BUDGET_SHADING_GROUP: 'Shading Group',
+}
+# node changes above this count rebuild the budget instead of updating it
+BUDGET_UPDATE_THRESHOLD = 256
+
+BUDGET_NODE_QUERY = (
+    'SELECT Id, Name, FileId, RefName FROM NodesTable ')
+BUDGET_FILE_QUERY = (
+    'SELECT FileId, FilePath, Width, Height, Channels, BitDepth, TileCount '
+    'FROM FilesTable ')
+
+
+def get_texture_memory(width, height, channels, bit_depth, tile_count=None):
+    """ Return uncompressed and mipmapped bytes of an image in memory
+
+    Channels are stored on whole bytes, mipmapped size adds every level of
+    the mip chain down to 1x1. Images of a pattern are counted once per
+    existing tile.
+
+    :return: (uncompressed, mipmapped), None if a header value is unknown
+    """
+    if not (width and height and channels and bit_depth):
+        return None
+
+    pixel_size = channels * ((bit_depth + 7) // 8)
+    uncompressed = width * height * pixel_size
+    mipmapped = 0
+    while True:
+        mipmapped += width * height * pixel_size
+        if width == 1 and height == 1:
+            break
+        width = max(1, width // 2)
+        height = max(1, height // 2)
+
+    tile_count = tile_count or 1
+    return uncompressed * tile_count, mipmapped * tile_count
+
+
+def get_shading_groups(cmds, node_names=None):
+    """ Return dict of texture node name and names of shading groups using it
+
+    Shading groups are listed once with their upstream history so scenes
+    with many textures cost one history query per shading group.
+
+    :param cmds: maya.cmds like module
+    :param node_names: texture nodes looked up from their future instead
+    """
+    shading_groups = defaultdict(set)
+    if node_names is not None:
+        for node_name in node_names:
+            if not cmds.objExists(node_name):
+                continue
+            future_nodes = cmds.listHistory(
+                node_name, future=True, pruneDagObjects=True) or []
+            shading_groups[node_name].update(
+                cmds.ls(future_nodes, exactType='shadingEngine') or [])
+        return shading_groups
+
+    for shading_group in cmds.ls(exactType='shadingEngine') or []:
+        history = cmds.listHistory(shading_group, pruneDagObjects=True) or []
+        for node_name in history:
+            shading_groups[node_name].add(shading_group)
+
+    return shading_groups
+
+
+class MTTMemoryBudget(object):
+    """ Texture memory estimated per file, reference and shading group
+
+    Memory comes from image header metadata stored by the texture index.
+    Each group total sums distinct files of its nodes, a file shared by
+    several nodes of a group is counted once. Totals are kept between
+    calls and updated from the nodes of changed files only.
+    """
+
+    def __init__(self, texture_index, cmds):
+        self.texture_index = texture_index
+        self.cmds = cmds
+        self.is_dirty = True
+        # incremented on each change so views refresh only when needed
+        self.revision = 0
+        # file id: (file path, memory)
+        self.files = dict()
+        # node id: (node name, file id, group keys)
+        self.nodes = dict()
+        self.file_nodes = defaultdict(set)
+        # (category, name): {file id: node count}
+        self.group_files = dict()
+        # (category, name): [uncompressed, mipmapped, file count, unknown]
+        self.totals = dict()
+        # node name: shading group names, filled by build
+        self.shading_groups = dict()
+
+    def reset(self):
+        """ Rebuild budget on next access """
+        self.is_dirty = True
+        self.revision += 1
+
+    def build(self):
+        """ Compute budget of all nodes """
+        self.files.clear()
+        self.nodes.clear()
+        self.file_nodes.clear()
+        self.group_files.clear()
+        self.totals.clear()
+        self.shading_groups = get_shading_groups(self.cmds)
+
+        c = self.texture_index.db.cursor()
+        c.execute(BUDGET_FILE_QUERY)
+        for data in c.fetchall():
+            self._set_file(data)
+
+        # node counts first, totals once per group file
+        c.execute(BUDGET_NODE_QUERY)
+        for node_id, node_name, file_id, ref_name in c.fetchall():
+            if file_id not in self.files:
+                continue
+            keys = self._get_group_keys(node_name, file_id, ref_name)
+            self.nodes[node_id] = (node_name, file_id, keys)
+            self.file_nodes[file_id].add(node_id)
+            for key in keys:
+                file_counts = self.group_files.get(key)
+                if file_counts is None:
+                    file_counts = self.group_files[key] = dict()
+                file_counts[file_id] = file_counts.get(file_id, 0) + 1
+        for key, file_counts in self.group_files.iteritems():
+            total = self.totals[key] = [0, 0, len(file_counts), 0]
+            for file_id in file_counts:
+                memory = self.files[file_id][1]
+                if memory is None:
+                    total[3] += 1
+                else:
+                    total[0] += memory[0]
+                    total[1] += memory[1]
+
+        self.is_dirty = False
+        self.revision += 1
+
+    def update_files(self, file_ids):
+        """ Update memory of file_ids and groups of nodes using them
+
+        Nodes removed from file_ids, added to them or reassigned since last
+        update are found from cached nodes and database.
+        """
+        if self.is_dirty:
+            return
+
+        file_ids = set(file_ids)
+        file_ids.discard(None)
+        if not file_ids:
+            return
+
+        c = self.texture_index.db.cursor()
+        node_ids = set()
+        for file_id in file_ids:
+            node_ids.update(self.file_nodes.get(file_id, ()))
+        nodes_data = []
+        for chunk in iter_chunks(file_ids):
+            c.execute(
+                BUDGET_NODE_QUERY + 'WHERE ' + sql_in('FileId', chunk), chunk)
+            nodes_data.extend(c.fetchall())
+        for chunk in iter_chunks(
+                node_ids.difference([data[0] for data in nodes_data])):
+            c.execute(
+                BUDGET_NODE_QUERY + 'WHERE ' + sql_in('Id', chunk), chunk)
+            nodes_data.extend(c.fetchall())
+
+        # renamed nodes keep their shading groups
+        new_names = []
+        for node_id, node_name, file_id, ref_name in nodes_data:
+            if node_id not in self.nodes:
+                new_names.append(node_name)
+            elif self.nodes[node_id][0] != node_name:
+                self.shading_groups[node_name] = self.shading_groups.pop(
+                    self.nodes[node_id][0], set())
+        if len(new_names) > BUDGET_UPDATE_THRESHOLD:
+            self.reset()
+            return
+        self.shading_groups.update(
+            get_shading_groups(self.cmds, new_names))
+
+        # nodes are taken out before files change so totals stay balanced
+        for node_id in node_ids:
+            self._remove_node(node_id)
+        for data in nodes_data:
+            self._remove_node(data[0])
+        for file_id in file_ids:
+            self.files.pop(file_id, None)
+        for chunk in iter_chunks(file_ids):
+            c.execute(
+                BUDGET_FILE_QUERY + 'WHERE ' + sql_in('FileId', chunk), chunk)
+            for data in c.fetchall():
+                self._set_file(data)
+        for data in nodes_data:
+            self._add_node(*data)
+
+        self.revision += 1
+
+    def update_file_memory(self, file_ids):
+        """ Update totals of groups using file_ids after their header was read
+
+        Nodes of file_ids must be unchanged, update_files handles node
+        changes.
+        """
+        if self.is_dirty:
+            return
+
+        c = self.texture_index.db.cursor()
+        for chunk in iter_chunks(file_ids):
+            c.execute(
+                BUDGET_FILE_QUERY + 'WHERE ' + sql_in('FileId', chunk), chunk)
+            for data in c.fetchall():
+                if data[0] not in self.files:
+                    continue
+                keys = set()
+                for node_id in self.file_nodes.get(data[0], ()):
+                    keys.update(self.nodes[node_id][2])
+                for key in keys:
+                    self._add_total(key, data[0], -1)
+                self._set_file(data)
+                for key in keys:
+                    self._add_total(key, data[0], 1)
+
+        self.revision += 1
+
+    def _set_file(self, data):
+        # nodes without file path are left out
+        if data[1] != '.':
+            self.files[data[0]] = (data[1], get_texture_memory(*data[2:]))
+
+    def _get_group_keys(self, node_name, file_id, ref_name):
+        keys = ((BUDGET_SCENE, None), (BUDGET_FILE, file_id),
+                (BUDGET_REFERENCE, ref_name))
+        shading_groups = self.shading_groups.get(node_name)
+        if shading_groups:
+            keys += tuple([(BUDGET_SHADING_GROUP, shading_group)
+                           for shading_group in shading_groups])
+        return keys
+
+    def _add_total(self, key, file_id, sign):
+        total = self.totals.setdefault(key, [0, 0, 0, 0])
+        memory = self.files.get(file_id, (None, None))[1]
+        total[2] += sign
+        if memory is None:
+            total[3] += sign
+        else:
+            total[0] += sign * memory[0]
+            total[1] += sign * memory[1]
+
+    def _add_node(self, node_id, node_name, file_id, ref_name):
+        if file_id not in self.files:
+            return
+
+        keys = self._get_group_keys(node_name, file_id, ref_name)
+        self.nodes[node_id] = (node_name, file_id, keys)
+        self.file_nodes[file_id].add(node_id)
+        for key in keys:
+            file_counts = self.group_files.setdefault(key, dict())
+            count = file_counts.get(file_id, 0)
+            file_counts[file_id] = count + 1
+            if not count:
+                self._add_total(key, file_id, 1)
+
+    def _remove_node(self, node_id):
+        node = self.nodes.pop(node_id, None)
+        if node is None:
+            return
+
+        node_name, file_id, keys = node
+        self.file_nodes[file_id].discard(node_id)
+        if not self.file_nodes[file_id]:
+            del self.file_nodes[file_id]
+        for key in keys:
+            file_counts = self.group_files[key]
+            file_counts[file_id] -= 1
+            if file_counts[file_id]:
+                continue
+            del file_counts[file_id]
+            self._add_total(key, file_id, -1)
+            if not file_counts:
+                del self.group_files[key]
+                del self.totals[key]
+
+    def get_total(self):
+        """ Return [uncompressed, mipmapped, file count, unknown count] of
+        scene
+        """
+        if self.is_dirty:
+            self.build()
+        return self.totals.get((BUDGET_SCENE, None), [0, 0, 0, 0])
+
+    def get_rows(self, category):
+        """ Return budget rows of category, biggest mipmapped size first
+
+        :param category: BUDGET_FILE, BUDGET_REFERENCE or BUDGET_SHADING_GROUP
+        :return: list of (name, uncompressed, mipmapped, file count,
+                 unknown count)
+        """
+        if self.is_dirty:
+            self.build()
+
+        rows = []
+        for (row_category, name), total in self.totals.iteritems():
+            if row_category != category:
+                continue
+            if category == BUDGET_FILE:
+                name = self.files[name][0]
+            rows.append((name, ) + tuple(total))
+        rows.sort(key=lambda row: row[2], reverse=True)
+
+        return rows
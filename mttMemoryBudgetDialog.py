@@ -0,0 +1,134 @@
+# Qt import
+from PySide.QtGui import *
+from PySide.QtCore import *
+
+# custom import
+from mttCmdUi import get_maya_window
+from mttConfig import WINDOW_TITLE, WINDOW_ICON
+from mttModel import get_size_text
+from mttMemoryBudget import (
+    BUDGET_FILE, BUDGET_REFERENCE, BUDGET_SHADING_GROUP,
+    BUDGET_CATEGORY_LABEL)
+
+
+BUDGET_HEADER = ('Name', 'Files', 'Uncompressed', 'Mipmapped', '% Scene')
+# biggest consumers are highlighted
+BUDGET_TOP_COUNT = 10
+BUDGET_TOP_COLOR = QColor(230, 120, 60)
+# milliseconds between two checks of budget changes
+BUDGET_REFRESH_INTERVAL = 500
+
+
+class _BudgetItem(QTreeWidgetItem):
+    """ Tree item sorted by its values instead of its texts """
+
+    def __lt__(self, other):
+        column = self.treeWidget().sortColumn()
+        return self.data(column, Qt.UserRole) < \
+            other.data(column, Qt.UserRole)
+
+
+class MTTMemoryBudgetDialog(QDialog):
+    """ Texture memory estimated per file, reference or shading group
+
+    Budget is refreshed while the dialog is shown, totals grow as image
+    headers are read in background.
+    """
+
+    def __init__(self, model, parent=get_maya_window()):
+        super(MTTMemoryBudgetDialog, self).__init__(parent)
+
+        self.model = model
+        self.revision = None
+
+        # create UI
+        main_layout = QVBoxLayout(self)
+        main_layout.setSpacing(2)
+        main_layout.setContentsMargins(4, 4, 4, 4)
+
+        top_layout = QHBoxLayout()
+        self.category_combo = QComboBox()
+        for category in (BUDGET_FILE, BUDGET_REFERENCE, BUDGET_SHADING_GROUP):
+            self.category_combo.addItem(
+                BUDGET_CATEGORY_LABEL[category], category)
+        self.category_combo.currentIndexChanged.connect(self.on_category)
+        top_layout.addWidget(self.category_combo)
+        self.total_label = QLabel()
+        top_layout.addWidget(self.total_label, 1)
+        main_layout.addLayout(top_layout)
+
+        self.budget_tree = QTreeWidget()
+        self.budget_tree.setRootIsDecorated(False)
+        self.budget_tree.setAlternatingRowColors(True)
+        self.budget_tree.setHeaderLabels(BUDGET_HEADER)
+        self.budget_tree.setColumnWidth(0, 300)
+        self.budget_tree.setSortingEnabled(True)
+        self.budget_tree.sortByColumn(3, Qt.DescendingOrder)
+        main_layout.addWidget(self.budget_tree)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(BUDGET_REFRESH_INTERVAL)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+        # adjust UI
+        self.setWindowTitle('%s - Texture Memory Budget' % WINDOW_TITLE)
+        self.setWindowIcon(QIcon(WINDOW_ICON))
+        self.resize(650, 400)
+
+    def showEvent(self, event):
+        self.refresh(force=True)
+        self.refresh_timer.start()
+        super(MTTMemoryBudgetDialog, self).showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super(MTTMemoryBudgetDialog, self).hideEvent(event)
+
+    def on_category(self):
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """ Fill tree again if budget changed since last refresh """
+        budget = self.model.get_memory_budget()
+        total = budget.get_total()
+        if budget.revision == self.revision and not force:
+            return
+        self.revision = budget.revision
+
+        unknown_text = ', %d without header' % total[3] if total[3] else ''
+        self.total_label.setText(
+            'Scene : %s uncompressed, %s mipmapped, %d files%s' % (
+                get_size_text(total[0]), get_size_text(total[1]), total[2],
+                unknown_text))
+
+        category = self.category_combo.itemData(
+            self.category_combo.currentIndex())
+        items = []
+        top_font = QFont()
+        top_font.setBold(True)
+        for rank, (name, uncompressed, mipmapped, file_count,
+                   unknown_count) in enumerate(budget.get_rows(category)):
+            ratio = 100.0 * mipmapped / total[1] if total[1] else 0.0
+            values = (name, file_count, uncompressed, mipmapped, ratio)
+            texts = (
+                name,
+                '%d (%d unread)' % (file_count, unknown_count)
+                if unknown_count else str(file_count),
+                get_size_text(uncompressed), get_size_text(mipmapped),
+                '%.1f' % ratio)
+            item = _BudgetItem()
+            for column, (value, text) in enumerate(zip(values, texts)):
+                item.setText(column, text)
+                item.setData(column, Qt.UserRole, value)
+                if column:
+                    item.setTextAlignment(
+                        column, Qt.AlignRight | Qt.AlignVCenter)
+                if rank < BUDGET_TOP_COUNT and mipmapped:
+                    item.setFont(column, top_font)
+                    item.setForeground(column, QBrush(BUDGET_TOP_COLOR))
+            items.append(item)
+
+        self.budget_tree.setSortingEnabled(False)
+        self.budget_tree.clear()
+        self.budget_tree.addTopLevelItems(items)
+        self.budget_tree.setSortingEnabled(True)
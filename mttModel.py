@@ -2,9 +2,11 @@
 import sys
 import os
 import sqlite3
-import re
+from contextlib import contextmanager
+from operator import attrgetter
+from time import time
 # PySide import
-from PySide.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
 from PySide.QtGui import QItemSelectionModel
 # Maya import
 from maya import cmds
@@ -12,8 +14,89 @@ from maya import cmds
 from mttConfig import (
     MTTSettings,
     NODE_NAME, NODE_FILE, NODE_TYPE, NODE_REFERENCE, FILE_STATE, FILE_COUNT,
-    VIEW_COLUMN_LABEL, DB_COLUMN_LABEL, COLUMN_COUNT)
-from mttCmd import mtt_log, set_attr
+    FILE_TILES, IMAGE_WIDTH, IMAGE_HEIGHT, IMAGE_CHANNELS, IMAGE_DEPTH,
+    IMAGE_FORMAT, FILE_SIZE, FILE_CONTENT, IMAGE_COLUMNS, VIEW_COLUMN_LABEL,
+    COLUMN_COUNT)
+from mttCmd import (
+    mtt_log, get_attr_values, set_attr, convert_to_relative_path)
+from mttFileState import MTTFileStateCache
+from mttImageInfo import MTTImageInfoCache
+from mttContentHash import MTTContentHashCache
+from mttMemoryBudget import MTTMemoryBudget
+from mttRelink import MTTRelinkIndex
+from mttRowStore import MTTRowStore
+from mttPathResolver import MTTPathResolver
+from mttSceneCache import MTTSceneCache
+from mttEventQueue import MTTFileChangeQueue
+from mttExport import (
+    EXTRA_COLUMNS, REPORT_WRITERS, export_report, get_content_hash)
+from mttTextureIndex import (
+    MTTTextureIndex, DB_SCHEMA_VERSION, iter_chunks, sql_in,
+    convert_to_key_path)
+
+
+# MTTRow attribute shown in each column
+COLUMN_ATTRIBUTES = {
+    NODE_NAME: 'name',
+    NODE_TYPE: 'type',
+    NODE_REFERENCE: 'is_ref',
+    FILE_STATE: 'file.state',
+    FILE_COUNT: 'file.instance_count',
+    NODE_FILE: 'norm_path',
+    FILE_TILES: 'file.tile_count',
+    IMAGE_WIDTH: 'file.width',
+    IMAGE_HEIGHT: 'file.height',
+    IMAGE_CHANNELS: 'file.channels',
+    IMAGE_DEPTH: 'file.bit_depth',
+    IMAGE_FORMAT: 'file.format',
+    FILE_SIZE: 'file.size',
+    FILE_CONTENT: 'file.content_hash',
+}
+COLUMN_GETTERS = dict(
+    (column_id, attrgetter(attribute))
+    for column_id, attribute in COLUMN_ATTRIBUTES.iteritems())
+# missing tiles listed in tooltip
+TOOLTIP_TILE_COUNT = 20
+# milliseconds between two applications of read image metadata and maximum
+# file count applied each time
+IMAGE_INFO_INTERVAL = 200
+IMAGE_INFO_CHUNK = 2000
+# files with the same content listed in tooltip
+TOOLTIP_FILE_COUNT = 10
+
+# node changes above this count reset the model instead of per row updates
+BATCH_RESET_THRESHOLD = 64
+
+# SQL expression sorting virtual rows, whether it can be NULL and its
+# ROW_QUERY column
+SORT_EXPRESSIONS = {
+    NODE_NAME: ('N.Name', False, 0),
+    NODE_TYPE: ('N.Type', False, 1),
+    NODE_REFERENCE: ('N.IsRef', False, 2),
+    FILE_STATE: ('F.State', True, 3),
+    FILE_COUNT: ('F.InstanceCount', True, 4),
+    NODE_FILE: ('N.Attribute', True, 5),
+    FILE_TILES: ('F.TileCount', True, 8),
+    IMAGE_WIDTH: ('F.Width', True, 10),
+    IMAGE_HEIGHT: ('F.Height', True, 11),
+    IMAGE_CHANNELS: ('F.Channels', True, 12),
+    IMAGE_DEPTH: ('F.BitDepth', True, 13),
+    IMAGE_FORMAT: ('F.Format', True, 14),
+    FILE_SIZE: ('F.FileSize', True, 15),
+    FILE_CONTENT: ('F.ContentHash', True, 16),
+}
+
+
+def get_size_text(size):
+    """ Return human readable file size """
+    if size is None:
+        return ''
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return '%d %s' % (size, unit) if unit == 'B' \
+                else '%.1f %s' % (size, unit)
+        size /= 1024.0
+    return '%.1f TB' % size
 
 
 # noinspection SqlResolve
@@ -27,16 +110,65 @@ class MTTModel(QAbstractTableModel):
         QAbstractTableModel.__init__(self)
         self.table_view = None
         self.watcher = watcher
+        self.file_changes = MTTFileChangeQueue(
+            self.file_watch_apply_changes,
+            delay=MTTSettings.value('fileReloadDelay'),
+            max_wait=MTTSettings.value('fileReloadMaxWait'), parent=self)
         self.watcher.fileChanged.connect(self.file_watch_file_change)
         self.watcher.directoryChanged.connect(self.file_watch_directory_change)
         self.is_reloading_file = False
-        self.suspend_force_sort = False
+        self.batch_updated_rows = []
+        self.batch_new_rows = []
+        self.is_batch_rolled_back = False
         self.supported_format_dict = dict(
             [(n_type, nodeAttr) for n_type, nice, nodeAttr in MTTSettings.SUPPORTED_TYPE])
-        self.db = None
+        self.file_states = MTTFileStateCache(
+            ttl=MTTSettings.value('fileStateCacheTTL'),
+            workers=MTTSettings.value('fileStateWorkers'))
+        self.image_infos = MTTImageInfoCache(
+            workers=MTTSettings.value('imageInfoWorkers'))
+        self.image_info_timer = QTimer(self)
+        self.image_info_timer.setInterval(IMAGE_INFO_INTERVAL)
+        self.image_info_timer.timeout.connect(self._apply_image_infos)
+        self.content_hashes = MTTContentHashCache(
+            os.path.join(os.path.dirname(MTTSettings.filename()),
+                         'contentHash.db'),
+            workers=MTTSettings.value('contentHashWorkers'))
+        self.content_hash_timer = QTimer(self)
+        self.content_hash_timer.setInterval(IMAGE_INFO_INTERVAL)
+        self.content_hash_timer.timeout.connect(self._apply_content_hashes)
+        self.texture_index = MTTTextureIndex(
+            cmds, MTTSettings.SUPPORTED_TYPE, file_states=self.file_states,
+            resolver=MTTPathResolver(
+                MTTSettings.PATH_RULES, MTTSettings.CUSTOM_ROOTS,
+                ttl=MTTSettings.value('fileStateCacheTTL')),
+            get_attr_values=get_attr_values,
+            file_added_callback=self.file_watch_add_path)
+        self.scene_cache = MTTSceneCache(
+            os.path.join(os.path.dirname(MTTSettings.filename()), 'sceneCache'),
+            DB_SCHEMA_VERSION, migrate=MTTTextureIndex.migrate,
+            max_entries=MTTSettings.value('sceneCacheMaxEntries'),
+            max_age=MTTSettings.value('sceneCacheMaxAge'))
+        self.row_store = MTTRowStore()
+        self.sort_column = NODE_NAME
+        self.sort_order = Qt.AscendingOrder
+        self.row_ids = dict()
+        self.dir_listings = dict()
+        # virtual rows are fetched page by page from database
+        self.is_virtual = False
+        self.last_sort_key = None
+        self.is_fetched_all = True
+        self.is_window_dirty = False
+        self.filter_proxy = None
+        self.is_image_sort_dirty = False
+        self.is_content_sort_dirty = False
+        # created when a memory report is first requested
+        self.memory_budget = None
+        # created when missing files are first searched
+        self.relink_index = None
         # create database table
         try:
-            self._database_create_table()
+            self.texture_index.create()
         except sqlite3.Error, e:
             mtt_log('Error init DB :\n\t>> %s <<\n' % e, msg_type='error',
                     verbose=False)
@@ -44,240 +176,876 @@ class MTTModel(QAbstractTableModel):
 
         # populate database
         self.textures = self._database_populate
+        self._sort_rows(self.sort_column, self.sort_order)
+        self.request_image_infos()
+        self.request_content_hashes()
 
-    def _database_create_table(self):
-        """ Create database table """
-        self.database_close()
-        self.db = sqlite3.connect(':memory:')
-        c = self.db.cursor()
+    @property
+    def db(self):
+        return self.texture_index.db
 
-        c.execute(
-            'CREATE TABLE NodesTable('
-            'Id INTEGER PRIMARY KEY AUTOINCREMENT, '
-            'Name TEXT, '
-            'Type TEXT, '
-            'Attribute TEXT, '
-            'IsRef INTEGER, '
-            'FileId INTEGER, '
-            'RefName TEXT)'
-        )
-        c.execute(
-            'CREATE TABLE FilesTable('
-            'FileId INTEGER PRIMARY KEY AUTOINCREMENT, '
-            'KeyPath TEXT, '
-            'FilePath TEXT, '
-            'State INTEGER, '
-            'InstanceCount INTEGER)'
-        )
-        c.execute(
-            'CREATE TABLE RefTable('
-            'RefName TEXT PRIMARY KEY, '
-            'RefPath TEXT, '
-            'RefSourceImage TEXT)'
-        )
+    @property
+    def batch_depth(self):
+        return self.texture_index.batch_depth
+
+    @property
+    def populate_timings(self):
+        return self.texture_index.populate_timings
 
     @property
     def _database_populate(self):
-        """ Populate database """
-        # get cursor
-        c = self.db.cursor()
+        """ Populate database from scene cache or from a scene scan """
+        index = self.texture_index
+        scene_key = self.get_scene_cache_key()
+        if scene_key is not None and self.scene_cache.load(
+                self.db, scene_key, validate=index.validate_snapshot):
+            file_count, changed_count = index.refresh_snapshot()
+            mtt_log(
+                'Scene loaded from cache in %.3fs: %d files, %d states '
+                'changed (cache hits %d, misses %d)' % (
+                    index.populate_timings[0][1], file_count, changed_count,
+                    self.scene_cache.hits, self.scene_cache.misses),
+                add_tag='PERF', verbose=False)
+        else:
+            node_count, file_count = index.scan()
+            mtt_log(
+                'Scene scanned in %.3fs: %d nodes, %d files (%s)' % (
+                    sum([duration for phase, duration
+                         in index.populate_timings]),
+                    node_count, file_count,
+                    ', '.join(['%s %.3fs' % t
+                               for t in index.populate_timings])),
+                add_tag='PERF', verbose=False)
+            if scene_key is not None:
+                try:
+                    self.scene_cache.save(self.db, scene_key)
+                except (IOError, OSError, sqlite3.Error), e:
+                    mtt_log('Scene cache not saved : %s' % e,
+                            msg_type='warning', verbose=False)
 
-        # add current workspace to first key of RefTable
-        sourceimage_folder = 'sourceimages'
-        if 'sourceImages' in cmds.workspace(fileRuleList=True):
-            sourceimage_folder = cmds.workspace(fileRuleEntry='sourceImages')
-        workspace_path = cmds.workspace(query=True, rootDirectory=True)
-        c.execute(
-            'INSERT INTO RefTable(RefName, RefPath, RefSourceImage) '
-            'VALUES (?, ?, ?)',
-            ('ROOT', workspace_path, sourceimage_folder)
-        )
-
-        # parse all nodes with supported type
-        for n_type, nice_name, node_attr in MTTSettings.SUPPORTED_TYPE:
-
-            nodes = cmds.ls(exactType=n_type)
-
-            for node in nodes:
-
-                ref_name = 'ROOT'
-
-                # special reference node case
-                is_reference = cmds.referenceQuery(node, isNodeReferenced=True)
-                if is_reference:
-                    is_new, ref_name, root_path, sourceimages_folder = \
-                        self.get_reference_info(node)
-
-                    if is_new:
-                        c.execute(
-                            'INSERT INTO '
-                            'RefTable(RefName, RefPath, RefSourceImage) '
-                            'VALUES (?, ?, ?)',
-                            (ref_name, root_path, sourceimages_folder)
-                        )
-
-                # format nicename
-                if nice_name is '' or nice_name is None:
-                    nice_name = n_type
-
-                value = cmds.getAttr('%s.%s' % (node, node_attr))
-                file_path = self.get_attribute_absolute_file_path(node, value)
-                last_id = self.database_add_file(file_path)
-
-                # add current node to database
-                c.execute(
-                    'INSERT INTO '
-                    'NodesTable(Name, Type, Attribute, IsRef, FileId, RefName) '
-                    'VALUES (?, ?, ?, ?, ?, ?)',
-                    (node, nice_name, value, is_reference, last_id, ref_name)
-                )
+        # return node texture list
+        self.row_store.clear()
 
-        self.db.commit()
+        threshold = MTTSettings.value('virtualRowsThreshold')
+        self.is_virtual = 0 < threshold <= index.get_node_count()
+        if self.is_virtual:
+            # first page is fetched by _sort_rows
+            return []
 
-        # return node texture list
-        c.execute('SELECT Name, Type, IsRef FROM NodesTable')
+        return self._cache_rows()[1]
+
+    @staticmethod
+    def get_scene_cache_key():
+        """ Return scene cache key, None if current scene can't be cached
 
-        return c.fetchall()
+        Key depends on scene path and modification time, top level
+        references, workspace and supported node types.
+        """
+        if not MTTSettings.value('sceneCache'):
+            return None
+
+        scene_path = cmds.file(query=True, sceneName=True)
+        if not scene_path or not os.path.isfile(scene_path) \
+                or cmds.file(query=True, modified=True):
+            return None
+
+        references = [
+            (ref_path, os.path.getmtime(ref_path))
+            for ref_path in cmds.file(
+                query=True, reference=True, withoutCopyNumber=True) or []
+            if os.path.isfile(ref_path)]
+
+        return MTTSceneCache.get_key(
+            scene_path, os.path.getmtime(scene_path), references,
+            cmds.workspace(query=True, rootDirectory=True),
+            MTTSettings.SUPPORTED_TYPE)
+
+    def _cache_rows(self, where='', parameters=()):
+        """ Create or refresh cached rows of nodes matching where clause
+
+        Existing rows are updated in place so self.textures stays valid.
+
+        :param where: SQL clause appended to ROW_QUERY
+        :param parameters: where clause parameters
+        :return: updated rows and new rows lists
+        """
+        return self.row_store.cache_rows(
+            self.texture_index.get_rows(where, parameters))
+
+    def _refresh_rows(self, where, parameters=()):
+        """ Refresh cached rows and apply changes to model rows
+
+        New rows are inserted at their sorted position, updated rows are moved
+        only if their sort key changed.
+
+        :param where: SQL clause appended to ROW_QUERY
+        :param parameters: where clause parameters
+        """
+        if self.is_virtual:
+            self._reload_window()
+            return
+
+        updated_rows, new_rows = self._cache_rows(where, parameters)
+        if self.batch_depth:
+            self.batch_updated_rows.extend(updated_rows)
+            self.batch_new_rows.extend(new_rows)
+            return
+
+        self._update_rows(updated_rows)
+        self._insert_rows(new_rows)
+
+    def _refresh_file_rows(self, *file_ids):
+        """ Refresh rows of nodes using file_ids """
+        file_ids = [file_id for file_id in set(file_ids) if file_id is not None]
+        for chunk in iter_chunks(file_ids):
+            self._refresh_rows('WHERE ' + sql_in('N.FileId', chunk), chunk)
+        self._update_memory_budget(file_ids)
+        if file_ids:
+            self.request_image_infos(missing_only=True, file_ids=file_ids)
+            self.request_content_hashes()
+
+    def _row_sort_key(self, row):
+        return COLUMN_GETTERS[self.sort_column](row), row.name
+
+    def _sort_rows(self, column_id, sort_order):
+        """ Sort cached rows without notifying views """
+        self.sort_column = column_id
+        self.sort_order = sort_order
+        if self.is_virtual:
+            self._fetch_window(len(self.textures))
+            return
+
+        self.textures.sort(
+            key=attrgetter(COLUMN_ATTRIBUTES[column_id], 'name'),
+            reverse=sort_order == Qt.DescendingOrder)
+        get_value = COLUMN_GETTERS[column_id]
+        for row in self.textures:
+            row.sort_value = get_value(row)
+            row.sort_name = row.name
+        self.row_ids.clear()
+        self._index_rows()
+
+    def _index_rows(self, start=0, end=None):
+        """ Update node name to row id index from start to end row """
+        if end is None:
+            end = len(self.textures)
+        for row_id in xrange(start, end):
+            self.row_ids[self.textures[row_id].name] = row_id
+
+    def _sort_position(self, sort_key):
+        """ Return insert position of sort_key using a binary search """
+        low, high = 0, len(self.textures)
+        is_descending = self.sort_order == Qt.DescendingOrder
+        while low < high:
+            middle = (low + high) // 2
+            row = self.textures[middle]
+            if is_descending:
+                is_before = sort_key > (row.sort_value, row.sort_name)
+            else:
+                is_before = sort_key < (row.sort_value, row.sort_name)
+            if is_before:
+                high = middle
+            else:
+                low = middle + 1
+
+        return low
+
+    # -------------------------------------------------------------------------
+    # virtual rows
+    def _virtual_sort_key(self, data):
+        """ Return SQL sort value and node name of a ROW_QUERY result """
+        return data[SORT_EXPRESSIONS[self.sort_column][2]], data[0]
+
+    def _get_filter(self):
+        """ Return SQL condition and parameters of proxy filters """
+        if self.filter_proxy is None:
+            return '', []
+        return self.filter_proxy.get_sql_filter(self.texture_index)
+
+    def _get_virtual_query(self, after=None, until=None):
+        """ Return WHERE and ORDER BY clauses of filtered nodes in view order
+
+        Keyset pagination: rows are selected after or until a sort key
+        instead of using an offset, each page query seeks the sort column
+        index. NULL values sort first like in SQLite.
+
+        :param after: sort key of last fetched row, excluded
+        :param until: sort key of last wanted row, included
+        :return: SQL clauses and parameters
+        """
+        expression, is_nullable = SORT_EXPRESSIONS[self.sort_column][:2]
+        is_descending = self.sort_order == Qt.DescendingOrder
+        where, parameters = self._get_filter()
+        clauses = [where] if where else []
+        parameters = list(parameters)
+
+        for key, is_greater, name_operator in (
+                (after, not is_descending, '<' if is_descending else '>'),
+                (until, is_descending, '>=' if is_descending else '<=')):
+            if key is None:
+                continue
+            value, node_name = key
+            if value is None and is_greater:
+                clause = '(%s IS NOT NULL OR N.Name %s ?)' % (
+                    expression, name_operator)
+                parameters.append(node_name)
+            elif value is None:
+                clause = '(%s IS NULL AND N.Name %s ?)' % (
+                    expression, name_operator)
+                parameters.append(node_name)
+            else:
+                clause = '(%s %s ? AND (%s %s ? OR N.Name %s ?))' % (
+                    expression, '>=' if is_greater else '<=',
+                    expression, '>' if is_greater else '<', name_operator)
+                parameters.extend((value, value, node_name))
+                if is_nullable and not is_greater:
+                    clause = '(%s OR %s IS NULL)' % (clause, expression)
+            clauses.append(clause)
+
+        order = 'DESC' if is_descending else 'ASC'
+        query = 'WHERE %s ' % ' AND '.join(clauses) if clauses else ''
+        query += 'ORDER BY %s %s, N.Name %s' % (expression, order, order)
+
+        return query, parameters
+
+    def _query_virtual_rows(self, after=None, until=None, limit=None):
+        """ Return ROW_QUERY results of filtered nodes in view order """
+        query, parameters = self._get_virtual_query(after, until)
+        if limit is not None:
+            query += ' LIMIT ?'
+            parameters.append(limit)
+
+        return self.texture_index.get_rows(query, parameters)
+
+    def _add_virtual_rows(self, rows_data):
+        """ Append rows of fetched ROW_QUERY results to virtual rows """
+        position = len(self.textures)
+        self.textures.extend(self.row_store.cache_rows(rows_data)[1])
+        if rows_data:
+            self.last_sort_key = self._virtual_sort_key(rows_data[-1])
+        self._index_rows(position)
+
+    def _fetch_window(self, count):
+        """ Replace virtual rows by count first rows without notifying views
+
+        At least one page is fetched.
+        """
+        count = max(count, MTTSettings.value('virtualRowsPageSize'))
+        rows = self._query_virtual_rows(limit=count)
+        self.is_fetched_all = len(rows) < count
+        self.textures = []
+        self.last_sort_key = None
+        self.row_store.clear()
+        self.row_ids.clear()
+        self._add_virtual_rows(rows)
+
+    def _reload_window(self, count=None):
+        """ Query virtual rows again after a database or filter change
+
+        Persistent indexes follow their node so selection is kept. Reload is
+        deferred to the end of a running batch.
+
+        :param count: (int) row count to fetch, current row count if None
+        """
+        if self.batch_depth:
+            self.is_window_dirty = True
+            return
+        self.is_window_dirty = False
+
+        self.layoutAboutToBeChanged.emit()
+        indexes = self.persistentIndexList()
+        names = [self.textures[index.row()].name
+                 if index.row() < len(self.textures) else None
+                 for index in indexes]
+        self._fetch_window(len(self.textures) if count is None else count)
+        self.changePersistentIndexList(indexes, [
+            self.index(self.row_ids[name], index.column())
+            if name in self.row_ids else QModelIndex()
+            for index, name in zip(indexes, names)])
+        self.layoutChanged.emit()
+
+    def _fetch_until(self, node_name):
+        """ Fetch virtual rows up to node_name if it passes filters """
+        if self.is_fetched_all or node_name in self.row_ids:
+            return
+        data = self.texture_index.get_node(node_name)
+        if data is None:
+            return
+
+        rows = self._query_virtual_rows(
+            after=self.last_sort_key,
+            until=self._virtual_sort_key(data))
+        if rows:
+            position = len(self.textures)
+            self.beginInsertRows(
+                QModelIndex(), position, position + len(rows) - 1)
+            self._add_virtual_rows(rows)
+            self.endInsertRows()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return self.is_virtual and not self.is_fetched_all \
+            and not parent.isValid()
+
+    def fetchMore(self, parent=QModelIndex()):
+        """ Append next page of virtual rows """
+        if not self.canFetchMore(parent):
+            return
+
+        page_size = MTTSettings.value('virtualRowsPageSize')
+        rows = self._query_virtual_rows(
+            after=self.last_sort_key,
+            limit=page_size)
+        self.is_fetched_all = len(rows) < page_size
+        if not rows:
+            return
+
+        position = len(self.textures)
+        self.beginInsertRows(QModelIndex(), position, position + len(rows) - 1)
+        self._add_virtual_rows(rows)
+        self.endInsertRows()
+
+    def set_filter_proxy(self, proxy):
+        """ Set proxy whose filters are applied by database to virtual rows
+
+        :param proxy: MTTProxy instance
+        """
+        self.filter_proxy = proxy
+        if self.is_virtual:
+            self._reload_window(0)
+
+    def get_filtered_node_count(self):
+        """ Return count of nodes passing proxy filters """
+        where, parameters = self._get_filter()
+        return self.texture_index.get_row_count(
+            'WHERE %s' % where if where else '', parameters)
+
+    def get_filtered_node_names(self):
+        """ Return names of nodes passing proxy filters in view order """
+        return self.texture_index.get_row_names(*self._get_virtual_query())
+
+    def _insert_rows(self, rows):
+        for row in rows:
+            row.sort_value, row.sort_name = self._row_sort_key(row)
+            position = self._sort_position((row.sort_value, row.sort_name))
+            self.beginInsertRows(QModelIndex(), position, position)
+            self.textures.insert(position, row)
+            self._index_rows(position)
+            self.endInsertRows()
+
+    def _remove_row(self, position):
+        self.beginRemoveRows(QModelIndex(), position, position)
+        self.row_ids.pop(self.textures[position].name, None)
+        del self.textures[position]
+        self._index_rows(position)
+        self.endRemoveRows()
+
+    def _discard_row(self, node_name):
+        """ Remove node row from model or from rows deferred by batch """
+        if self.is_virtual:
+            self._reload_window()
+            return
+
+        position = self.row_ids.get(node_name)
+        if position is not None:
+            self._remove_row(position)
+        if self.batch_depth:
+            self.batch_new_rows = [
+                row for row in self.batch_new_rows
+                if row.name != node_name]
+            self.batch_updated_rows = [
+                row for row in self.batch_updated_rows
+                if row.name != node_name]
+
+    def _update_rows(self, rows):
+        for row in rows:
+            position = self.row_ids[row.name]
+            sort_key = self._row_sort_key(row)
+
+            if sort_key != (row.sort_value, row.sort_name):
+                del self.textures[position]
+                new_position = self._sort_position(sort_key)
+                self.textures.insert(position, row)
+
+                # beginMoveRows expects destination before the move
+                destination = new_position + int(new_position >= position)
+                if self.beginMoveRows(
+                        QModelIndex(), position, position,
+                        QModelIndex(), destination):
+                    del self.textures[position]
+                    self.textures.insert(new_position, row)
+                    row.sort_value, row.sort_name = sort_key
+                    self._index_rows(
+                        min(position, new_position),
+                        max(position, new_position) + 1)
+                    self.endMoveRows()
+                    position = new_position
+                else:
+                    row.sort_value, row.sort_name = sort_key
+
+            self.dataChanged.emit(
+                self.index(position, 0),
+                self.index(position, COLUMN_COUNT - 1))
 
     def database_reset(self):
-        self._database_create_table()
+        self.texture_index.create()
         self.textures = self._database_populate
+        self._sort_rows(self.sort_column, self.sort_order)
         self.reset()
         self.request_sort()
+        if self.memory_budget is not None:
+            self.memory_budget.reset()
+        self.request_image_infos()
+        self.request_content_hashes()
 
-    def database_close(self):
-        """ Close database connection """
-        if self.db:
-            self.db.close()
-            self.db = None
-
-    def database_add_new_node(self, node_name):
-        node_type = cmds.nodeType(node_name)
-        type_nicename, attr = self.get_nicename_and_attribute_name(node_type)
-        attr_value = cmds.getAttr('%s.%s' % (node_name, attr))
-        file_path = self.get_attribute_absolute_file_path(node_name, attr_value)
-        last_id = self.database_add_file(file_path)
-
-        # add current node to database
-        c = self.db.cursor()
-        c.execute(
-            'INSERT INTO '
-            'NodesTable(Name, Type, Attribute, IsRef, FileId, RefName) '
-            'VALUES (?, ?, ?, ?, ?, ?)',
-            (node_name, type_nicename, attr_value, False, last_id, 'ROOT')
-        )
+    # -------------------------------------------------------------------------
+    # image metadata
+    @staticmethod
+    def is_image_info_visible():
+        """ Return True if a column showing image metadata is visible """
+        return any([MTTSettings.value('columnVisibility_%s' % column_id)
+                    for column_id in IMAGE_COLUMNS])
+
+    def request_image_infos(self, key_paths=None, missing_only=False,
+                            file_ids=None):
+        """ Read image metadata of files in background
+
+        Headers are read by a thread pool, results are stored in database and
+        shown by a timer so views stay responsive. Nothing is read while
+        image columns are hidden and no memory budget was requested.
+
+        :param key_paths: (iterable) key paths of files, all files if None
+        :param missing_only: (bool) only files never read
+        :param file_ids: (iterable) ids of files, used if key_paths is None
+        """
+        if not self.is_image_info_visible() and self.memory_budget is None:
+            return
 
-    def database_add_file(self, file_path):
-        file_state = self.get_file_state(file_path)
-        instance_count = self.get_file_instance_count(file_path)
-        key_path = self.convert_to_key_path(file_path)
+        files = self.texture_index.get_image_files(
+            key_paths, missing_only, file_ids)
+        if files:
+            self.image_infos.request(files)
+            self.image_info_timer.start()
 
-        c = self.db.cursor()
-        if instance_count == 0:
-            # register current file data
-            c.execute(
-                'INSERT INTO '
-                'FilesTable(KeyPath, FilePath, State, InstanceCount) '
-                'VALUES (?, ?, ?, ?)',
-                (key_path, file_path, file_state, 1)
-            )
-            last_id = c.lastrowid
-            self.file_watch_add_path(file_path)
+    def _apply_image_infos(self):
+        """ Store image metadata read since last call and show it
+
+        Rows sorted by an image column are sorted again once all requested
+        files are read.
+        """
+        if self.batch_depth:
+            return
+
+        is_loading = self.image_infos.pending_count > 0
+        results = self.image_infos.pop_results(IMAGE_INFO_CHUNK)
+        if not is_loading and not self.image_infos.result_count:
+            self.image_info_timer.stop()
+
+        if results:
+            key_paths = self.texture_index.update_image_infos(results)
+            for chunk in iter_chunks(key_paths):
+                self.row_store.update_files(self.texture_index.get_rows(
+                    'WHERE ' + sql_in('F.KeyPath', chunk), chunk))
+            if self.memory_budget is not None:
+                self.memory_budget.update_file_memory(
+                    self.texture_index.get_file_ids(key_paths))
+            self.is_image_sort_dirty |= self.sort_column in IMAGE_COLUMNS
+            if self.textures:
+                self.dataChanged.emit(
+                    self.index(0, IMAGE_WIDTH),
+                    self.index(len(self.textures) - 1, FILE_SIZE))
+
+        if self.is_image_sort_dirty and not self.image_info_timer.isActive():
+            self.is_image_sort_dirty = False
+            self._sort_loaded_rows()
+
+    def _sort_loaded_rows(self):
+        """ Sort and filter rows again once background values are stored """
+        if self.is_virtual:
+            self._reload_window()
+        elif self.table_view:
+            self.sort(self.sort_column, self.sort_order)
         else:
-            # update current file data
-            c.execute(
-                'UPDATE '
-                'FilesTable SET InstanceCount=InstanceCount + 1 '
-                'WHERE KeyPath=?', (key_path, ))
-            c.execute(
-                'SELECT FileId '
-                'FROM FilesTable '
-                'WHERE KeyPath=?', (key_path, ))
-            last_id = c.fetchone()[0]
-
-        return last_id
-
-    def database_remove_node(self, node_name):
-        model_id = self.get_node_model_id(node_name)
-        self.beginRemoveRows(QModelIndex(), model_id.row(), model_id.row())
+            self._sort_rows(self.sort_column, self.sort_order)
 
-        c = self.db.cursor()
-        c.execute(
-            'SELECT FileId '
-            'FROM NodesTable LEFT JOIN FilesTable USING (FileId) '
-            'WHERE Name=?', (node_name, ))
+    # -------------------------------------------------------------------------
+    # content duplicates
+    @staticmethod
+    def is_content_hash_wanted():
+        """ Return True if duplicate content is shown or filtered """
+        return MTTSettings.value('columnVisibility_%s' % FILE_CONTENT) or \
+            MTTSettings.value('onlyDuplicateState')
 
-        file_id = c.fetchone()[0]
+    def request_content_hashes(self):
+        """ Compare content of existing files in background
 
-        c.execute(
-            'SELECT InstanceCount '
-            'FROM FilesTable '
-            'WHERE FileId=?', (file_id, ))
+        Digests are computed by a thread pool and kept on disk between
+        sessions, results are stored in database and shown by a timer.
+        Nothing is read while duplicates are neither shown nor filtered.
+        """
+        if not self.is_content_hash_wanted():
+            return
+
+        self.content_hashes.request(self.texture_index.get_hash_files())
+        self.content_hash_timer.start()
+
+    def _apply_content_hashes(self):
+        """ Store content digests computed since last call and show them
+
+        Rows sorted or filtered by duplicate content are sorted again once
+        all files are compared.
+        """
+        if self.batch_depth:
+            return
+
+        is_running = self.content_hashes.is_running
+        results = self.content_hashes.pop_results(IMAGE_INFO_CHUNK)
+        if not is_running and not self.content_hashes.result_count:
+            self.content_hash_timer.stop()
+            error = self.content_hashes.pop_error()
+            if error is not None:
+                mtt_log('Content comparison stopped : %s' % error,
+                        msg_type='warning', verbose=False)
+            mtt_log('Content compared: %d files hashed, %d from cache' % (
+                self.content_hashes.misses, self.content_hashes.hits),
+                add_tag='PERF', verbose=False)
+
+        if results:
+            file_ids = self.texture_index.update_content_hashes(results)
+            for chunk in iter_chunks(file_ids):
+                self.row_store.update_files(self.texture_index.get_rows(
+                    'WHERE ' + sql_in('N.FileId', chunk), chunk))
+            if file_ids:
+                self.is_content_sort_dirty |= \
+                    self.sort_column == FILE_CONTENT or \
+                    MTTSettings.value('onlyDuplicateState')
+                if self.textures:
+                    self.dataChanged.emit(
+                        self.index(0, FILE_CONTENT),
+                        self.index(len(self.textures) - 1, FILE_CONTENT))
+
+        if self.is_content_sort_dirty and \
+                not self.content_hash_timer.isActive():
+            self.is_content_sort_dirty = False
+            self._sort_loaded_rows()
+
+    # -------------------------------------------------------------------------
+    # memory budget
+    def get_memory_budget(self):
+        """ Return texture memory budget of scene
+
+        Budget is created on first call, headers of files never read are
+        then read in background and totals follow every file change.
+        """
+        if self.memory_budget is None:
+            self.memory_budget = MTTMemoryBudget(self.texture_index, cmds)
+            self.request_image_infos(missing_only=True)
+
+        return self.memory_budget
+
+    def _update_memory_budget(self, file_ids):
+        if self.memory_budget is not None:
+            self.memory_budget.update_files(file_ids)
 
-        if c.fetchone()[0] == 1:
-            c.execute(
-                'DELETE FROM FilesTable '
-                'WHERE FileId=?', (file_id, ))
+    # -------------------------------------------------------------------------
+    # relink
+    def get_relink_roots(self):
+        """ Return folders searched for missing files
 
+        Folders added by user come first, then custom roots of path
+        resolution and sourceimages folders of scene and referenced projects.
+        """
+        roots = [root for root in MTTSettings.value('relinkRoots').split(';;')
+                 if root]
+        roots.extend(self.texture_index.resolver.custom_roots)
+        roots.extend(self.texture_index.get_project_folders())
+
+        return roots
+
+    def find_relink_candidates(self):
+        """ Return list of (missing file path, node names, candidate paths)
+
+        Search roots are listed on first call, later calls list again only
+        folders changed since. Candidates are sorted best first.
+        """
+        start = time()
+        if self.relink_index is None:
+            self.relink_index = MTTRelinkIndex(
+                workers=MTTSettings.value('relinkWorkers'))
+        self.relink_index.set_roots(self.get_relink_roots())
+        self.relink_index.update()
+
+        file_nodes = self.texture_index.get_missing_file_nodes()
+        candidates = self.relink_index.find_files(file_nodes)
+        mtt_log(
+            '%d missing files searched in %.3fs: %d found, %d ambiguous '
+            '(%d folders listed, %d from cache)' % (
+                len(file_nodes), time() - start,
+                len([paths for paths in candidates.itervalues() if paths]),
+                len([paths for paths in candidates.itervalues()
+                     if len(paths) > 1]),
+                self.relink_index.misses, self.relink_index.hits),
+            add_tag='PERF', verbose=False)
+
+        return [(file_path, sorted(node_names), candidates[file_path])
+                for file_path, node_names in sorted(file_nodes.iteritems())]
+
+    def relink_files(self, new_paths):
+        """ Set new path of missing files on all nodes using them
+
+        Database is updated in one transaction, scene attributes are then
+        set with attribute callbacks suspended.
+
+        :param new_paths: dict of missing file path and new file path
+        :return: names of changed nodes
+        """
+        file_nodes = self.texture_index.get_missing_file_nodes()
+        is_relative = MTTSettings.value('forceRelativePath')
+        new_values = dict()
+        for file_path, new_path in new_paths.iteritems():
+            if is_relative:
+                new_path = convert_to_relative_path(new_path)
+            for node_name in file_nodes.get(file_path, ()):
+                new_values[node_name] = new_path
+
+        changed_nodes = self.change_nodes_attribute(new_values.items())
+        cmds.optionVar(intValue=('suspendCallbacks', True))
+        try:
+            for node_name in changed_nodes:
+                set_attr(node_name,
+                         self.supported_format_dict[cmds.nodeType(node_name)],
+                         new_values[node_name], attr_type='string')
+        finally:
+            cmds.optionVar(intValue=('suspendCallbacks', False))
+
+        return changed_nodes
+
+    @contextmanager
+    def batch(self):
+        """ Group model changes of a user action
+
+        Commits, row updates and sort are deferred to the end of the
+        outermost batch. Database changes of a failing level are rolled back
+        by the texture index and rows are rebuilt from database.
+        """
+        if not self.batch_depth:
+            self.is_batch_rolled_back = False
+
+        try:
+            with self.texture_index.batch():
+                yield
+        except:
+            self.is_batch_rolled_back = True
+            raise
+        finally:
+            if not self.batch_depth:
+                self._apply_batch_rows()
+
+    def _apply_batch_rows(self):
+        """ Apply row changes deferred by batch """
+        updated_rows, self.batch_updated_rows = self.batch_updated_rows, []
+        new_rows, self.batch_new_rows = self.batch_new_rows, []
+
+        if self.is_virtual:
+            if self.is_window_dirty or self.is_batch_rolled_back:
+                self._reload_window()
+            return
+
+        if self.is_batch_rolled_back:
+            self.row_store.clear()
+            self.textures = self._cache_rows()[1]
+            self._sort_rows(self.sort_column, self.sort_order)
+            self.reset()
+            return
+
+        self._insert_rows(new_rows)
+
+        # a row can be updated several times, new rows are already in place
+        skipped_rows = set(id(row) for row in new_rows)
+        unique_rows = []
+        for row in updated_rows:
+            if id(row) not in skipped_rows:
+                skipped_rows.add(id(row))
+                unique_rows.append(row)
+
+        if not self.table_view:
+            self._update_rows(unique_rows)
+        elif len(unique_rows) > BATCH_RESET_THRESHOLD:
+            self.sort(self.sort_column, self.sort_order)
         else:
-            c.execute(
-                'UPDATE FilesTable '
-                'SET InstanceCount=InstanceCount - 1 '
-                'WHERE FileId=?', (file_id, ))
+            self._update_rows(unique_rows)
+            self.request_sort()
 
-        c.execute('DELETE FROM NodesTable WHERE Name=?', (node_name, ))
-        self.endRemoveRows()
+    def database_close(self):
+        """ Close database connection """
+        self.image_info_timer.stop()
+        self.content_hash_timer.stop()
+        self.texture_index.close()
 
-    def get_database_content_as_csv(self):
-        c = self.db.cursor()
-        c.execute(
-            'SELECT Name, Type, IsRef, State, InstanceCount, FilePath '
-            'FROM NodesTable as N '
-            'LEFT JOIN FilesTable as F ON N.FileId=F.FileId '
-            'LEFT JOIN RefTable as R ON N.RefName=R.RefName')
+    def database_apply_node_changes(self, removed_nodes, renamed_nodes,
+                                    added_nodes):
+        """ Apply a batch of scene node changes
+
+        Database is updated in one transaction. Small batches are applied to
+        model rows one by one, bigger ones rebuild rows with a single reset.
+
+        :param removed_nodes: database names of removed nodes
+        :param renamed_nodes: dict of new name and database name
+        :param added_nodes: names of added nodes
+        """
+        if self.is_virtual:
+            self._apply_virtual_node_changes(
+                removed_nodes, renamed_nodes, added_nodes)
+            return
+
+        removed_nodes = [
+            name for name in removed_nodes if name in self.row_store]
+        renamed_nodes = dict(
+            (new_name, old_name)
+            for new_name, old_name in renamed_nodes.iteritems()
+            if old_name in self.row_store)
+        # a node deleted then created again under the same name is both
+        # removed and added, its name is free once removals are applied
+        freed_names = (set(removed_nodes) | set(renamed_nodes.itervalues())) \
+            - set(renamed_nodes)
+        added_nodes = [
+            name for name in added_nodes
+            if name not in self.row_store or name in freed_names]
+        is_reset = (len(removed_nodes) + len(renamed_nodes) + len(added_nodes)
+                    > BATCH_RESET_THRESHOLD)
+
+        for node_name in removed_nodes:
+            if not is_reset:
+                self._discard_row(node_name)
+            self.row_store.pop(node_name)
+
+        # rename in two passes so swapped names never collide
+        renamed_rows = []
+        for new_name, old_name in renamed_nodes.iteritems():
+            row = self.row_store.pop(old_name)
+            row.name = new_name
+            renamed_rows.append(row)
+            if not is_reset and old_name in self.row_ids:
+                self.row_ids[new_name] = self.row_ids.pop(old_name)
+        for row in renamed_rows:
+            self.row_store.add(row)
+
+        file_ids = self.texture_index.apply_node_changes(
+            removed_nodes, renamed_nodes, added_nodes)
+
+        if not is_reset:
+            if self.batch_depth:
+                # rows deferred by batch are renamed in place, shown rows
+                # move when batch ends
+                self.batch_updated_rows.extend(renamed_rows)
+            else:
+                self._update_rows(renamed_rows)
+            self._refresh_file_rows(*file_ids)
+            return
+
+        for chunk in iter_chunks(file_ids):
+            self._cache_rows('WHERE ' + sql_in('N.FileId', chunk), chunk)
+        self._update_memory_budget(file_ids)
+        self.textures = self.row_store.values()
+        self._sort_rows(self.sort_column, self.sort_order)
+        # rows deferred by a running batch are part of the reset
+        self.batch_updated_rows = []
+        self.batch_new_rows = []
+        self.reset()
 
-        return c.fetchall()
+    def _apply_virtual_node_changes(self, removed_nodes, renamed_nodes,
+                                    added_nodes):
+        """ Apply scene node changes to database and reload virtual rows """
+        existing_nodes = self.texture_index.get_existing_nodes(
+            list(removed_nodes) + renamed_nodes.values() + list(added_nodes))
+        removed_nodes = [
+            name for name in removed_nodes if name in existing_nodes]
+        renamed_nodes = dict(
+            (new_name, old_name)
+            for new_name, old_name in renamed_nodes.iteritems()
+            if old_name in existing_nodes)
+        # names freed by removals and renames can be added again
+        freed_names = (set(removed_nodes) | set(renamed_nodes.itervalues())) \
+            - set(renamed_nodes)
+        file_ids = self.texture_index.apply_node_changes(
+            removed_nodes, renamed_nodes,
+            [name for name in added_nodes
+             if name not in existing_nodes or name in freed_names])
+        self._update_memory_budget(file_ids)
+        self._reload_window()
+
+    def get_database_content_cursor(self):
+        """ Return cursor on report rows, file path is the last column """
+        return self.texture_index.get_content_cursor()
 
     def export_as_csv(self):
-        """ Export texture listing in csv file """
-        file_content = self.get_database_content_as_csv()
+        """ Export texture listing in csv, json lines or html file """
+        row_count = self.get_node_count()
 
         # check if current scene is empty
-        if not file_content:
+        if not row_count:
             mtt_log('Nothing to save. Operation aborted.', msg_type='warning',
                     verbose=False)
             return
 
-        # clean output
-        convert_nicename = {n: t for t, n, a in MTTSettings.SUPPORTED_TYPE}
-        for i, row in enumerate(file_content):
-            node_type = convert_nicename[row[1]]
-            ref_str = 'True' if row[2] == 1 else ''
-            missing_str = 'True' if row[3] == -1 else ''
-            file_content[i] = (row[0], node_type, ref_str, missing_str, row[4], row[5])
-
         # query file to write
         scene_name = os.path.basename(cmds.file(query=True, sceneName=True))
         file_path = os.path.join(cmds.workspace(query=True, rootDirectory=True), scene_name)
-        csv_path = cmds.fileDialog2(
-            fileFilter='Texture List (*.csv)',
+        report_path = cmds.fileDialog2(
+            fileFilter='Texture List (*.csv);;'
+                       'Texture List JSON Lines (*.jsonl);;'
+                       'Texture List HTML (*.html)',
             caption='Save Texture List',
             startingDirectory=file_path,
             fileMode=0)
+        if report_path is None:
+            return
+
+        report_path = report_path[0]
+        if os.path.splitext(report_path)[1].lower() not in REPORT_WRITERS:
+            report_path += '.csv'
+
+        # clean output
+        convert_nicename = {n: t for t, n, a in MTTSettings.SUPPORTED_TYPE}
 
-        # fill file
-        if csv_path is not None:
-            import csv
-            file_path = csv_path[0]
-            scene_name = cmds.file(q=True, sceneName=True) or 'Scene UNTITLED'
-            with open(file_path, "w") as csv_file:
-                csv_file_writer = csv.writer(csv_file, delimiter=';')
-                csv_file_writer.writerow([scene_name])
-                csv_file_writer.writerow(['NODE NAME', 'NODE TYPE', 'IS REF', 'MISSING', 'INSTANCE COUNT', 'FILE PATH'])
-                csv_file_writer.writerows(file_content)
-                csv_file.close()
-                mtt_log('CSV file saved to %s' % file_path, verbose=False)
-                cmds.launchImageEditor(viewImageFile=os.path.dirname(file_path))
+        def convert_row(row):
+            return (row[0], convert_nicename[row[1]],
+                    'True' if row[2] == 1 else '',
+                    'True' if row[3] == -1 else '', row[4], row[5])
+
+        def update_progress(exported_count, total_count):
+            if cmds.progressWindow(query=True, isCancelled=True):
+                return False
+            cmds.progressWindow(
+                edit=True, progress=exported_count * 100 / total_count,
+                status='%d/%d rows' % (exported_count, total_count))
+
+        extra_columns = [
+            label for label in MTTSettings.value('exportExtraColumns').split(',')
+            if label in EXTRA_COLUMNS]
+        if 'MD5' in extra_columns:
+            # digests already computed for duplicate detection are reused
+            content_hashes = self.texture_index.get_file_content_hashes()
+            extra_columns[extra_columns.index('MD5')] = (
+                'MD5', lambda file_path: get_content_hash(
+                    file_path, content_hashes))
+        scene_name = cmds.file(q=True, sceneName=True) or 'Scene UNTITLED'
+
+        cmds.progressWindow(
+            title='Save Texture List', progress=0, status='Starting...',
+            isInterruptable=True)
+        try:
+            exported_count = export_report(
+                self.get_database_content_cursor(), row_count, report_path,
+                scene_name, convert_row=convert_row,
+                extra_columns=extra_columns,
+                progress_callback=update_progress,
+                workers=MTTSettings.value('fileStateWorkers'))
+        finally:
+            cmds.progressWindow(endProgress=True)
+
+        mtt_log('%d/%d rows saved to %s' % (
+            exported_count, row_count, report_path), verbose=False)
+        cmds.launchImageEditor(viewImageFile=os.path.dirname(report_path))
 
     def database_dump_csv(self):
         c = self.db.cursor()
@@ -329,30 +1097,47 @@ class MTTModel(QAbstractTableModel):
         if not index.isValid() or not (0 <= index.row() < self.rowCount()):
             return None
 
-        texture = self.textures[index.row()]
-        column = index.column()
-
         if role == Qt.DisplayRole:
-            if column == NODE_NAME:
-                return texture[0]
-            elif column == NODE_TYPE:
-                return texture[1]
-            elif column == NODE_REFERENCE:
-                return texture[2]
-            elif column == FILE_STATE:
-                return self.get_node_file_state(texture[0])
-            elif column == FILE_COUNT:
-                return self.get_node_instance_count(texture[0])
-            elif column == NODE_FILE:
-                norm_path = os.path.normpath(
-                    self.get_node_attribute(texture[0]))
-                if norm_path == '.':
-                    norm_path = ''
-                return norm_path
+            row = self.textures[index.row()]
+            if index.column() == FILE_TILES:
+                return self.get_tiles_text(row)
+            if index.column() == FILE_SIZE:
+                return get_size_text(row.file.size)
+            if index.column() == FILE_CONTENT:
+                return self.get_content_text(row)
+            return COLUMN_GETTERS[index.column()](row)
+
+        elif role == Qt.ToolTipRole and index.column() == FILE_TILES:
+            missing_tiles = self.textures[index.row()].file.missing_tiles
+            if not missing_tiles:
+                return None
+            missing_tiles = missing_tiles.split(', ')
+            text = 'Missing tiles : %s' % ', '.join(
+                missing_tiles[:TOOLTIP_TILE_COUNT])
+            if len(missing_tiles) > TOOLTIP_TILE_COUNT:
+                text += ' (+%d)' % (len(missing_tiles) - TOOLTIP_TILE_COUNT)
+            return text
+
+        elif role == Qt.ToolTipRole and index.column() == FILE_CONTENT:
+            row = self.textures[index.row()]
+            if not row.file.duplicate_count:
+                return None
+            file_paths = [
+                file_path for file_path
+                in self.texture_index.get_content_files(row.file.content_hash)
+                if file_path != row.file.file_path]
+            text = 'Same content :\n%s' % '\n'.join(
+                file_paths[:TOOLTIP_FILE_COUNT])
+            if len(file_paths) > TOOLTIP_FILE_COUNT:
+                text += '\n(+%d)' % (len(file_paths) - TOOLTIP_FILE_COUNT)
+            return text
 
         elif role == Qt.TextAlignmentRole:
-            if column == FILE_COUNT:
+            if index.column() in (FILE_COUNT, FILE_TILES, IMAGE_CHANNELS,
+                                  IMAGE_DEPTH):
                 return int(Qt.AlignCenter | Qt.AlignVCenter)
+            if index.column() in (IMAGE_WIDTH, IMAGE_HEIGHT, FILE_SIZE):
+                return int(Qt.AlignRight | Qt.AlignVCenter)
             return int(Qt.AlignLeft | Qt.AlignVCenter)
 
         return None
@@ -381,6 +1166,10 @@ class MTTModel(QAbstractTableModel):
                 return VIEW_COLUMN_LABEL[FILE_COUNT]
             elif section == NODE_FILE:
                 return VIEW_COLUMN_LABEL[NODE_FILE]
+            elif section == FILE_TILES:
+                return VIEW_COLUMN_LABEL[FILE_TILES]
+            elif section in IMAGE_COLUMNS or section == FILE_CONTENT:
+                return VIEW_COLUMN_LABEL[section]
 
         return int(section + 1)
 
@@ -393,18 +1182,14 @@ class MTTModel(QAbstractTableModel):
         :return:
         """
         if index.isValid() and 0 <= index.row() < self.rowCount():
-            texture = self.textures[index.row()]
-            name = texture[0]
+            name = self.textures[index.row()].name
             column = index.column()
 
             if column == NODE_NAME:
                 wanted_name = value
                 if wanted_name:
                     new_name = self.rename_maya_node(name, wanted_name)
-                    state = new_name != name
-                    if state:
-                        self.request_sort()
-                    return state
+                    return new_name != name
                 else:
                     return False
 
@@ -412,11 +1197,28 @@ class MTTModel(QAbstractTableModel):
                 node_type = cmds.nodeType(name)
                 attr = self.supported_format_dict[node_type]
                 set_attr(name, attr, value, attr_type='string')
-                self.request_sort()
                 return True
 
         return False
 
+    @staticmethod
+    def get_tiles_text(row):
+        """ Return tile count and missing tile count of a row """
+        if row.file.tile_count is None:
+            return ''
+        if not row.file.missing_tiles:
+            return str(row.file.tile_count)
+        return '%d (-%d)' % (
+            row.file.tile_count, row.file.missing_tiles.count(',') + 1)
+
+    @staticmethod
+    def get_content_text(row):
+        """ Return short digest and count of files with the same content """
+        if not row.file.duplicate_count:
+            return ''
+        return '%s (%d)' % (
+            row.file.content_hash[:8], row.file.duplicate_count + 1)
+
     def rowCount(self, parent=QModelIndex()):
         return len(self.textures)
 
@@ -446,14 +1248,7 @@ class MTTModel(QAbstractTableModel):
         # sort data
         self.layoutAboutToBeChanged.emit()
 
-        c = self.db.cursor()
-        order = ['ASC', 'DESC'][sort_order]
-        c.execute(
-            'SELECT Name, Type, IsRef FROM NodesTable as N '
-            'LEFT JOIN FilesTable as F ON N.FileId=F.FileId '
-            'LEFT JOIN RefTable as R ON N.RefName=R.RefName '
-            'ORDER BY %s %s' % (DB_COLUMN_LABEL[column_id], order))
-        self.textures = c.fetchall()
+        self._sort_rows(column_id, sort_order)
 
         cmds.optionVar(stringValue=('filtered_instances', ''))
 
@@ -494,11 +1289,29 @@ class MTTModel(QAbstractTableModel):
                 not MTTSettings.value('columnVisibility_%s' % col_id, True))
 
     def request_sort(self):
-        if not self.suspend_force_sort:
-            self.sort(
-                self.table_view.horizontalHeader().sortIndicatorSection(),
-                self.table_view.horizontalHeader().sortIndicatorOrder()
-            )
+        """ Re-apply filters, rows are sorted again only if sort column or
+        sort order changed since last sort
+        """
+        if self.batch_depth:
+            return
+
+        column_id = self.table_view.horizontalHeader().sortIndicatorSection()
+        sort_order = self.table_view.horizontalHeader().sortIndicatorOrder()
+        if column_id != self.sort_column or sort_order != self.sort_order:
+            self.sort(column_id, sort_order)
+        else:
+            self.refresh_layout()
+
+    def refresh_layout(self):
+        """ Notify views to filter rows again without sorting them """
+        if self.is_virtual:
+            cmds.optionVar(stringValue=('filtered_instances', ''))
+            self._reload_window()
+            return
+
+        self.layoutAboutToBeChanged.emit()
+        cmds.optionVar(stringValue=('filtered_instances', ''))
+        self.layoutChanged.emit()
 
     @staticmethod
     def validate_node_name(node_name):
@@ -537,389 +1350,222 @@ class MTTModel(QAbstractTableModel):
         else:
             return cmds.rename(node_name, wanted_name)
 
-    def rename_database_node(self, node_name, wanted_name):
-        """ update database node name
-
-        :param node_name:
-        :param wanted_name:
-        :return:
-        """
-        index = self.get_node_model_id(node_name)
-        texture = self.textures[index.row()]
-
-        self.textures[index.row()] = (wanted_name, texture[1], texture[2])
-        self.db.cursor().execute(
-            'UPDATE NodesTable SET Name=? WHERE Name=?',
-            (wanted_name, node_name))
-
-        self.dataChanged.emit(index, index)
-
     def change_node_attribute(self, node_name, new_attribute_value):
-        if cmds.lockNode(node_name, query=True, lock=True)[0] \
-                or cmds.referenceQuery(node_name, isNodeReferenced=True):
-
-            mtt_log('%s is locked, cannot perform changePath\n' % node_name,
-                    verbose=False)
-            return False
+        return bool(self.change_nodes_attribute(
+            [(node_name, new_attribute_value)]))
 
-        if self.is_reloading_file:
-            return False
+    def change_nodes_attribute(self, node_values):
+        """ Reassign file of several nodes
 
-        # get original data for current node
-        c = self.db.cursor()
-        c.execute(
-            'SELECT Attribute, FilePath, InstanceCount, FileId '
-            'FROM NodesTable LEFT JOIN FilesTable USING (FileId) '
-            'WHERE Name=?',
-            (node_name, ))
-        node_attr, node_file_path, instance_count, old_file_id = c.fetchone()
-
-        new_absolute_attr_value = self.get_attribute_absolute_file_path(
-            node_name, new_attribute_value)
-        key_path = self.convert_to_key_path(new_absolute_attr_value)
-        # check if new_attribute_value already exist
-        c.execute('SELECT EXISTS (SELECT 1 FROM FilesTable WHERE KeyPath=?)',
-                  (key_path, ))
-
-        if c.fetchone()[0] > 0:
-            # instance found
-            c.execute('SELECT FileId FROM FilesTable WHERE KeyPath=?',
-                      (key_path, ))
-            new_file_id = c.fetchone()[0]
+        Locked and referenced nodes are skipped, others are reassigned by
+        the texture index in one transaction.
 
-        else:
-            # new entry
-            c.execute(
-                'INSERT '
-                'INTO FilesTable(KeyPath, FilePath, State, InstanceCount) '
-                'VALUES (?, ?, ?, ?)',
-                (key_path, new_absolute_attr_value,
-                 self.get_file_state(new_absolute_attr_value), 0)
-            )
-            new_file_id = c.lastrowid
-            self.file_watch_add_path(new_absolute_attr_value)
-
-        # update old file instance count and state
-        c.execute('SELECT InstanceCount FROM FilesTable WHERE FileId=?',
-                  (old_file_id, ))
-        if c.fetchone()[0] == 1 and node_file_path != new_absolute_attr_value:
-                c.execute('DELETE FROM FilesTable WHERE FileId=?',
-                          (old_file_id, ))
-        else:
-            c.execute(
-                'UPDATE FilesTable SET InstanceCount=InstanceCount - 1 '
-                'WHERE FileId=?',
-                (old_file_id, ))
-            c.execute(
-                'UPDATE FilesTable SET State=? '
-                'WHERE FileId=?',
-                (self.get_file_state(node_file_path), old_file_id))
-
-        # set new values
-        c.execute('UPDATE NodesTable SET Attribute=? WHERE Name=?',
-                  (new_attribute_value, node_name))
-        c.execute('UPDATE NodesTable SET FileId=? WHERE Name=?',
-                  (new_file_id, node_name))
-        c.execute('UPDATE FilesTable SET InstanceCount=InstanceCount + 1 '
-                  'WHERE FileId=?', (new_file_id, ))
-        c.execute('UPDATE FilesTable SET State=? WHERE FileId=?',
-                  (self.get_file_state(new_absolute_attr_value), new_file_id))
-
-        self.db.commit()
-
-        # notify data changed
-        index = self.get_node_model_id(node_name)
-        self.dataChanged.emit(index, index)
-
-        return True
+        :param node_values: list of (node name, new attribute value)
+        :return: names of changed nodes
+        """
+        if self.is_reloading_file:
+            return []
+
+        # last value wins for duplicated nodes
+        new_values = dict()
+        for node_name, new_attribute_value in node_values:
+            if cmds.lockNode(node_name, query=True, lock=True)[0] \
+                    or cmds.referenceQuery(node_name, isNodeReferenced=True):
+                mtt_log(
+                    '%s is locked, cannot perform changePath\n' % node_name,
+                    verbose=False)
+                continue
+            new_values[node_name] = new_attribute_value
+        if not new_values:
+            return []
 
-    @staticmethod
-    def convert_to_key_path(file_path):
-        key_path = os.path.normpath(file_path).lower()
+        self._refresh_file_rows(*self.texture_index.reassign_nodes(new_values))
 
-        return key_path
+        return new_values.keys()
 
     def get_node_count(self):
         """ Return node count """
-        c = self.db.cursor()
-        c.execute('SELECT COUNT(Name) FROM NodesTable')
-
-        return c.fetchone()[0]
+        return self.texture_index.get_node_count()
 
     def get_file_count(self):
         """ Return file count """
-        c = self.db.cursor()
-        c.execute('SELECT COUNT(FileId) FROM FilesTable WHERE FilePath!="."')
-
-        return c.fetchone()[0]
+        return self.texture_index.get_file_count()
 
     def get_all_nodes_name(self):
         """ Return all textures node name """
-        c = self.db.cursor()
-        c.execute('SELECT Name FROM NodesTable')
+        return self.texture_index.get_all_nodes_name()
+
+    def _get_row(self, node_name):
+        """ Return cached row of node_name
 
-        return c.fetchall()
+        Virtual rows not fetched yet are read from database.
+        """
+        if self.is_virtual and node_name not in self.row_store:
+            data = self.texture_index.get_node(node_name)
+            if data is not None:
+                return self.row_store.create_row(data)
+
+        return self.row_store[node_name]
 
     def get_node_model_id(self, node_name):
-        return self.match(
-            self.index(0, 0, QModelIndex()), Qt.DisplayRole,
-            node_name, 1,
-            Qt.MatchExactly)[0]
+        if self.is_virtual:
+            self._fetch_until(node_name)
+            if node_name not in self.row_ids:
+                return QModelIndex()
+
+        return self.index(self.row_ids[node_name], NODE_NAME)
 
     def get_node_file_fullpath(self, node_name):
         """ Return full filename """
-        c = self.db.cursor()
-        c.execute(
-            'SELECT FilePath '
-            'FROM NodesTable LEFT JOIN FilesTable USING (FileId) '
-            'WHERE Name=?', (node_name, ))
-
-        return c.fetchone()[0]
+        return self._get_row(node_name).file.file_path
 
     def get_node_file_basename(self, node_name):
         """ Return filename without extension """
-        c = self.db.cursor()
-        c.execute(
-            'SELECT FilePath '
-            'FROM NodesTable LEFT JOIN FilesTable USING (FileId) '
-            'WHERE Name=?', (node_name, ))
-
-        file_basename = c.fetchone()[0]
+        file_basename = self._get_row(node_name).file.file_path
 
         if len(file_basename):
             file_basename = os.path.splitext(os.path.basename(file_basename))[0]
 
         return file_basename
 
-    @staticmethod
-    def get_file_state(file_path):
-        if os.path.isdir(file_path):
-            file_state = -1
-        else:
-            if os.access(file_path, os.W_OK):
-                file_state = 1
-            elif os.access(file_path, os.R_OK):
-                file_state = 0
-            else:
-                file_state = -1
-
-        return file_state
+    def get_file_state(self, file_path):
+        return self.file_states.get_state(file_path)
 
     def get_node_file_state(self, node_name):
-        c = self.db.cursor()
-        c.execute(
-            'SELECT State '
-            'FROM NodesTable LEFT JOIN FilesTable USING (FileId) '
-            'WHERE Name=?', (node_name, ))
-        return c.fetchone()[0]
+        return self._get_row(node_name).file.state
 
     def get_node_instance_count(self, node_name):
-        c = self.db.cursor()
-        c.execute(
-            'SELECT InstanceCount '
-            'FROM NodesTable LEFT JOIN FilesTable USING (FileId) '
-            'WHERE Name=?', (node_name, ))
-        return c.fetchone()[0]
+        return self._get_row(node_name).file.instance_count
+
+    def get_node_instances(self, node_name):
+        """ Return names of all nodes sharing node_name file, node included """
+        row = self._get_row(node_name)
+        if self.is_virtual:
+            return set(self.texture_index.get_file_nodes(row.file.file_path))
+
+        return row.file.node_names
 
     def get_node_instances_model_id(self, node_name):
-        c = self.db.cursor()
-        c.execute('SELECT FileId FROM NodesTable WHERE Name=?', (node_name, ))
-        file_id = c.fetchone()[0]
-        c.execute('SELECT Name FROM NodesTable WHERE FileId=?', (file_id, ))
-        return [self.get_node_model_id(name[0]) for name in c.fetchall()]
+        return [self.get_node_model_id(name)
+                for name in self.get_node_instances(node_name)]
 
     def get_file_instance_count(self, file_path):
-        c = self.db.cursor()
-        key_path = self.convert_to_key_path(file_path)
-        c.execute('SELECT COUNT(*) FROM FilesTable WHERE KeyPath=?',
-                  (key_path, ))
-        return c.fetchone()[0]
+        return self.texture_index.get_file_instance_count(file_path)
 
     def get_node_attribute(self, node_name):
-        if self.db:
-            c = self.db.cursor()
-            c.execute('SELECT Attribute FROM NodesTable WHERE Name=?',
-                      (node_name, ))
-            return c.fetchone()[0] or ''
-        else:
-            return ''
-
-    def get_reference_info(self, node_name):
-        """ Return reference info
-
-        - is new entry
-        - reference node
-        - project path
-        - sourceimage path
-
-        :param node_name:
-        """
-        is_new = False
-        ref_name = cmds.referenceQuery(node_name, referenceNode=True)
-        sourceimages_folder = 'sourceimages'
-
-        # try to get already existing data
-        c = self.db.cursor()
-        c.execute(
-            'SELECT RefPath, RefSourceImage FROM RefTable WHERE RefName=?',
-            (ref_name, ))
-        data = c.fetchone()
-
-        # check if entry already exists
-        if data is not None:
-            root_path = data[0]
-            sourceimages_folder = data[1]
-        else:
-            is_new = True
-            # find workspace.mel in parent folder
-            root_path = cmds.referenceQuery(ref_name, filename=True)
-            for i in range(len(root_path.split('/'))):
-                root_path = os.path.dirname(root_path)
-                if os.path.isfile(os.path.join(root_path, 'workspace.mel')):
-
-                    # read sourceImages key
-                    with open(os.path.join(root_path, 'workspace.mel')) as f:
-                        content = f.read()
-
-                    m = re.search(r'"sourceImages" "([a-zA-z0-9 \\/]+)', content)
-                    if m is not None:
-                        sourceimages_folder = m.group(1)
-                    break
-
-        return is_new, ref_name, root_path, sourceimages_folder
-
-    def get_attribute_absolute_file_path(self, node_name, attr_value):
-        """ Return absolute file path """
-        if attr_value is None:
+        try:
+            return self._get_row(node_name).attribute or ''
+        except KeyError:
             return ''
-        f_name = os.path.basename(attr_value)
-        dir_path = os.path.dirname(attr_value)
-
-        if os.path.isfile(attr_value) or os.path.isdir(dir_path):
-            file_path = attr_value
-
-        else:
-            if cmds.referenceQuery(node_name, isNodeReferenced=True):
-                is_new, ref_name, root_path, sourceimage_dir = self.get_reference_info(node_name)
-            else:
-                c = self.db.cursor()
-                c.execute(
-                    'SELECT RefPath, RefSourceImage '
-                    'FROM RefTable '
-                    'WHERE RefName="ROOT"')
-
-                root_path, sourceimage_dir = c.fetchone()
-
-            # remove first special character
-            attr_value = attr_value.lstrip(r'\/')
-            # try to append attr to workspace directory
-            ws_attr_file = os.path.join(root_path, attr_value)
-            ws_attr_dir = os.path.dirname(ws_attr_file)
-            source_image_file = os.path.join(root_path, sourceimage_dir, f_name)
-            if os.path.isfile(ws_attr_file) or os.path.isdir(ws_attr_dir):
-                file_path = ws_attr_file
-
-            # try to resolve environment variable
-            elif os.path.isfile(os.path.expandvars(attr_value)):
-                file_path = os.path.expandvars(attr_value)
-
-            # try to append workspace + sourceimages + texture.ext
-            elif os.path.isfile(source_image_file):
-                file_path = source_image_file
-
-            # last solution ?
-            else:
-                file_path = attr_value
-
-        return os.path.normpath(file_path)
-
-    @staticmethod
-    def get_nicename_and_attribute_name(node_type):
-        for nType, tNiceName, nAttr in MTTSettings.SUPPORTED_TYPE:
-            if nType == node_type:
-                type_nicename = tNiceName
-                if tNiceName is '' or tNiceName is None:
-                    type_nicename = node_type
-                return type_nicename, nAttr
-        return 'XXX', 'fileTextureName'
 
     def get_sourceimages_path(self):
         """ Return source image folder full path """
-        c = self.db.cursor()
-        c.execute(
-            'SELECT RefPath, RefSourceImage '
-            'FROM RefTable '
-            'WHERE RefName="ROOT"')
-
-        path, sourceimage = c.fetchone()
-        sourceimage_folder = os.path.join(path, sourceimage)
-
-        if os.path.isdir(sourceimage_folder):
-            return sourceimage_folder
-        else:
-            return cmds.workspace(query=True, rootDirectory=True)
+        return self.texture_index.get_sourceimages_path()
 
     def set_database_node_and_attribute(self, node_name, node_attr_value):
         """ Set absolute or relative file path """
         node_attr = self.supported_format_dict[cmds.nodeType(node_name)]
         set_attr(node_name, node_attr, node_attr_value, attr_type='string')
 
-        c = self.db.cursor()
-        c.execute(
-            'UPDATE NodesTable SET Attribute=? WHERE Name=?',
-            (node_attr_value, node_name))
+        self.texture_index.set_node_attribute(node_name, node_attr_value)
+        self._refresh_rows('WHERE Name=?', (node_name, ))
 
     def file_watch_add_path(self, file_path):
-        if os.path.isdir(file_path) or os.path.isfile(file_path):
-            self.watcher.addPath(file_path)
-        elif os.path.isdir(os.path.dirname(file_path)):
-            self.watcher.addPath(os.path.dirname(file_path))
+        self.watcher.add_path(file_path)
 
     def file_watch_remove_all(self):
-        self.watcher.removePaths(self.watcher.files())
-        self.watcher.removePaths(self.watcher.directories())
+        self.file_changes.clear()
+        self.dir_listings.clear()
+        self.watcher.remove_all()
 
     def file_watch_directory_change(self, dir_path):
-        c = self.db.cursor()
-        c.execute('SELECT FilePath FROM FilesTable WHERE State<1')
-        db_files = c.fetchall()
-        dir_files = [
-            os.path.join(dir_path, dirFile)
-            for dirFile in os.listdir(dir_path)]
-
-        for db_file in db_files:
-            db_file = db_file[0]
-            if db_file in dir_files:
-                self.file_watch_add_path(db_file)
-                new_state = self.get_file_state(db_file)
-                c.execute('UPDATE FilesTable SET State=? WHERE FilePath=?',
-                          (new_state, db_file))
+        """ Update state of database files created or deleted in dir_path
 
-        self.request_sort()
+        Only files of dir_path are considered. Directory listing is kept to
+        diff the next event against it, the first event checks files not
+        yet available.
+        """
+        dir_path = os.path.normpath(dir_path)
+        self.texture_index.resolver.invalidate(dir_path)
+        self.texture_index.tiles.invalidate(dir_path)
+        db_files = self.texture_index.get_directory_files(dir_path)
+        if not db_files:
+            self.dir_listings.pop(dir_path, None)
+            return
+
+        try:
+            dir_files = set(os.listdir(dir_path))
+        except OSError:
+            dir_files = set()
+
+        old_dir_files = self.dir_listings.get(dir_path)
+        self.dir_listings[dir_path] = dir_files
+        match_file_names = self.texture_index.match_file_names
+        if old_dir_files is None:
+            changed_files = set(
+                file_path for file_path, state in db_files
+                if state < 1 and match_file_names(file_path, dir_files))
+        else:
+            changed_names = dir_files.symmetric_difference(old_dir_files)
+            changed_files = set(
+                file_path for file_path, state in db_files
+                if match_file_names(file_path, changed_names))
+
+        if not changed_files:
+            return
+
+        for file_path in changed_files:
+            self.texture_index.add_file_watch(file_path)
+
+        changed_files = dict(
+            [(convert_to_key_path(file_path), file_path)
+             for file_path in changed_files])
+        self.texture_index.update_file_states(changed_files)
+        for chunk in iter_chunks(changed_files.values()):
+            self._refresh_rows('WHERE ' + sql_in('F.FilePath', chunk), chunk)
+        self.request_image_infos(changed_files)
+        self.request_content_hashes()
 
     def file_watch_file_change(self, file_path):
-        key_path = self.convert_to_key_path(file_path)
-        c = self.db.cursor()
+        """ Queue file change until file is completely written
+
+        Tile changes are queued under their pattern so a texture is reloaded
+        once whatever the number of changed tiles.
+        """
+        file_path = os.path.normpath(file_path)
+        file_path = self.texture_index.get_tile_file(file_path) or file_path
+        self.file_changes.add(convert_to_key_path(file_path), file_path)
+
+    def file_watch_apply_changes(self, changed_files):
+        """ Reload and update state of stable changed files
+
+        Every node using a changed file is reloaded once per save, each
+        Maya file node holds its own copy of the image.
+
+        :param changed_files: dict of key path and file path
+        """
         if MTTSettings.value('autoReload'):
             self.is_reloading_file = True
-            c.execute(
-                'SELECT Name '
-                'FROM NodesTable LEFT JOIN FilesTable USING(FileId) '
-                'WHERE KeyPath=?', (key_path, ))
-            nodes = c.fetchall()
-            for node in [x[0] for x in nodes]:
-                attr_name = self.supported_format_dict[cmds.nodeType(node)]
-                attr_value = cmds.getAttr('%s.%s' % (node, attr_name))
-                set_attr(node, attr_name, attr_value, attr_type='string')
-            self.is_reloading_file = False
-
-        self.file_watch_add_path(file_path)
-
-        new_state = self.get_file_state(file_path)
-        c.execute('UPDATE FilesTable SET State=? WHERE KeyPath=?',
-                  (new_state, key_path))
-
-        self.request_sort()
+            try:
+                for node, attr_value in \
+                        self.texture_index.get_key_paths_nodes(changed_files):
+                    # node deleted while its reload was pending
+                    if not cmds.objExists(node):
+                        continue
+                    attr_name = self.supported_format_dict[cmds.nodeType(node)]
+                    set_attr(node, attr_name, attr_value, attr_type='string')
+            finally:
+                self.is_reloading_file = False
+
+        for file_path in changed_files.itervalues():
+            # watch is lost when file is replaced
+            self.texture_index.add_file_watch(file_path)
+
+        self.texture_index.update_file_states(changed_files)
+        for chunk in iter_chunks(changed_files):
+            self._refresh_rows('WHERE ' + sql_in('F.KeyPath', chunk), chunk)
+        self.request_image_infos(changed_files)
+        self.request_content_hashes()
 
     def set_table_view(self, table_view):
         self.table_view = table_view
@@ -0,0 +1,223 @@
+# Python import
+import os
+from threading import Lock
+from time import time
+
+
+class MTTDirectoryCache(object):
+    """ Cached directory listings used to probe many paths of a directory
+
+    A missing entry is answered from the listing without touching the disk,
+    an existing entry is checked once with os.path.isfile. Listings are
+    trusted for ttl seconds.
+    """
+
+    def __init__(self, ttl=5):
+        """
+        :param ttl: (float) seconds a listing is trusted
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # directory path: (listing or None, {name: isfile}, time)
+        self._listings = dict()
+        self._lock = Lock()
+
+    def _get_listing(self, dir_path):
+        entry = self._listings.get(dir_path)
+        if entry is not None and time() - entry[2] <= self.ttl:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        try:
+            names = frozenset(
+                [os.path.normcase(name)
+                 for name in os.listdir(dir_path or '.')])
+        except (OSError, TypeError, ValueError):
+            names = None
+        entry = (names, dict(), time())
+        with self._lock:
+            self._listings[dir_path] = entry
+
+        return entry
+
+    def isdir(self, dir_path):
+        if not dir_path:
+            return False
+        return self._get_listing(dir_path)[0] is not None
+
+    def isfile(self, file_path):
+        dir_path, name = os.path.split(file_path)
+        names, files, timestamp = self._get_listing(dir_path)
+        name = os.path.normcase(name)
+        if names is None or name not in names:
+            return False
+
+        is_file = files.get(name)
+        if is_file is None:
+            is_file = files[name] = os.path.isfile(file_path)
+
+        return is_file
+
+    def invalidate(self, dir_path=None):
+        """ Forget listings of dir_path or all listings if None """
+        with self._lock:
+            if dir_path is None:
+                self._listings.clear()
+                return
+
+            # listings are keyed by directory path as written in attributes
+            dir_path = os.path.normcase(os.path.normpath(dir_path))
+            for listed_path in self._listings.keys():
+                if os.path.normcase(os.path.normpath(listed_path or '.')) \
+                        == dir_path:
+                    del self._listings[listed_path]
+
+
+# resolution rules receive resolver, attribute value, project root path and
+# sourceimages folder, they return a file path or None
+def resolve_absolute(resolver, attr_value, root_path, sourceimage_dir):
+    """ Attribute value is a file or lives in an existing folder """
+    if resolver.directories.isfile(attr_value) \
+            or resolver.directories.isdir(os.path.dirname(attr_value)):
+        return attr_value
+
+
+def resolve_workspace(resolver, attr_value, root_path, sourceimage_dir):
+    """ Attribute value is relative to project root """
+    file_path = os.path.join(root_path, strip_root(attr_value))
+    if resolver.directories.isfile(file_path) \
+            or resolver.directories.isdir(os.path.dirname(file_path)):
+        return file_path
+
+
+def resolve_environment(resolver, attr_value, root_path, sourceimage_dir):
+    """ Attribute value contains environment variables """
+    file_path = resolver.expandvars(strip_root(attr_value))
+    if resolver.directories.isfile(file_path):
+        return file_path
+
+
+def resolve_sourceimages(resolver, attr_value, root_path, sourceimage_dir):
+    """ File name is found in project sourceimages folder """
+    file_path = os.path.join(
+        root_path, sourceimage_dir, os.path.basename(attr_value))
+    if resolver.directories.isfile(file_path):
+        return file_path
+
+
+def resolve_custom_roots(resolver, attr_value, root_path, sourceimage_dir):
+    """ Attribute value or file name is found in a custom root folder """
+    for custom_root in resolver.custom_roots:
+        for file_path in (os.path.join(custom_root, strip_root(attr_value)),
+                          os.path.join(custom_root,
+                                       os.path.basename(attr_value))):
+            if resolver.directories.isfile(file_path):
+                return file_path
+
+
+def strip_root(attr_value):
+    """ Remove leading separators of attr_value """
+    return attr_value.lstrip(r'\/')
+
+
+# rule name used in mtt.json: rule function
+RESOLVE_RULES = {
+    'absolute': resolve_absolute,
+    'workspace': resolve_workspace,
+    'environment': resolve_environment,
+    'sourceimages': resolve_sourceimages,
+    'custom_roots': resolve_custom_roots,
+}
+DEFAULT_RULES = (
+    'absolute', 'workspace', 'environment', 'sourceimages', 'custom_roots')
+
+
+class MTTPathResolver(object):
+    """ Memoized texture path resolution
+
+    Attribute values are resolved through an ordered chain of rules and
+    results are kept per (attribute value, project root, sourceimages
+    folder) for ttl seconds. Disk probes go through a directory listing
+    cache so values of the same folder share a single listdir.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, custom_roots=(), ttl=5):
+        """
+        :param rules: (list) names of RESOLVE_RULES or rule functions, in
+                      resolution order
+        :param custom_roots: (list) extra folders searched by custom_roots
+        :param ttl: (float) seconds a result or a listing is trusted
+        """
+        self.rules = [
+            RESOLVE_RULES[rule] if rule in RESOLVE_RULES else rule
+            for rule in rules
+            if rule in RESOLVE_RULES or callable(rule)]
+        self.custom_roots = [
+            os.path.expandvars(custom_root) for custom_root in custom_roots]
+        self.ttl = ttl
+        self.directories = MTTDirectoryCache(ttl)
+        self.hits = 0
+        self.misses = 0
+        self._results = dict()
+        self._expanded_values = dict()
+
+    def expandvars(self, value):
+        expanded_value = self._expanded_values.get(value)
+        if expanded_value is None:
+            expanded_value = self._expanded_values[value] = \
+                os.path.expandvars(value)
+        return expanded_value
+
+    def is_absolute(self, attr_value):
+        """ Return True if attr_value needs no project root to be found """
+        return bool(attr_value) and resolve_absolute in self.rules \
+            and resolve_absolute(self, attr_value, '', '') is not None
+
+    def resolve(self, attr_value, root_path, sourceimage_dir):
+        """ Return absolute file path of attr_value for the given project
+
+        :param attr_value: texture attribute value
+        :param root_path: project root path
+        :param sourceimage_dir: project sourceimages folder
+        """
+        if attr_value is None:
+            return ''
+
+        key = (attr_value, root_path, sourceimage_dir)
+        result = self._results.get(key)
+        now = time()
+        if result is not None and now - result[1] <= self.ttl:
+            self.hits += 1
+            return result[0]
+
+        self.misses += 1
+        for rule in self.rules:
+            file_path = rule(self, attr_value, root_path, sourceimage_dir)
+            if file_path is not None:
+                break
+        else:
+            # last solution ?
+            file_path = strip_root(attr_value)
+
+        file_path = os.path.normpath(file_path)
+        self._results[key] = (file_path, now)
+
+        return file_path
+
+    def invalidate(self, dir_path=None):
+        """ Forget results and listing of dir_path, everything if None """
+        self.directories.invalidate(dir_path)
+        self._results.clear()
+        if dir_path is None:
+            self._expanded_values.clear()
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._results),
+            'dir_hits': self.directories.hits,
+            'dir_misses': self.directories.misses,
+        }
@@ -2,13 +2,49 @@
 import re
 import os
 # PySide import
-from PySide.QtCore import Qt
+from PySide.QtCore import Qt, QRegExp
 from PySide.QtGui import QSortFilterProxyModel
 # Maya import
 from maya import cmds
 # custom import
 from mttConfig import (
-    MTTSettings, NODE_NAME, NODE_REFERENCE, FILE_STATE, NODE_FILE)
+    MTTSettings, NODE_NAME, NODE_REFERENCE, FILE_STATE, NODE_FILE,
+    FILE_CONTENT)
+from mttRowStore import get_norm_path
+
+
+def is_named_after_file(node_name, file_path):
+    """ Return True if node name without namespace and trailing digits is
+    the file name without extension and trailing digits
+    """
+    file_name = os.path.splitext(os.path.basename(file_path or ''))[0]
+    node_split = re.split('[0-9]*$', node_name.rsplit(':')[-1])[0]
+    file_split = re.split('[0-9]*$', file_name)[0]
+    return node_split == file_split
+
+
+def get_instance_key(file_path):
+    """ Return key shared by shown file paths of the same file """
+    return os.path.normpath(file_path.lower())
+
+
+def get_filter_pattern(reg_exp):
+    """ Return python regular expression searching like QRegExp filter """
+    if reg_exp.patternSyntax() != QRegExp.Wildcard:
+        return reg_exp.pattern()
+    return re.escape(reg_exp.pattern()).replace(
+        '\\*', '.*').replace('\\?', '.')
+
+
+_sql_regexps = dict()
+
+
+def sql_regexp(pattern, value):
+    """ SQLite REGEXP function, search case insensitive pattern in value """
+    regex = _sql_regexps.get(pattern)
+    if regex is None:
+        regex = _sql_regexps[pattern] = re.compile(pattern, re.I)
+    return value is not None and regex.search(value) is not None
 
 
 class MTTProxy(QSortFilterProxyModel):
@@ -16,7 +52,78 @@ class MTTProxy(QSortFilterProxyModel):
         super(MTTProxy, self).__init__(parent)
         self.selected_texture_nodes = None
 
+    def get_sql_filter(self, texture_index):
+        """ Return SQL condition and parameters of current filters
+
+        Conditions mirror filterAcceptsRow so virtual rows of the model are
+        filtered by the database, SQL functions they need are registered on
+        texture_index connection.
+
+        :param texture_index: MTTTextureIndex instance
+        :return: condition for a WHERE clause of ROW_QUERY, '' if no filter
+        """
+        db = texture_index.db
+        # file column filters match the path shown by the model
+        db.create_function('NORM_PATH', 1, get_norm_path)
+        clauses = []
+        parameters = []
+
+        nodes_str = MTTSettings.value('pinnedNode')
+        if nodes_str:
+            clauses.append(texture_index.get_name_filter(
+                'PinnedNodes', nodes_str.split(';')))
+
+        pattern = self.filterRegExp().pattern()
+        if pattern:
+            pattern = get_filter_pattern(self.filterRegExp())
+            try:
+                re.compile(pattern)
+            except re.error:
+                # invalid expression matches nothing like QRegExp
+                clauses.append('0')
+            else:
+                db.create_function('REGEXP', 2, sql_regexp)
+                clauses.append('%s REGEXP ?' % (
+                    'N.Name' if self.filterKeyColumn() == NODE_NAME
+                    else 'NORM_PATH(N.Attribute)'))
+                parameters.append(pattern)
+
+        if self.selected_texture_nodes is not None:
+            clauses.append(texture_index.get_name_filter(
+                'SelectedNodes', self.selected_texture_nodes))
+
+        if MTTSettings.value('onlyWritableState'):
+            clauses.append('F.State=1')
+
+        if MTTSettings.value('onlyDuplicateState'):
+            clauses.append('F.DuplicateCount>0')
+
+        if MTTSettings.value('showReferenceState'):
+            clauses.append('N.IsRef IS NOT 1')
+
+        if MTTSettings.value('showWrongNameState'):
+            db.create_function('NAMED_AFTER_FILE', 2, is_named_after_file)
+            clauses.append(
+                'NOT NAMED_AFTER_FILE(N.Name, NORM_PATH(N.Attribute))')
+
+        where = ' AND '.join(clauses)
+        if MTTSettings.value('filterInstances'):
+            # one node per shown file path among nodes passing other
+            # filters, first scanned node instead of first shown row
+            db.create_function('INSTANCE_KEY', 1, get_instance_key)
+            where = (
+                'N.Id IN (SELECT MIN(N.Id) FROM NodesTable as N '
+                'LEFT JOIN FilesTable as F ON N.FileId=F.FileId %s'
+                'GROUP BY INSTANCE_KEY(NORM_PATH(N.Attribute)))' % (
+                    'WHERE %s ' % where if where else ''))
+
+        return where, parameters
+
     def filterAcceptsRow(self, row, parent):
+        if self.sourceModel().is_virtual:
+            # rows are already filtered by get_sql_filter
+            return True
+
         nodes_str = MTTSettings.value('pinnedNode')
         if nodes_str:
             nodes = nodes_str.split(';')
@@ -42,6 +149,12 @@ class MTTProxy(QSortFilterProxyModel):
             if value != 1:
                 return False
 
+        if MTTSettings.value('onlyDuplicateState'):
+            source_id = self.sourceModel().index(row, FILE_CONTENT, parent)
+            value = self.sourceModel().data(source_id, Qt.DisplayRole)
+            if not value:
+                return False
+
         if MTTSettings.value('showReferenceState'):
             source_id = self.sourceModel().index(row, NODE_REFERENCE, parent)
             value = self.sourceModel().data(source_id, Qt.DisplayRole)
@@ -53,16 +166,13 @@ class MTTProxy(QSortFilterProxyModel):
             source_file_id = self.sourceModel().index(row, NODE_FILE, parent)
             node_name = self.sourceModel().data(source_node_id, Qt.DisplayRole)
             file_path = self.sourceModel().data(source_file_id, Qt.DisplayRole)
-            file_name = os.path.splitext(os.path.basename(file_path))[0]
-            node_split = re.split('[0-9]*$', node_name.rsplit(':')[-1])[0]
-            file_split = re.split('[0-9]*$', file_name)[0]
-            if node_split == file_split:
+            if is_named_after_file(node_name, file_path):
                 return False
 
         if MTTSettings.value('filterInstances'):
             source_file_id = self.sourceModel().index(row, NODE_FILE, parent)
             file_path = self.sourceModel().data(source_file_id, Qt.DisplayRole)
-            norm_path = os.path.normpath(file_path.lower())
+            norm_path = get_instance_key(file_path)
             instances = cmds.optionVar(query='filtered_instances').split(';')
             if norm_path not in instances:
                 instances.append(norm_path)
@@ -0,0 +1,230 @@
+# Python import
+import os
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+# Custom import
+from mttFilePattern import fold_name, get_file_pattern, normalize_dir
+
+# optional faster directory listing for Python 2
+try:
+    from scandir import scandir
+except ImportError:
+    scandir = None
+
+
+def list_directory(dir_path):
+    """ Return file names and sub directory names of dir_path
+
+    Linked directories are not entered, like os.walk.
+
+    :return: (file names, directory names), None if dir_path is unreadable
+    """
+    file_names = []
+    dir_names = []
+    try:
+        if scandir is not None:
+            for entry in scandir(dir_path):
+                if entry.is_dir(follow_symlinks=False):
+                    dir_names.append(entry.name)
+                else:
+                    file_names.append(entry.name)
+        else:
+            for name in os.listdir(dir_path):
+                entry_path = os.path.join(dir_path, name)
+                if os.path.isdir(entry_path) \
+                        and not os.path.islink(entry_path):
+                    dir_names.append(name)
+                else:
+                    file_names.append(name)
+    except (OSError, TypeError, ValueError):
+        return None
+
+    return file_names, dir_names
+
+
+def get_match_score(file_path, candidate_path):
+    """ Return count of trailing folders shared by two paths
+
+    A candidate keeping the folder layout of the missing file ranks first.
+    """
+    file_dirs = normalize_dir(os.path.dirname(file_path)).split(os.sep)
+    candidate_dirs = normalize_dir(
+        os.path.dirname(candidate_path)).split(os.sep)
+    score = 0
+    for file_dir, candidate_dir in zip(
+            reversed(file_dirs), reversed(candidate_dirs)):
+        if file_dir != candidate_dir:
+            break
+        score += 1
+
+    return score
+
+
+class MTTRelinkIndex(object):
+    """ File names of search root folders used to relink missing files
+
+    Roots are walked once with a thread pool, one folder level at a time,
+    and every listing is kept with the modification time of its folder. A
+    later update only lists again folders whose modification time changed,
+    others cost one stat. Missing files are then found by name with
+    dictionary lookups instead of probing each root for each file.
+    """
+
+    def __init__(self, roots=(), workers=0):
+        """
+        :param roots: (list) folders searched recursively
+        :param workers: (int) listing threads, processor count if 0
+        """
+        self.roots = []
+        self.workers = workers or cpu_count()
+        # folders listed and folders reused by last update
+        self.misses = 0
+        self.hits = 0
+        # folder path: (mtime, file names, sub folder paths)
+        self._listings = dict()
+        # folded file name: paths of files with that name
+        self._files = None
+        # (folder path, sorted folded names, names) matched by file patterns
+        self._folders = None
+        self.set_roots(roots)
+
+    def set_roots(self, roots):
+        """ Search roots, listings of kept folders stay cached """
+        new_roots = []
+        for root in roots:
+            root = os.path.normpath(os.path.expandvars(root or ''))
+            if root != '.' and root not in new_roots:
+                new_roots.append(root)
+        if new_roots != self.roots:
+            self.roots = new_roots
+            self._files = None
+            self._folders = None
+
+    def _list_folder(self, dir_path):
+        try:
+            mtime = os.stat(dir_path).st_mtime
+        except OSError:
+            return dir_path, None, False
+
+        listing = self._listings.get(dir_path)
+        if listing is not None and listing[0] == mtime:
+            return dir_path, listing, False
+
+        names = list_directory(dir_path)
+        if names is None:
+            return dir_path, None, False
+        listing = (mtime, names[0], [
+            os.path.join(dir_path, dir_name) for dir_name in names[1]])
+
+        return dir_path, listing, True
+
+    def update(self):
+        """ List changed folders of search roots
+
+        :return: True if file names changed since last update
+        """
+        self.hits = 0
+        self.misses = 0
+        listings = dict()
+        # nested roots and case variants are walked once
+        visited = set()
+        level = []
+        for root in self.roots:
+            if normalize_dir(root) not in visited:
+                visited.add(normalize_dir(root))
+                level.append(root)
+        is_changed = self._files is None
+        pool = ThreadPool(self.workers)
+        try:
+            while level:
+                next_level = []
+                for dir_path, listing, is_listed in pool.imap_unordered(
+                        self._list_folder, level, 8):
+                    if listing is None:
+                        continue
+                    if is_listed:
+                        self.misses += 1
+                        is_changed = True
+                    else:
+                        self.hits += 1
+                    listings[dir_path] = listing
+                    next_level.extend(listing[2])
+                level = []
+                for dir_path in next_level:
+                    if normalize_dir(dir_path) not in visited:
+                        visited.add(normalize_dir(dir_path))
+                        level.append(dir_path)
+        finally:
+            pool.close()
+
+        is_changed = is_changed or len(listings) != len(self._listings)
+        self._listings = listings
+        if is_changed:
+            self._files = None
+            self._folders = None
+
+        return is_changed
+
+    def _get_files(self):
+        if self._files is None:
+            files = dict()
+            for dir_path, listing in self._listings.iteritems():
+                for name in listing[1]:
+                    file_path = os.path.join(dir_path, name)
+                    key = fold_name(name)
+                    paths = files.get(key)
+                    if paths is None:
+                        files[key] = [file_path]
+                    else:
+                        paths.append(file_path)
+            self._files = files
+
+        return self._files
+
+    def _get_folders(self):
+        if self._folders is None:
+            folders = []
+            for dir_path, listing in self._listings.iteritems():
+                keyed_names = sorted(
+                    [(fold_name(name), name) for name in listing[1]])
+                folders.append((
+                    dir_path, [key for key, name in keyed_names],
+                    [name for key, name in keyed_names]))
+            self._folders = folders
+
+        return self._folders
+
+    @property
+    def file_count(self):
+        return sum([len(paths) for paths in self._get_files().itervalues()])
+
+    def find(self, file_path):
+        """ Return paths of search root files matching file_path name
+
+        Files using tile or frame tokens match folders holding at least one
+        of their tiles, the returned path keeps the tokens. Paths are sorted
+        by their match score, best candidate first.
+        """
+        pattern = get_file_pattern(file_path)
+        if pattern is None:
+            candidates = self._get_files().get(
+                fold_name(os.path.basename(file_path)), [])
+        else:
+            file_name = os.path.basename(file_path)
+            candidates = [
+                os.path.join(dir_path, file_name)
+                for dir_path, keys, names in self._get_folders()
+                if pattern.match_listing(keys, names)]
+
+        # original location is missing, it cannot be a candidate
+        file_key = normalize_dir(file_path)
+        return sorted(
+            [candidate for candidate in candidates
+             if normalize_dir(candidate) != file_key],
+            key=lambda candidate: (
+                -get_match_score(file_path, candidate), candidate))
+
+    def find_files(self, file_paths):
+        """ Return dict of file path and its candidates, see find """
+        return dict([(file_path, self.find(file_path))
+                     for file_path in file_paths])
@@ -0,0 +1,190 @@
+# Qt import
+from PySide.QtGui import *
+from PySide.QtCore import *
+
+# custom import
+from mttCmd import mtt_log
+from mttCmdUi import get_maya_window
+from mttConfig import MTTSettings, WINDOW_TITLE, WINDOW_ICON
+from mttDecorators import wait_cursor
+
+
+RELINK_HEADER = ('Missing File', 'Nodes', 'New Path')
+RELINK_AMBIGUOUS_COLOR = QColor(230, 120, 60)
+RELINK_NOT_FOUND_COLOR = QColor(128, 128, 128)
+
+
+class MTTRelinkDialog(QDialog):
+    """ Preview of missing files relinked to files found in search folders
+
+    Files found once are checked, files found in several folders are shown
+    first with a choice of candidates and stay unchecked until one is
+    picked. Nothing changes before Relink is pressed.
+    """
+
+    def __init__(self, model, parent=get_maya_window()):
+        super(MTTRelinkDialog, self).__init__(parent)
+
+        self.model = model
+
+        # create UI
+        main_layout = QVBoxLayout(self)
+        main_layout.setSpacing(2)
+        main_layout.setContentsMargins(4, 4, 4, 4)
+
+        roots_layout = QHBoxLayout()
+        self.roots_label = QLabel()
+        roots_layout.addWidget(self.roots_label, 1)
+        add_root_button = QPushButton('Add Folder...')
+        add_root_button.clicked.connect(self.on_add_root)
+        roots_layout.addWidget(add_root_button)
+        clear_roots_button = QPushButton('Clear Folders')
+        clear_roots_button.setToolTip('Remove folders added to search roots')
+        clear_roots_button.clicked.connect(self.on_clear_roots)
+        roots_layout.addWidget(clear_roots_button)
+        rescan_button = QPushButton('Rescan')
+        # wait_cursor slots would receive the checked state
+        rescan_button.clicked.connect(lambda: self.refresh())
+        roots_layout.addWidget(rescan_button)
+        main_layout.addLayout(roots_layout)
+
+        self.summary_label = QLabel()
+        main_layout.addWidget(self.summary_label)
+
+        self.relink_tree = QTreeWidget()
+        self.relink_tree.setRootIsDecorated(False)
+        self.relink_tree.setAlternatingRowColors(True)
+        self.relink_tree.setHeaderLabels(RELINK_HEADER)
+        self.relink_tree.setColumnWidth(0, 300)
+        self.relink_tree.setColumnWidth(1, 120)
+        main_layout.addWidget(self.relink_tree)
+
+        buttons_layout = QHBoxLayout()
+        self.hide_not_found_cb = QCheckBox('Hide files not found')
+        self.hide_not_found_cb.setChecked(True)
+        self.hide_not_found_cb.toggled.connect(self.on_hide_not_found)
+        buttons_layout.addWidget(self.hide_not_found_cb, 1)
+        self.relink_button = QPushButton('&Relink')
+        self.relink_button.clicked.connect(lambda: self.on_relink())
+        buttons_layout.addWidget(self.relink_button)
+        close_button = QPushButton('&Close')
+        close_button.clicked.connect(self.reject)
+        buttons_layout.addWidget(close_button)
+        main_layout.addLayout(buttons_layout)
+
+        # adjust UI
+        self.setWindowTitle('%s - Relink Missing Files' % WINDOW_TITLE)
+        self.setWindowIcon(QIcon(WINDOW_ICON))
+        self.resize(900, 450)
+
+    def showEvent(self, event):
+        self.refresh()
+        super(MTTRelinkDialog, self).showEvent(event)
+
+    @wait_cursor
+    def refresh(self):
+        """ Search missing files again and fill tree """
+        roots = self.model.get_relink_roots()
+        self.roots_label.setText(
+            'Search folders : %s' % (', '.join(roots) or 'none'))
+        self.roots_label.setToolTip('\n'.join(roots))
+
+        files = self.model.find_relink_candidates()
+        found_count = len([paths for f, n, paths in files if paths])
+        ambiguous_count = len([paths for f, n, paths in files
+                               if len(paths) > 1])
+        self.summary_label.setText(
+            '%d missing files : %d found once, %d ambiguous, %d not found' % (
+                len(files), found_count - ambiguous_count, ambiguous_count,
+                len(files) - found_count))
+
+        # ambiguous files first, then files found once, then others
+        files.sort(key=lambda data: (
+            len(data[2]) < 2, not data[2], data[0]))
+        self.relink_tree.clear()
+        items = []
+        for file_path, node_names, candidates in files:
+            item = QTreeWidgetItem()
+            item.setText(0, file_path)
+            item.setToolTip(0, file_path)
+            item.setText(1, ', '.join(node_names))
+            item.setToolTip(1, '\n'.join(node_names))
+            if not candidates:
+                item.setText(2, 'not found')
+                for column in xrange(len(RELINK_HEADER)):
+                    item.setForeground(
+                        column, QBrush(RELINK_NOT_FOUND_COLOR))
+            else:
+                item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+                item.setCheckState(
+                    0, Qt.Checked if len(candidates) == 1 else Qt.Unchecked)
+                item.setData(0, Qt.UserRole, file_path)
+                item.setText(2, candidates[0])
+                item.setToolTip(2, '\n'.join(candidates))
+            if len(candidates) > 1:
+                item.setForeground(0, QBrush(RELINK_AMBIGUOUS_COLOR))
+            items.append(item)
+        self.relink_tree.addTopLevelItems(items)
+
+        # candidates of ambiguous files are picked in a combo box
+        for item, (file_path, node_names, candidates) in zip(items, files):
+            if len(candidates) < 2:
+                continue
+            combo = QComboBox()
+            combo.addItems(candidates)
+            combo.activated.connect(
+                lambda index, item=item: item.setCheckState(0, Qt.Checked))
+            self.relink_tree.setItemWidget(item, 2, combo)
+
+        self.on_hide_not_found()
+
+    def on_hide_not_found(self):
+        is_hidden = self.hide_not_found_cb.isChecked()
+        for index in xrange(self.relink_tree.topLevelItemCount()):
+            item = self.relink_tree.topLevelItem(index)
+            if not item.flags() & Qt.ItemIsUserCheckable:
+                item.setHidden(is_hidden)
+
+    def get_new_paths(self):
+        """ Return dict of missing file path and chosen path of checked
+        files
+        """
+        new_paths = dict()
+        for index in xrange(self.relink_tree.topLevelItemCount()):
+            item = self.relink_tree.topLevelItem(index)
+            if not item.flags() & Qt.ItemIsUserCheckable \
+                    or item.checkState(0) != Qt.Checked:
+                continue
+            combo = self.relink_tree.itemWidget(item, 2)
+            new_paths[item.data(0, Qt.UserRole)] = \
+                item.text(2) if combo is None else combo.currentText()
+
+        return new_paths
+
+    @wait_cursor
+    def on_relink(self):
+        new_paths = self.get_new_paths()
+        if not new_paths:
+            return
+
+        changed_nodes = self.model.relink_files(new_paths)
+        mtt_log('%d files relinked on %d nodes' % (
+            len(new_paths), len(changed_nodes)), verbose=False)
+        self.refresh()
+
+    def on_add_root(self):
+        folder = QFileDialog.getExistingDirectory(
+            self, 'Add Search Folder')
+        if not folder:
+            return
+
+        roots = [root for root in MTTSettings.value('relinkRoots').split(';;')
+                 if root]
+        if folder not in roots:
+            roots.append(folder)
+            MTTSettings.set_value('relinkRoots', ';;'.join(roots))
+            self.refresh()
+
+    def on_clear_roots(self):
+        MTTSettings.set_value('relinkRoots', '')
+        self.refresh()
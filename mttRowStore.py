@@ -0,0 +1,238 @@
+# Python import
+import os
+
+
+def get_norm_path(attribute):
+    """ Return normalized path shown for attribute value """
+    norm_path = os.path.normpath(attribute or '')
+    return '' if norm_path == '.' else norm_path
+
+
+class MTTFileRecord(object):
+    """ File columns shared by all rows of nodes using the same file """
+
+    __slots__ = ('file_id', 'file_path', 'state', 'instance_count',
+                 'tile_count', 'missing_tiles', 'width', 'height', 'channels',
+                 'bit_depth', 'format', 'size', 'content_hash',
+                 'duplicate_count', 'node_names')
+
+    def __init__(self, file_id):
+        self.file_id = file_id
+        self.file_path = None
+        self.state = None
+        self.instance_count = None
+        self.tile_count = None
+        self.missing_tiles = ''
+        self.width = None
+        self.height = None
+        self.channels = None
+        self.bit_depth = None
+        self.format = None
+        self.size = None
+        self.content_hash = None
+        self.duplicate_count = None
+        # names of cached rows using this file
+        self.node_names = set()
+
+    def get_values(self):
+        return (self.file_path, self.state, self.instance_count,
+                self.tile_count, self.missing_tiles, self.width, self.height,
+                self.channels, self.bit_depth, self.format, self.size,
+                self.content_hash, self.duplicate_count)
+
+    def set_values(self, values):
+        (self.file_path, self.state, self.instance_count, self.tile_count,
+            self.missing_tiles, self.width, self.height, self.channels,
+            self.bit_depth, self.format, self.size, self.content_hash,
+            self.duplicate_count) = values
+
+
+class MTTRow(object):
+    """ Cached model row of a texture node
+
+    sort_value and sort_name hold the sort key the row was placed with,
+    they differ from current values until the row is moved.
+    """
+
+    __slots__ = ('name', 'type', 'is_ref', 'attribute', 'norm_path', 'file',
+                 'sort_value', 'sort_name')
+
+    def __init__(self, name, node_type, is_ref, attribute, norm_path,
+                 file_record):
+        self.name = name
+        self.type = node_type
+        self.is_ref = is_ref
+        self.attribute = attribute
+        self.norm_path = norm_path
+        self.file = file_record
+        self.sort_value = None
+        self.sort_name = None
+
+
+class MTTRowStore(object):
+    """ Cached rows of model nodes built from ROW_QUERY results
+
+    File columns live in one MTTFileRecord per file instead of being copied
+    in every instance row, node types, attribute values and normalized paths
+    are stored once per distinct value.
+    """
+
+    def __init__(self):
+        self.rows = dict()
+        # file id: MTTFileRecord, None for nodes without file
+        self.files = dict()
+        self._strings = dict()
+        # attribute value: normalized path shown in file column
+        self._norm_paths = dict()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, node_name):
+        return node_name in self.rows
+
+    def __getitem__(self, node_name):
+        return self.rows[node_name]
+
+    def get(self, node_name):
+        return self.rows.get(node_name)
+
+    def values(self):
+        return self.rows.values()
+
+    def clear(self):
+        self.rows.clear()
+        self.files.clear()
+        self._strings.clear()
+        self._norm_paths.clear()
+
+    def intern(self, value):
+        """ Return the stored string equal to value """
+        return self._strings.setdefault(value, value)
+
+    def get_norm_path(self, attribute):
+        """ Return normalized path shown for attribute value """
+        try:
+            return self._norm_paths[attribute]
+        except KeyError:
+            norm_path = self._norm_paths[attribute] = self.intern(
+                get_norm_path(attribute))
+            return norm_path
+
+    @staticmethod
+    def get_file_values(data):
+        """ Return MTTFileRecord values of a ROW_QUERY result """
+        return (data[6], data[3], data[4], data[8], data[9] or '') + \
+            tuple(data[10:18])
+
+    def _set_file_values(self, record, values):
+        # image format is the only string repeated across files
+        record.set_values(
+            values[:9] + (values[9] and self.intern(values[9]), ) +
+            values[10:])
+
+    def _update_file(self, data):
+        """ Return file record of ROW_QUERY result and True if it changed """
+        values = self.get_file_values(data)
+        record = self.files.get(data[7])
+        if record is None:
+            record = self.files[data[7]] = MTTFileRecord(data[7])
+        elif record.get_values() == values:
+            return record, False
+
+        self._set_file_values(record, values)
+        return record, True
+
+    def update_files(self, rows_data):
+        """ Update stored file records of ROW_QUERY results
+
+        Rows of nodes not cached yet are not created.
+        """
+        for data in rows_data:
+            record = self.files.get(data[7])
+            if record is not None:
+                self._set_file_values(record, self.get_file_values(data))
+
+    def create_row(self, data):
+        """ Return row of a ROW_QUERY result without storing it """
+        record = self.files.get(data[7])
+        if record is None or record.get_values() != \
+                self.get_file_values(data):
+            record = MTTFileRecord(data[7])
+            self._set_file_values(record, self.get_file_values(data))
+        attribute = data[5] and self.intern(data[5])
+
+        return MTTRow(data[0], self.intern(data[1]), data[2], attribute,
+                      self.get_norm_path(attribute), record)
+
+    def cache_rows(self, rows_data):
+        """ Create or update rows of ROW_QUERY results
+
+        Existing rows are updated in place. Rows of other nodes sharing a
+        changed file are reported as updated too.
+
+        :return: updated rows and new rows lists
+        """
+        updated_rows = []
+        new_rows = []
+        changed_files = []
+        for data in rows_data:
+            record, is_changed = self._update_file(data)
+            if is_changed:
+                changed_files.append(record)
+            attribute = data[5] and self.intern(data[5])
+
+            row = self.rows.get(data[0])
+            if row is None:
+                row = self.rows[data[0]] = MTTRow(
+                    data[0], self.intern(data[1]), data[2], attribute,
+                    self.get_norm_path(attribute), record)
+                record.node_names.add(row.name)
+                new_rows.append(row)
+                continue
+
+            if row.file is not record:
+                self._discard_file_node(row)
+                row.file = record
+                record.node_names.add(row.name)
+            row.type = self.intern(data[1])
+            row.is_ref = data[2]
+            row.attribute = attribute
+            row.norm_path = self.get_norm_path(attribute)
+            updated_rows.append(row)
+
+        # instances of changed files, rows already listed are skipped
+        listed_rows = set([row.name for row in updated_rows])
+        listed_rows.update([row.name for row in new_rows])
+        for record in changed_files:
+            for node_name in record.node_names.difference(listed_rows):
+                updated_rows.append(self.rows[node_name])
+                listed_rows.add(node_name)
+
+        return updated_rows, new_rows
+
+    def _discard_file_node(self, row):
+        record = row.file
+        record.node_names.discard(row.name)
+        if not record.node_names and \
+                self.files.get(record.file_id) is record:
+            del self.files[record.file_id]
+
+    def pop(self, node_name):
+        """ Remove and return row of node_name """
+        row = self.rows.pop(node_name)
+        self._discard_file_node(row)
+        return row
+
+    def rename(self, node_name, new_name):
+        """ Rename row of node_name, return the row """
+        row = self.pop(node_name)
+        row.name = new_name
+        self.add(row)
+        return row
+
+    def add(self, row):
+        """ Store a row taken out by pop """
+        self.rows[row.name] = row
+        row.file = self.files.setdefault(row.file.file_id, row.file)
+        row.file.node_names.add(row.name)
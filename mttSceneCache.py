@@ -0,0 +1,206 @@
+# Python import
+import os
+import json
+import sqlite3
+from hashlib import sha1
+from time import time
+# Custom import
+from mttCmd import mtt_log
+
+
+CACHED_TABLES = ('RefTable', 'FilesTable', 'NodesTable')
+SNAPSHOT_EXT = '.db'
+
+
+class MTTSceneCache(object):
+    """ On-disk snapshots of texture database, one file per scene key
+
+    Snapshots are plain SQLite files using the same schema as the in-memory
+    database. Least recently used snapshots are evicted when there are more
+    than max_entries files or when they are older than max_age days.
+    """
+
+    def __init__(self, folder, schema_version, migrate=None, max_entries=20,
+                 max_age=30):
+        """
+        :param folder: (string) snapshot folder, created on first save
+        :param schema_version: (int) expected database schema version
+        :param migrate: (callable) receive a snapshot connection to upgrade
+                        its schema, older snapshots are dropped if None
+        :param max_entries: (int) maximum snapshot count
+        :param max_age: (int) days before a snapshot is evicted
+        """
+        self.folder = folder
+        self.schema_version = schema_version
+        self.migrate = migrate
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.stats_path = os.path.join(folder, 'stats.json')
+        self.hits = 0
+        self.misses = 0
+        self._load_stats()
+
+    @staticmethod
+    def get_key(*args):
+        """ Return snapshot key of args """
+        return sha1(repr(args)).hexdigest()
+
+    def get_snapshot_path(self, key):
+        return os.path.join(self.folder, key + SNAPSHOT_EXT)
+
+    def load(self, db, key, validate=None):
+        """ Copy snapshot content into db tables
+
+        :param db: sqlite3 connection with empty tables
+        :param key: snapshot key
+        :param validate: (callable) receive db once filled, snapshot is
+                         discarded when it returns False
+        :return: True if snapshot was loaded
+        """
+        snapshot_path = self.get_snapshot_path(key)
+        is_loaded = False
+
+        if os.path.isfile(snapshot_path) and self._check_schema(snapshot_path):
+            db.commit()
+            c = db.cursor()
+            c.execute('ATTACH DATABASE ? AS snapshot', (snapshot_path, ))
+            try:
+                for table in CACHED_TABLES:
+                    c.execute(
+                        'INSERT INTO main.%s SELECT * FROM snapshot.%s'
+                        % (table, table))
+                db.commit()
+                is_loaded = True
+            except sqlite3.Error:
+                db.rollback()
+            finally:
+                c.execute('DETACH DATABASE snapshot')
+
+            if is_loaded and validate is not None and not validate(db):
+                for table in CACHED_TABLES:
+                    c.execute('DELETE FROM main.%s' % table)
+                db.commit()
+                is_loaded = False
+
+            try:
+                if is_loaded:
+                    os.utime(snapshot_path, None)
+                else:
+                    self.remove(key)
+            except (IOError, OSError), e:
+                mtt_log('Scene cache snapshot not updated : %s' % e,
+                        msg_type='warning', verbose=False)
+
+        if is_loaded:
+            self.hits += 1
+        else:
+            self.misses += 1
+        try:
+            self._save_stats()
+        except (IOError, OSError), e:
+            mtt_log('Scene cache stats not saved : %s' % e,
+                    msg_type='warning', verbose=False)
+
+        return is_loaded
+
+    def save(self, db, key):
+        """ Write db tables to key snapshot and evict old snapshots
+
+        :param db: sqlite3 connection
+        :param key: snapshot key
+        """
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+
+        snapshot_path = self.get_snapshot_path(key)
+        tmp_path = snapshot_path + '.tmp'
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+
+        # create schema with the same statements as main database
+        snapshot_db = sqlite3.connect(tmp_path)
+        if self.migrate is not None:
+            self.migrate(snapshot_db)
+        snapshot_db.close()
+
+        db.commit()
+        c = db.cursor()
+        c.execute('ATTACH DATABASE ? AS snapshot', (tmp_path, ))
+        try:
+            for table in CACHED_TABLES:
+                c.execute(
+                    'INSERT INTO snapshot.%s SELECT * FROM main.%s'
+                    % (table, table))
+            db.commit()
+        finally:
+            c.execute('DETACH DATABASE snapshot')
+
+        if os.path.isfile(snapshot_path):
+            os.remove(snapshot_path)
+        os.rename(tmp_path, snapshot_path)
+
+        self.evict()
+
+    def remove(self, key):
+        snapshot_path = self.get_snapshot_path(key)
+        if os.path.isfile(snapshot_path):
+            os.remove(snapshot_path)
+
+    def evict(self):
+        """ Remove snapshots over max_entries or older than max_age days """
+        if not os.path.isdir(self.folder):
+            return
+
+        snapshots = []
+        for file_name in os.listdir(self.folder):
+            if file_name.endswith(SNAPSHOT_EXT):
+                file_path = os.path.join(self.folder, file_name)
+                snapshots.append((os.path.getmtime(file_path), file_path))
+        snapshots.sort(reverse=True)
+
+        oldest_time = time() - self.max_age * 86400
+        for i, (mtime, file_path) in enumerate(snapshots):
+            if i >= self.max_entries or mtime < oldest_time:
+                os.remove(file_path)
+
+    def clear(self):
+        """ Remove all snapshots and reset counters """
+        if os.path.isdir(self.folder):
+            for file_name in os.listdir(self.folder):
+                if file_name.endswith(SNAPSHOT_EXT):
+                    os.remove(os.path.join(self.folder, file_name))
+        self.hits = 0
+        self.misses = 0
+        self._save_stats()
+
+    def _check_schema(self, snapshot_path):
+        """ Return True if snapshot schema is or could be made current """
+        snapshot_db = sqlite3.connect(snapshot_path)
+        try:
+            c = snapshot_db.cursor()
+            c.execute('PRAGMA user_version')
+            version = c.fetchone()[0]
+            if version < self.schema_version and self.migrate is not None:
+                self.migrate(snapshot_db)
+                version = self.schema_version
+            return version == self.schema_version
+        except sqlite3.Error:
+            return False
+        finally:
+            snapshot_db.close()
+
+    def _load_stats(self):
+        if os.path.isfile(self.stats_path):
+            try:
+                with open(self.stats_path, 'r') as f:
+                    stats = json.load(f)
+                self.hits = stats.get('hits', 0)
+                self.misses = stats.get('misses', 0)
+            except (IOError, ValueError):
+                pass
+
+    def _save_stats(self):
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        with open(self.stats_path, 'w') as f:
+            json.dump({'hits': self.hits, 'misses': self.misses}, f)
@@ -13,7 +13,10 @@ from maya import cmds
 from __init__ import __version__, __author__
 import mttOverridePanels
 from mttQuickFilterManager import MTTQuickFilterManager
+from mttMemoryBudgetDialog import MTTMemoryBudgetDialog
+from mttRelinkDialog import MTTRelinkDialog
 from mttCmd import mtt_log
+from mttExport import EXTRA_COLUMNS
 from mttConfig import (
     MTTSettings, WINDOW_TITLE, TAG, THEMES, PROMPT_INSTANCE_WAIT_DURATION,
     PROMPT_INSTANCE_ASK, PROMPT_INSTANCE_WAIT, PROMPT_INSTANCE_SESSION,
@@ -27,6 +30,8 @@ class MTTSettingsMenu(QMenu):
 
         self.view = parent
         self.is_master_cmd = False
+        self.memory_budget_dialog = None
+        self.relink_dialog = None
         # power user state
         self.power_user = MTTSettings.value('powerUser')
 
@@ -94,6 +99,13 @@ class MTTSettingsMenu(QMenu):
             True,
             MTTSettings.value('showRealAttributeValue'))
 
+        self.scene_cache_a = add_action(
+            'Scene Cache',
+            'Reuse texture list saved for unmodified scenes at startup',
+            self.on_toggle_scene_cache,
+            True,
+            MTTSettings.value('sceneCache'))
+
         self.manage_quick_filter_a = add_action(
             'Manage Quick Filters',
             'Manage filters that popup with right clic in filter field',
@@ -111,10 +123,22 @@ class MTTSettingsMenu(QMenu):
             self.on_override_panels)
 
         self.export_to_csv = add_action(
-            'Export Texture List as CSV',
-            'Export current textures into a csv file',
+            'Export Texture List',
+            'Export current textures into a csv, json lines or html file',
             self.view.model.export_as_csv)
 
+        self.memory_budget_a = add_action(
+            'Texture Memory Budget',
+            'Estimate memory used by textures per file, reference and '
+            'shading group',
+            self.on_show_memory_budget)
+
+        self.relink_a = add_action(
+            'Relink Missing Files',
+            'Find missing files by name in search folders and preview '
+            'new paths before relinking',
+            self.on_show_relink)
+
         self.about = add_action(
             'About',
             'About',
@@ -131,6 +155,7 @@ class MTTSettingsMenu(QMenu):
         self.addAction(self.focus_filter_a)
         self.addAction(self.force_relative_path_a)
         self.addAction(self.show_real_attr_value_a)
+        self.addAction(self.scene_cache_a)
         self.addMenu(self._create_instance_menu())
         self.addMenu(self._create_theme_menu())
 
@@ -145,6 +170,9 @@ class MTTSettingsMenu(QMenu):
         self.addAction(self._get_menu_header('MISC'))
         self.addAction(self.override_panels_a)
         self.addAction(self.export_to_csv)
+        self.addMenu(self._create_export_column_menu())
+        self.addAction(self.memory_budget_a)
+        self.addAction(self.relink_a)
 
         self.addSeparator()
 
@@ -194,6 +222,20 @@ class MTTSettingsMenu(QMenu):
 
         return theme_menu
 
+    def _create_export_column_menu(self):
+        export_column_menu = QMenu(self)
+        export_column_menu.setTitle('Export Extra Columns')
+        extra_columns = MTTSettings.value('exportExtraColumns').split(',')
+        for label in sorted(EXTRA_COLUMNS.iterkeys()):
+            column_action = QAction(label, export_column_menu)
+            column_action.setData(label)
+            column_action.setCheckable(True)
+            column_action.setChecked(label in extra_columns)
+            column_action.triggered.connect(self.on_toggle_export_column)
+            export_column_menu.addAction(column_action)
+
+        return export_column_menu
+
     def _create_debug_menu(self):
         self.debug_menu = QMenu(self)
         self.debug_menu.setTitle('Debug Menu')
@@ -232,6 +274,52 @@ class MTTSettingsMenu(QMenu):
         database_dump_sql.triggered.connect(self.view.model.database_dump_sql)
         self.debug_menu.addAction(database_dump_sql)
 
+        scene_cache = self.view.model.scene_cache
+        clear_scene_cache = QAction(
+            'Clear Scene Cache (%d hits, %d misses)' % (
+                scene_cache.hits, scene_cache.misses), self)
+        clear_scene_cache.setStatusTip('Remove all saved texture lists')
+        clear_scene_cache.triggered.connect(scene_cache.clear)
+        self.debug_menu.addAction(clear_scene_cache)
+
+        node_event_stats = QAction(
+            'Node Events : %(received)d received, %(merged)d merged, '
+            '%(flushes)d flushes' % self.view.node_events.get_stats(), self)
+        node_event_stats.setEnabled(False)
+        self.debug_menu.addAction(node_event_stats)
+
+        path_resolver_stats = QAction(
+            'Path Resolver : %(hits)d hits, %(misses)d misses, '
+            '%(dir_hits)d listing hits, %(dir_misses)d listings'
+            % self.view.model.texture_index.resolver.get_stats(), self)
+        path_resolver_stats.setEnabled(False)
+        self.debug_menu.addAction(path_resolver_stats)
+
+        file_watcher = self.view.file_watcher
+        file_watch_stats = QAction(
+            'File Watches : %d used for %d files (%s)' % (
+                file_watcher.get_watch_count(),
+                file_watcher.get_tracked_count(),
+                file_watcher.get_backend_name()), self)
+        file_watch_stats.setEnabled(False)
+        self.debug_menu.addAction(file_watch_stats)
+
+        native_file_watch = QAction('Native File Watch', self)
+        native_file_watch.setStatusTip(
+            'Use Linux inotify directory watches on next MTT start')
+        native_file_watch.setCheckable(True)
+        native_file_watch.setChecked(MTTSettings.value('nativeFileWatch'))
+        native_file_watch.triggered.connect(self.on_toggle_native_file_watch)
+        self.debug_menu.addAction(native_file_watch)
+
+        polling_file_watch = QAction('Polling File Watch', self)
+        polling_file_watch.setStatusTip(
+            'Poll files on next MTT start, for network shares')
+        polling_file_watch.setCheckable(True)
+        polling_file_watch.setChecked(MTTSettings.value('pollingFileWatch'))
+        polling_file_watch.triggered.connect(self.on_toggle_polling_file_watch)
+        self.debug_menu.addAction(polling_file_watch)
+
         self.debug_menu.addSeparator()
 
         support_info = QMenu(self)
@@ -252,11 +340,11 @@ class MTTSettingsMenu(QMenu):
         self.view.on_set_source_edit_menu(not state)
 
     def on_show_real_attribute_value(self):
-        self.view.model.layoutAboutToBeChanged.emit()
         show_real_attribute_state = MTTSettings.value('showRealAttributeValue')
         MTTSettings.set_value(
             'showRealAttributeValue', not show_real_attribute_state)
-        self.view._layout_changed()
+        self.view.model.refresh_layout()
+        self.view.status_line_ui.update_node_file_count()
 
     def on_filter_manage_quick_filter(self):
         """ Open Quick Filter words manager and save its content """
@@ -270,6 +358,21 @@ class MTTSettingsMenu(QMenu):
             self.view.quick_filter_words = lists[MTTSettings.value('filterRE')]
         manager.deleteLater()
 
+    def on_show_memory_budget(self):
+        """ Open texture memory budget, dialog is reused once created """
+        if self.memory_budget_dialog is None:
+            self.memory_budget_dialog = MTTMemoryBudgetDialog(
+                self.view.model, self.view)
+        self.memory_budget_dialog.show()
+        self.memory_budget_dialog.raise_()
+
+    def on_show_relink(self):
+        """ Open relink preview, dialog is reused once created """
+        if self.relink_dialog is None:
+            self.relink_dialog = MTTRelinkDialog(self.view.model, self.view)
+        self.relink_dialog.show()
+        self.relink_dialog.raise_()
+
     @staticmethod
     def on_toggle_headsup():
         state = MTTSettings.value('showHeadsUp')
@@ -280,6 +383,27 @@ class MTTSettingsMenu(QMenu):
         state = MTTSettings.value('filterFocus')
         MTTSettings.set_value('filterFocus', not state)
 
+    @staticmethod
+    def on_toggle_native_file_watch():
+        state = MTTSettings.value('nativeFileWatch')
+        MTTSettings.set_value('nativeFileWatch', not state)
+
+    def on_toggle_export_column(self):
+        extra_columns = [
+            action.data() for action in self.sender().parent().actions()
+            if action.isChecked()]
+        MTTSettings.set_value('exportExtraColumns', ','.join(extra_columns))
+
+    @staticmethod
+    def on_toggle_polling_file_watch():
+        state = MTTSettings.value('pollingFileWatch')
+        MTTSettings.set_value('pollingFileWatch', not state)
+
+    @staticmethod
+    def on_toggle_scene_cache():
+        state = MTTSettings.value('sceneCache')
+        MTTSettings.set_value('sceneCache', not state)
+
     @staticmethod
     def on_force_relative_path():
         state = MTTSettings.value('forceRelativePath')
@@ -0,0 +1,1129 @@
+# Python import
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from time import time
+# Custom import
+from mttFilePattern import MTTTileCache
+from mttFileState import MTTFileStateCache
+from mttPathResolver import MTTPathResolver
+
+
+# database schema steps, DB_SCHEMA[n] upgrades a version n database
+DB_SCHEMA = (
+    # version 1 : tables
+    (
+        'CREATE TABLE NodesTable('
+        'Id INTEGER PRIMARY KEY AUTOINCREMENT, '
+        'Name TEXT, '
+        'Type TEXT, '
+        'Attribute TEXT, '
+        'IsRef INTEGER, '
+        'FileId INTEGER, '
+        'RefName TEXT)',
+        'CREATE TABLE FilesTable('
+        'FileId INTEGER PRIMARY KEY AUTOINCREMENT, '
+        'KeyPath TEXT, '
+        'FilePath TEXT, '
+        'State INTEGER, '
+        'InstanceCount INTEGER)',
+        'CREATE TABLE RefTable('
+        'RefName TEXT PRIMARY KEY, '
+        'RefPath TEXT, '
+        'RefSourceImage TEXT)',
+    ),
+    # version 2 : lookup indexes used by node and file accessors
+    (
+        'CREATE UNIQUE INDEX NodesNameIndex ON NodesTable(Name)',
+        'CREATE INDEX NodesFileIdIndex ON NodesTable(FileId)',
+        'CREATE UNIQUE INDEX FilesKeyPathIndex ON FilesTable(KeyPath)',
+    ),
+    # version 3 : parent directory of files for directory watch events
+    (
+        'ALTER TABLE FilesTable ADD COLUMN DirPath TEXT',
+        'UPDATE FilesTable SET DirPath=DIR_PATH(FilePath)',
+        'CREATE INDEX FilesDirPathIndex ON FilesTable(DirPath)',
+    ),
+    # version 4 : file lookup by state
+    (
+        'CREATE INDEX FilesStateIndex ON FilesTable(State)',
+    ),
+    # version 5 : tiles of UDIM and image sequence files
+    (
+        'ALTER TABLE FilesTable ADD COLUMN TileCount INTEGER',
+        'ALTER TABLE FilesTable ADD COLUMN MissingTiles TEXT DEFAULT ""',
+    ),
+    # version 6 : node columns sorting virtual rows
+    (
+        'CREATE INDEX NodesTypeIndex ON NodesTable(Type, Name)',
+        'CREATE INDEX NodesAttributeIndex ON NodesTable(Attribute, Name)',
+        'CREATE INDEX NodesIsRefIndex ON NodesTable(IsRef, Name)',
+    ),
+    # version 7 : image header metadata, FileMTime is NULL until read
+    (
+        'ALTER TABLE FilesTable ADD COLUMN Width INTEGER',
+        'ALTER TABLE FilesTable ADD COLUMN Height INTEGER',
+        'ALTER TABLE FilesTable ADD COLUMN Channels INTEGER',
+        'ALTER TABLE FilesTable ADD COLUMN BitDepth INTEGER',
+        'ALTER TABLE FilesTable ADD COLUMN Format TEXT',
+        'ALTER TABLE FilesTable ADD COLUMN FileSize INTEGER',
+        'ALTER TABLE FilesTable ADD COLUMN FileMTime REAL',
+    ),
+    # version 8 : content digest of files sharing size with another file,
+    # DuplicateCount is the count of other files with the same digest
+    (
+        'ALTER TABLE FilesTable ADD COLUMN ContentHash TEXT',
+        'ALTER TABLE FilesTable ADD COLUMN DuplicateCount INTEGER',
+        'CREATE INDEX FilesContentHashIndex ON FilesTable(ContentHash)',
+    ),
+)
+DB_SCHEMA_VERSION = len(DB_SCHEMA)
+
+ROW_TABLES = (
+    'FROM NodesTable as N '
+    'LEFT JOIN FilesTable as F ON N.FileId=F.FileId ')
+ROW_QUERY = (
+    'SELECT Name, Type, IsRef, State, InstanceCount, Attribute, FilePath, '
+    'N.FileId, TileCount, MissingTiles, Width, Height, Channels, BitDepth, '
+    'Format, FileSize, ContentHash, DuplicateCount ' + ROW_TABLES)
+FILE_INSERT_QUERY = (
+    'INSERT INTO '
+    'FilesTable(FileId, KeyPath, FilePath, State, InstanceCount, DirPath, '
+    'TileCount, MissingTiles) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+
+# maximum bound parameters per query, SQLite default is 999
+SQL_PARAMETER_LIMIT = 900
+
+
+def iter_chunks(values, size=SQL_PARAMETER_LIMIT):
+    """ Yield lists of at most size values """
+    values = list(values)
+    for i in xrange(0, len(values), size):
+        yield values[i:i + size]
+
+
+def sql_in(column, values):
+    """ Return 'column IN (?, ...)' clause for values """
+    return '%s IN (%s)' % (column, ', '.join('?' * len(values)))
+
+
+def convert_to_key_path(file_path):
+    """ Return case insensitive lookup key of file_path """
+    return os.path.normpath(file_path).lower()
+
+
+def get_dir_path(file_path):
+    """ Return normalized parent directory of file_path """
+    return os.path.normpath(os.path.dirname(file_path or ''))
+
+
+# noinspection SqlResolve
+class MTTTextureIndex(object):
+    """ Texture nodes and files database of a Maya scene
+
+    Index owns the SQLite schema, path resolution, instance counts and file
+    states. Files using UDIM, uv tile or frame tokens are tracked through
+    their tiles. It has no Qt dependency: scene access goes through the given
+    cmds module so it runs in mayapy, batch jobs or against a stand-in
+    module in benchmarks.
+    """
+
+    def __init__(self, cmds=None, supported_types=(), file_states=None,
+                 resolver=None, get_attr_values=None,
+                 file_added_callback=None):
+        """
+        :param cmds: maya.cmds or a module with the same interface
+        :param supported_types: list of (node type, nice name, attribute)
+        :param file_states: MTTFileStateCache instance, a default one is
+                            created if None
+        :param resolver: MTTPathResolver instance, a default one is created
+                         if None
+        :param get_attr_values: (callable) receive node names and attribute
+                                name, return string values in nodes order
+        :param file_added_callback: (callable) receive path of each file
+                                    registered in database
+        """
+        if cmds is None:
+            from maya import cmds
+        self.cmds = cmds
+        self.supported_types = supported_types
+        self.file_states = file_states or MTTFileStateCache()
+        self.resolver = resolver or MTTPathResolver()
+        self.tiles = MTTTileCache()
+        # tile key path: file path of its pattern
+        self.tile_files = dict()
+        self.get_attr_values = get_attr_values or self._get_attr_values
+        self.file_added_callback = file_added_callback
+        self.db = None
+        self.batch_depth = 0
+        # reference name: (project path, sourceimages folder)
+        self.reference_roots = dict()
+        # temporary table name: node names it holds
+        self.name_filters = dict()
+        # (phase name, duration) of last populate
+        self.populate_timings = []
+
+    def _get_attr_values(self, nodes, attr):
+        return [self.cmds.getAttr('%s.%s' % (node, attr)) for node in nodes]
+
+    def add_file_watch(self, file_path):
+        """ Send file_path and tiles of its pattern to file_added_callback """
+        if self.file_added_callback is None:
+            return
+        self.file_added_callback(file_path)
+        if self.tiles.get_pattern(file_path) is not None:
+            for tile_path in self.tiles.get_tiles(file_path)[0]:
+                self.file_added_callback(tile_path)
+
+    def get_file_data(self, file_paths):
+        """ Return dict of file path and (state, tile count, missing tiles)
+
+        State of a pattern is the lowest state of its tiles, -1 if no tile
+        exists. Tile count is None for single files. All files and tiles are
+        probed with a single file state request.
+
+        :param file_paths: (iterable) file paths
+        """
+        file_paths = set(file_paths)
+        tiles = dict()
+        probed_paths = []
+        for file_path in file_paths:
+            if self.tiles.get_pattern(file_path) is None:
+                probed_paths.append(file_path)
+            else:
+                tiles[file_path] = self.tiles.get_tiles(file_path)
+                probed_paths.extend(tiles[file_path][0])
+        states = self.file_states.get_states(probed_paths)
+
+        file_data = dict()
+        for file_path in file_paths:
+            if file_path not in tiles:
+                file_data[file_path] = (states[file_path], None, '')
+                continue
+
+            tile_paths, missing_tiles = tiles[file_path]
+            for tile_path in tile_paths:
+                self.tile_files[convert_to_key_path(tile_path)] = file_path
+            file_data[file_path] = (
+                min([states[tile_path] for tile_path in tile_paths] or [-1]),
+                len(tile_paths), ', '.join(missing_tiles))
+
+        return file_data
+
+    def match_file_names(self, file_path, names):
+        """ Return True if file_path or one of its tiles is in names """
+        pattern = self.tiles.get_pattern(file_path)
+        if pattern is None:
+            return os.path.basename(file_path) in names
+        return bool(pattern.match_names(names))
+
+    def get_tile_file(self, file_path):
+        """ Return pattern file path of a tile, None for other paths """
+        return self.tile_files.get(convert_to_key_path(file_path))
+
+    # -------------------------------------------------------------------------
+    # database
+    def create(self):
+        """ Create an empty in-memory database """
+        self.close()
+        self.reference_roots.clear()
+        self.tile_files.clear()
+        self.tiles.invalidate()
+        self.resolver.invalidate()
+        self.name_filters.clear()
+        self.db = sqlite3.connect(':memory:')
+        self.migrate(self.db)
+
+    def close(self):
+        """ Close database connection """
+        if self.db:
+            self.db.close()
+            self.db = None
+
+    @staticmethod
+    def migrate(db):
+        """ Bring database schema up to DB_SCHEMA_VERSION
+
+        Schema version is stored in the user_version pragma, only missing
+        steps of DB_SCHEMA are applied.
+
+        :param db: sqlite3 connection
+        :return: schema version found before migration
+        """
+        db.create_function('DIR_PATH', 1, get_dir_path)
+        c = db.cursor()
+        c.execute('PRAGMA user_version')
+        version = c.fetchone()[0]
+
+        for statements in DB_SCHEMA[version:]:
+            for statement in statements:
+                c.execute(statement)
+
+        if version != DB_SCHEMA_VERSION:
+            c.execute('PRAGMA user_version=%d' % DB_SCHEMA_VERSION)
+            db.commit()
+
+        return version
+
+    def commit(self):
+        """ Commit database unless a batch is running """
+        if not self.batch_depth:
+            self.db.commit()
+
+    @contextmanager
+    def batch(self):
+        """ Group database changes, commits are deferred to the end of the
+        outermost batch
+
+        Each level uses a savepoint, changes of a failing level are rolled
+        back before the exception is raised again.
+        """
+        savepoint = 'Batch%d' % self.batch_depth
+        if not self.batch_depth:
+            self.db.commit()
+            # manage transaction with savepoints only
+            self.db.isolation_level = None
+        self.db.execute('SAVEPOINT %s' % savepoint)
+        self.batch_depth += 1
+
+        try:
+            yield
+        except:
+            self.db.execute('ROLLBACK TO %s' % savepoint)
+            self.db.execute('RELEASE %s' % savepoint)
+            raise
+        else:
+            self.db.execute('RELEASE %s' % savepoint)
+        finally:
+            self.batch_depth -= 1
+            if not self.batch_depth:
+                self.db.isolation_level = ''
+
+    # -------------------------------------------------------------------------
+    # populate
+    def scan(self):
+        """ Fill database from current scene
+
+        Scene is scanned in bulk per node type, paths are resolved once per
+        distinct attribute value and everything is inserted in one transaction.
+        Phase durations are stored in populate_timings.
+
+        :return: node count and file count
+        """
+        cmds = self.cmds
+        timings = []
+        phase_start = [time()]
+
+        def end_phase(phase_name):
+            now = time()
+            timings.append((phase_name, now - phase_start[0]))
+            phase_start[0] = now
+
+        # get cursor
+        c = self.db.cursor()
+
+        # add current workspace to first key of RefTable
+        sourceimage_folder = 'sourceimages'
+        if 'sourceImages' in cmds.workspace(fileRuleList=True):
+            sourceimage_folder = cmds.workspace(fileRuleEntry='sourceImages')
+        workspace_path = cmds.workspace(query=True, rootDirectory=True)
+        references = {'ROOT': (workspace_path, sourceimage_folder)}
+
+        # gather node names, attribute values and reference membership
+        scene_nodes = []
+        referenced_nodes = set()
+        for n_type, nice_name, node_attr in self.supported_types:
+            nodes = cmds.ls(exactType=n_type)
+            if not nodes:
+                continue
+
+            # format nicename
+            if nice_name is '' or nice_name is None:
+                nice_name = n_type
+
+            values = self.get_attr_values(nodes, node_attr)
+            scene_nodes.extend(
+                [(node, nice_name, value)
+                 for node, value in zip(nodes, values)])
+            referenced_nodes.update(
+                cmds.ls(nodes, referencedNodes=True) or [])
+        end_phase('scan')
+
+        node_references = self.get_reference_nodes_map(referenced_nodes)
+        for ref_name in set(node_references.itervalues()):
+            references[ref_name] = self.get_reference_paths(ref_name)
+        end_phase('references')
+
+        # resolve each distinct attribute value once per reference
+        resolved_paths = dict()
+        for node, nice_name, value in scene_nodes:
+            ref_name = node_references.get(node, 'ROOT')
+            if (value, ref_name) not in resolved_paths:
+                root_path, sourceimage_dir = references[ref_name]
+                resolved_paths[(value, ref_name)] = self.resolver.resolve(
+                    value, root_path, sourceimage_dir)
+        self.reference_roots.update(references)
+        end_phase('resolve')
+
+        # register each distinct file once
+        files = dict()
+        node_rows = []
+        for node, nice_name, value in scene_nodes:
+            ref_name = node_references.get(node, 'ROOT')
+            file_path = resolved_paths[(value, ref_name)]
+            key_path = convert_to_key_path(file_path)
+            file_data = files.get(key_path)
+            if file_data is None:
+                file_data = files[key_path] = [len(files) + 1, file_path, 0]
+            file_data[2] += 1
+            node_rows.append((
+                node, nice_name, value, node in node_references,
+                file_data[0], ref_name))
+
+        file_info = self.get_file_data(
+            [file_data[1] for file_data in files.itervalues()])
+        file_rows = [
+            (file_id, key_path, file_path, file_info[file_path][0],
+             instance_count, get_dir_path(file_path))
+            + file_info[file_path][1:]
+            for key_path, (file_id, file_path, instance_count)
+            in files.iteritems()]
+        end_phase('state')
+
+        # insert everything in a single transaction
+        c.executemany(
+            'INSERT INTO RefTable(RefName, RefPath, RefSourceImage) '
+            'VALUES (?, ?, ?)',
+            [(ref_name, root_path, sourceimage_dir)
+             for ref_name, (root_path, sourceimage_dir)
+             in references.iteritems()])
+        c.executemany(FILE_INSERT_QUERY, file_rows)
+        c.executemany(
+            'INSERT INTO '
+            'NodesTable(Name, Type, Attribute, IsRef, FileId, RefName) '
+            'VALUES (?, ?, ?, ?, ?, ?)', node_rows)
+        self.db.commit()
+        end_phase('insert')
+
+        for file_row in file_rows:
+            self.add_file_watch(file_row[2])
+        end_phase('watch')
+
+        self.populate_timings = timings
+
+        return len(node_rows), len(file_rows)
+
+    def refresh_snapshot(self):
+        """ Update file states of a database loaded from a snapshot
+
+        :return: file count and changed state count
+        """
+        start = time()
+        c = self.db.cursor()
+        c.execute(
+            'SELECT FileId, FilePath, State, TileCount, MissingTiles '
+            'FROM FilesTable')
+        files = c.fetchall()
+
+        file_data = self.get_file_data([data[1] for data in files])
+        changed_states = [
+            file_data[data[1]] + (data[0], )
+            for data in files if file_data[data[1]] != data[2:]]
+        c.executemany(
+            'UPDATE FilesTable SET State=?, TileCount=?, MissingTiles=? '
+            'WHERE FileId=?', changed_states)
+        self.db.commit()
+
+        for data in files:
+            self.add_file_watch(data[1])
+
+        self.populate_timings = [('cache', time() - start)]
+
+        return len(files), len(changed_states)
+
+    def validate_snapshot(self, db):
+        """ Return True if snapshot node count matches current scene """
+        c = db.cursor()
+        c.execute('SELECT COUNT(*) FROM NodesTable')
+        scene_node_count = sum([
+            len(self.cmds.ls(exactType=n_type) or [])
+            for n_type, nice, attr in self.supported_types])
+
+        return c.fetchone()[0] == scene_node_count
+
+    # -------------------------------------------------------------------------
+    # node changes
+    def insert_node(self, node_name):
+        """ Insert scene node in database and return its file id """
+        node_type = self.cmds.nodeType(node_name)
+        type_nicename, attr = self.get_nicename_and_attribute_name(node_type)
+        attr_value = self.cmds.getAttr('%s.%s' % (node_name, attr))
+        file_path = self.get_attribute_absolute_file_path(node_name, attr_value)
+        last_id = self.add_file(file_path)
+
+        # add current node to database
+        c = self.db.cursor()
+        c.execute(
+            'INSERT INTO '
+            'NodesTable(Name, Type, Attribute, IsRef, FileId, RefName) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (node_name, type_nicename, attr_value, False, last_id, 'ROOT')
+        )
+
+        return last_id
+
+    def add_file(self, file_path):
+        """ Register one more instance of file_path and return its file id """
+        key_path = convert_to_key_path(file_path)
+
+        c = self.db.cursor()
+        c.execute('SELECT FileId FROM FilesTable WHERE KeyPath=?', (key_path, ))
+        data = c.fetchone()
+        if data is None:
+            # register current file data
+            file_state, tile_count, missing_tiles = self.get_file_data(
+                [file_path])[file_path]
+            c.execute(
+                FILE_INSERT_QUERY,
+                (None, key_path, file_path, file_state, 1,
+                 get_dir_path(file_path), tile_count, missing_tiles)
+            )
+            last_id = c.lastrowid
+            self.add_file_watch(file_path)
+        else:
+            # update current file data
+            last_id = data[0]
+            c.execute(
+                'UPDATE '
+                'FilesTable SET InstanceCount=InstanceCount + 1 '
+                'WHERE FileId=?', (last_id, ))
+
+        return last_id
+
+    def remove_node(self, node_name):
+        """ Remove node from database and return its file id """
+        file_ids = self.apply_node_changes([node_name], {}, [])
+        return file_ids.pop() if file_ids else None
+
+    def apply_node_changes(self, removed_nodes, renamed_nodes, added_nodes):
+        """ Apply a batch of scene node changes in one transaction
+
+        Renames are done in two passes so swapped names never collide.
+
+        :param removed_nodes: database names of removed nodes
+        :param renamed_nodes: dict of new name and database name
+        :param added_nodes: names of nodes to insert
+        :return: ids of files whose instances changed
+        """
+        c = self.db.cursor()
+        file_ids = set()
+
+        # remove nodes and recount instances of their files
+        for chunk in iter_chunks(removed_nodes):
+            c.execute(
+                'SELECT FileId FROM NodesTable WHERE ' + sql_in('Name', chunk),
+                chunk)
+            file_ids.update([data[0] for data in c.fetchall()])
+        c.executemany(
+            'DELETE FROM NodesTable WHERE Name=?',
+            [(node_name, ) for node_name in removed_nodes])
+        self.update_instance_counts(file_ids)
+
+        # rename
+        c.executemany(
+            'UPDATE NodesTable SET Name=? WHERE Name=?',
+            [('\0' + old_name, old_name)
+             for old_name in renamed_nodes.itervalues()])
+        c.executemany(
+            'UPDATE NodesTable SET Name=? WHERE Name=?',
+            [(new_name, '\0' + old_name)
+             for new_name, old_name in renamed_nodes.iteritems()])
+
+        # add nodes
+        for node_name in added_nodes:
+            file_ids.add(self.insert_node(node_name))
+
+        self.commit()
+        file_ids.discard(None)
+
+        return file_ids
+
+    def rename_node(self, node_name, wanted_name):
+        self.db.cursor().execute(
+            'UPDATE NodesTable SET Name=? WHERE Name=?',
+            (wanted_name, node_name))
+
+    def set_node_attribute(self, node_name, attr_value):
+        """ Update attribute value of node without changing its file """
+        self.db.cursor().execute(
+            'UPDATE NodesTable SET Attribute=? WHERE Name=?',
+            (attr_value, node_name))
+
+    def reassign_nodes(self, new_values):
+        """ Reassign file of several nodes
+
+        File ids are resolved with one query per SQL_PARAMETER_LIMIT new
+        paths, instance counts of touched files are recomputed and orphan
+        files removed with single statements.
+
+        :param new_values: dict of node name and new attribute value
+        :return: ids of touched files
+        """
+        changes = []
+        for node_name, new_attribute_value in new_values.iteritems():
+            file_path = self.get_attribute_absolute_file_path(
+                node_name, new_attribute_value)
+            changes.append((
+                node_name, new_attribute_value, file_path,
+                convert_to_key_path(file_path)))
+
+        # resolve file ids of new paths
+        c = self.db.cursor()
+        file_ids = dict()
+        for chunk in iter_chunks(set([change[3] for change in changes])):
+            c.execute(
+                'SELECT KeyPath, FileId FROM FilesTable WHERE '
+                + sql_in('KeyPath', chunk), chunk)
+            file_ids.update(c.fetchall())
+
+        new_files = dict()
+        for node_name, attr_value, file_path, key_path in changes:
+            if key_path not in file_ids:
+                new_files[key_path] = file_path
+        if new_files:
+            c.execute('SELECT COALESCE(MAX(FileId), 0) FROM FilesTable')
+            next_id = c.fetchone()[0] + 1
+            file_data = self.get_file_data(new_files.values())
+            file_rows = []
+            for file_id, (key_path, file_path) in enumerate(
+                    new_files.iteritems(), next_id):
+                file_ids[key_path] = file_id
+                file_rows.append((
+                    file_id, key_path, file_path, file_data[file_path][0], 0,
+                    get_dir_path(file_path)) + file_data[file_path][1:])
+                self.add_file_watch(file_path)
+            c.executemany(FILE_INSERT_QUERY, file_rows)
+
+        # reassign nodes then recount touched files
+        old_file_ids = set()
+        for chunk in iter_chunks(new_values):
+            c.execute(
+                'SELECT FileId FROM NodesTable WHERE ' + sql_in('Name', chunk),
+                chunk)
+            old_file_ids.update([data[0] for data in c.fetchall()])
+        c.executemany(
+            'UPDATE NodesTable SET Attribute=?, FileId=? WHERE Name=?',
+            [(attr_value, file_ids[key_path], node_name)
+             for node_name, attr_value, file_path, key_path in changes])
+
+        touched_file_ids = old_file_ids.union(
+            [file_ids[change[3]] for change in changes])
+        touched_file_ids.discard(None)
+        self.update_instance_counts(touched_file_ids)
+
+        # refresh states of remaining files
+        files = []
+        for chunk in iter_chunks(touched_file_ids):
+            c.execute(
+                'SELECT FileId, FilePath, State, TileCount, MissingTiles '
+                'FROM FilesTable WHERE ' + sql_in('FileId', chunk), chunk)
+            files.extend(c.fetchall())
+        file_data = self.get_file_data([data[1] for data in files])
+        c.executemany(
+            'UPDATE FilesTable SET State=?, TileCount=?, MissingTiles=? '
+            'WHERE FileId=?',
+            [file_data[data[1]] + (data[0], )
+             for data in files if file_data[data[1]] != data[2:]])
+
+        self.commit()
+
+        return touched_file_ids
+
+    def update_instance_counts(self, file_ids):
+        """ Recount instances of file_ids and remove unused files """
+        c = self.db.cursor()
+        c.executemany(
+            'UPDATE FilesTable SET InstanceCount='
+            '(SELECT COUNT(*) FROM NodesTable WHERE FileId=?) '
+            'WHERE FileId=?',
+            [(file_id, file_id) for file_id in file_ids])
+        c.executemany(
+            'DELETE FROM FilesTable WHERE FileId=? AND InstanceCount=0',
+            [(file_id, ) for file_id in file_ids])
+
+    def update_file_states(self, files):
+        """ Probe states of files again and store them
+
+        :param files: dict of key path and file path
+        """
+        for file_path in files.itervalues():
+            self.file_states.invalidate(file_path)
+            if self.tiles.get_pattern(file_path) is not None:
+                for tile_path in self.tiles.get_tiles(file_path)[0]:
+                    self.file_states.invalidate(tile_path)
+
+        file_data = self.get_file_data(files.values())
+        self.db.cursor().executemany(
+            'UPDATE FilesTable SET State=?, TileCount=?, MissingTiles=? '
+            'WHERE KeyPath=?',
+            [file_data[file_path] + (key_path, )
+             for key_path, file_path in files.iteritems()])
+        self.commit()
+
+    def get_image_files(self, key_paths=None, missing_only=False,
+                        file_ids=None):
+        """ Return dict of file path and files holding its pixels
+
+        Files of a pattern are its tiles.
+
+        :param key_paths: (iterable) key paths of files, all files if None
+        :param missing_only: (bool) only existing files never read
+        :param file_ids: (iterable) ids of files, used if key_paths is None
+        """
+        c = self.db.cursor()
+        where = 'WHERE FilePath!="."'
+        if missing_only:
+            where += ' AND FileMTime IS NULL AND State!=-1'
+        if key_paths is None and file_ids is None:
+            c.execute('SELECT FilePath FROM FilesTable ' + where)
+            file_paths = [data[0] for data in c.fetchall()]
+        else:
+            column, values = ('KeyPath', key_paths) if key_paths is not None \
+                else ('FileId', file_ids)
+            file_paths = []
+            for chunk in iter_chunks(values):
+                c.execute(
+                    'SELECT FilePath FROM FilesTable %s AND %s'
+                    % (where, sql_in(column, chunk)), chunk)
+                file_paths.extend([data[0] for data in c.fetchall()])
+
+        image_files = dict()
+        for file_path in file_paths:
+            if self.tiles.get_pattern(file_path) is None:
+                image_files[file_path] = [file_path]
+            else:
+                image_files[file_path] = self.tiles.get_tiles(file_path)[0]
+
+        return image_files
+
+    def update_image_infos(self, entries):
+        """ Store image header metadata
+
+        :param entries: dict of file path and (size, mtime, image info),
+                        entry is None for missing files
+        :return: key paths of updated files
+        """
+        values = []
+        for file_path, entry in entries.iteritems():
+            size, mtime, info = entry or (None, None, None)
+            values.append(
+                tuple(info or (None, ) * 5) +
+                (size, mtime, convert_to_key_path(file_path)))
+        self.db.cursor().executemany(
+            'UPDATE FilesTable SET Width=?, Height=?, Channels=?, BitDepth=?, '
+            'Format=?, FileSize=?, FileMTime=? WHERE KeyPath=?', values)
+        self.commit()
+
+        return [data[-1] for data in values]
+
+    def get_hash_files(self):
+        """ Return paths of existing files compared by content
+
+        Patterns are left out, their tiles are separate files.
+        """
+        c = self.db.cursor()
+        c.execute(
+            'SELECT FilePath FROM FilesTable WHERE State!=-1 AND FilePath!="."')
+
+        return [data[0] for data in c.fetchall()
+                if self.tiles.get_pattern(data[0]) is None]
+
+    def update_content_hashes(self, digests):
+        """ Store content digests and recount duplicates
+
+        :param digests: dict of file path and digest, None for files with
+                        unique content
+        :return: ids of files whose digest or duplicate count changed
+        """
+        c = self.db.cursor()
+        key_paths = dict([(convert_to_key_path(file_path), digest)
+                          for file_path, digest in digests.iteritems()])
+        changed_files = dict()
+        for chunk in iter_chunks(key_paths):
+            c.execute(
+                'SELECT FileId, KeyPath, ContentHash FROM FilesTable WHERE '
+                + sql_in('KeyPath', chunk), chunk)
+            for file_id, key_path, content_hash in c.fetchall():
+                if content_hash != key_paths[key_path]:
+                    changed_files[file_id] = (key_paths[key_path], content_hash)
+        c.executemany(
+            'UPDATE FilesTable SET ContentHash=?, DuplicateCount=NULL '
+            'WHERE FileId=?',
+            [(digest, file_id)
+             for file_id, (digest, _) in changed_files.iteritems()])
+
+        # files sharing given digests or old digests of changed files are
+        # recounted, a run also fixes counts left by removed duplicates
+        content_hashes = set(key_paths.itervalues())
+        content_hashes.update(
+            [content_hash for _, content_hash in changed_files.itervalues()])
+        content_hashes.discard(None)
+        file_ids = set(changed_files)
+        for chunk in iter_chunks(content_hashes):
+            where = 'WHERE ' + sql_in('ContentHash', chunk)
+            c.execute(
+                'SELECT FileId, DuplicateCount FROM FilesTable ' + where, chunk)
+            counts = dict(c.fetchall())
+            c.execute(
+                'UPDATE FilesTable SET DuplicateCount='
+                '(SELECT COUNT(*) - 1 FROM FilesTable AS D '
+                'WHERE D.ContentHash=FilesTable.ContentHash) ' + where, chunk)
+            c.execute(
+                'SELECT FileId, DuplicateCount FROM FilesTable ' + where, chunk)
+            file_ids.update([file_id for file_id, count in c.fetchall()
+                             if counts.get(file_id) != count])
+        self.commit()
+
+        return list(file_ids)
+
+    # -------------------------------------------------------------------------
+    # queries
+    def get_rows(self, where='', parameters=()):
+        """ Return ROW_QUERY results of nodes matching where clause """
+        c = self.db.cursor()
+        c.execute(ROW_QUERY + where, parameters)
+
+        return c.fetchall()
+
+    def get_row_count(self, where='', parameters=()):
+        """ Return count of nodes matching where clause of ROW_QUERY """
+        c = self.db.cursor()
+        c.execute('SELECT COUNT(N.Name) ' + ROW_TABLES + where, parameters)
+
+        return c.fetchone()[0]
+
+    def get_row_names(self, where='', parameters=()):
+        """ Return names of nodes matching where clause of ROW_QUERY """
+        c = self.db.cursor()
+        c.execute('SELECT N.Name ' + ROW_TABLES + where, parameters)
+
+        return [data[0] for data in c.fetchall()]
+
+    def get_name_filter(self, table_name, node_names):
+        """ Return SQL condition keeping nodes of node_names
+
+        Names are stored in a temporary table so the condition has no bound
+        parameter whatever the name count. Table is filled again only when
+        node_names changed.
+
+        :param table_name: (string) temporary table name
+        :param node_names: names of kept nodes
+        """
+        node_names = frozenset(node_names)
+        if self.name_filters.get(table_name) != node_names:
+            c = self.db.cursor()
+            c.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS %s(Name TEXT PRIMARY KEY)'
+                % table_name)
+            c.execute('DELETE FROM temp.%s' % table_name)
+            c.executemany(
+                'INSERT INTO temp.%s VALUES (?)' % table_name,
+                [(node_name, ) for node_name in node_names])
+            self.commit()
+            self.name_filters[table_name] = node_names
+
+        return 'N.Name IN (SELECT Name FROM temp.%s)' % table_name
+
+    def get_existing_nodes(self, node_names):
+        """ Return set of node_names found in database """
+        c = self.db.cursor()
+        existing_nodes = set()
+        for chunk in iter_chunks(node_names):
+            c.execute(
+                'SELECT Name FROM NodesTable WHERE ' + sql_in('Name', chunk),
+                chunk)
+            existing_nodes.update([data[0] for data in c.fetchall()])
+
+        return existing_nodes
+
+    def get_node(self, node_name):
+        """ Return ROW_QUERY result of node_name, None if not found """
+        rows = self.get_rows('WHERE Name=?', (node_name, ))
+
+        return rows[0] if rows else None
+
+    def get_file_nodes(self, file_path):
+        """ Return names of nodes using file_path """
+        c = self.db.cursor()
+        c.execute(
+            'SELECT Name FROM NodesTable LEFT JOIN FilesTable USING(FileId) '
+            'WHERE KeyPath=?', (convert_to_key_path(file_path), ))
+
+        return [data[0] for data in c.fetchall()]
+
+    def get_key_paths_nodes(self, key_paths):
+        """ Return (name, attribute value) of nodes using key_paths """
+        c = self.db.cursor()
+        nodes = []
+        for chunk in iter_chunks(key_paths):
+            c.execute(
+                'SELECT Name, Attribute '
+                'FROM NodesTable LEFT JOIN FilesTable USING(FileId) '
+                'WHERE ' + sql_in('KeyPath', chunk), chunk)
+            nodes.extend(c.fetchall())
+
+        return nodes
+
+    def get_file_ids(self, key_paths):
+        """ Return ids of files stored with key_paths """
+        c = self.db.cursor()
+        file_ids = []
+        for chunk in iter_chunks(key_paths):
+            c.execute(
+                'SELECT FileId FROM FilesTable WHERE ' + sql_in('KeyPath', chunk),
+                chunk)
+            file_ids.extend([data[0] for data in c.fetchall()])
+
+        return file_ids
+
+    def get_content_files(self, content_hash):
+        """ Return paths of files with content_hash digest """
+        c = self.db.cursor()
+        c.execute('SELECT FilePath FROM FilesTable WHERE ContentHash=?',
+                  (content_hash, ))
+
+        return [data[0] for data in c.fetchall()]
+
+    def get_file_content_hashes(self):
+        """ Return dict of file path and stored content digest """
+        c = self.db.cursor()
+        c.execute('SELECT FilePath, ContentHash FROM FilesTable '
+                  'WHERE ContentHash IS NOT NULL')
+
+        return dict(c.fetchall())
+
+    def get_directory_files(self, dir_path):
+        """ Return (file path, state) of files stored in dir_path """
+        c = self.db.cursor()
+        c.execute('SELECT FilePath, State FROM FilesTable WHERE DirPath=?',
+                  (os.path.normpath(dir_path), ))
+
+        return c.fetchall()
+
+    def get_files_by_state(self, file_state):
+        """ Return paths of files with file_state
+
+        :param file_state: 1 writable, 0 read-only, -1 missing
+        """
+        c = self.db.cursor()
+        c.execute(
+            'SELECT FilePath FROM FilesTable WHERE State=? AND FilePath!="."',
+            (file_state, ))
+
+        return [data[0] for data in c.fetchall()]
+
+    def get_missing_file_nodes(self):
+        """ Return dict of missing file path and names of nodes using it
+
+        Referenced nodes are left out, their file cannot be changed.
+        """
+        c = self.db.cursor()
+        c.execute(
+            'SELECT FilePath, Name '
+            'FROM NodesTable LEFT JOIN FilesTable USING(FileId) '
+            'WHERE State=-1 AND FilePath!="." AND IsRef=0')
+        file_nodes = dict()
+        for file_path, node_name in c.fetchall():
+            file_nodes.setdefault(file_path, []).append(node_name)
+
+        return file_nodes
+
+    def get_content_cursor(self):
+        """ Return cursor on report rows, file path is the last column """
+        c = self.db.cursor()
+        c.execute(
+            'SELECT Name, Type, IsRef, State, InstanceCount, FilePath '
+            'FROM NodesTable as N '
+            'LEFT JOIN FilesTable as F ON N.FileId=F.FileId '
+            'LEFT JOIN RefTable as R ON N.RefName=R.RefName')
+
+        return c
+
+    def get_node_count(self):
+        """ Return node count """
+        c = self.db.cursor()
+        c.execute('SELECT COUNT(Name) FROM NodesTable')
+
+        return c.fetchone()[0]
+
+    def get_file_count(self):
+        """ Return file count """
+        c = self.db.cursor()
+        c.execute('SELECT COUNT(FileId) FROM FilesTable WHERE FilePath!="."')
+
+        return c.fetchone()[0]
+
+    def get_all_nodes_name(self):
+        """ Return all textures node name """
+        c = self.db.cursor()
+        c.execute('SELECT Name FROM NodesTable')
+
+        return c.fetchall()
+
+    def get_file_instance_count(self, file_path):
+        c = self.db.cursor()
+        c.execute('SELECT COUNT(*) FROM FilesTable WHERE KeyPath=?',
+                  (convert_to_key_path(file_path), ))
+        return c.fetchone()[0]
+
+    # -------------------------------------------------------------------------
+    # path resolution
+    def get_reference_info(self, node_name):
+        """ Return reference info
+
+        - is new entry
+        - reference node
+        - project path
+        - sourceimage path
+
+        :param node_name:
+        """
+        is_new = False
+        ref_name = self.cmds.referenceQuery(node_name, referenceNode=True)
+
+        # try to get already existing data
+        data = self.reference_roots.get(ref_name)
+        if data is None:
+            c = self.db.cursor()
+            c.execute(
+                'SELECT RefPath, RefSourceImage FROM RefTable WHERE RefName=?',
+                (ref_name, ))
+            data = c.fetchone()
+
+        # check if entry already exists
+        if data is None:
+            is_new = True
+            data = self.get_reference_paths(ref_name)
+        self.reference_roots[ref_name] = data
+        root_path, sourceimages_folder = data
+
+        return is_new, ref_name, root_path, sourceimages_folder
+
+    def get_reference_nodes_map(self, referenced_nodes):
+        """ Return a dict of referenced node name and its reference node
+
+        Reference content is queried once per reference node instead of
+        once per texture node.
+
+        :param referenced_nodes: (set) referenced texture nodes
+        """
+        cmds = self.cmds
+        node_references = dict()
+        if not referenced_nodes:
+            return node_references
+
+        for ref_name in cmds.ls(type='reference') or []:
+            if ref_name in ('sharedReferenceNode', '_UNKNOWN_REF_NODE_'):
+                continue
+            try:
+                ref_nodes = cmds.referenceQuery(ref_name, nodes=True) or []
+            except RuntimeError:
+                continue
+            for node in referenced_nodes.intersection(ref_nodes):
+                node_references[node] = ref_name
+
+        # fallback for nodes not found in reference content
+        for node in referenced_nodes.difference(node_references):
+            node_references[node] = cmds.referenceQuery(
+                node, referenceNode=True)
+
+        return node_references
+
+    def get_reference_paths(self, ref_name):
+        """ Return project path and sourceimage folder of reference node
+
+        :param ref_name: reference node name
+        """
+        sourceimages_folder = 'sourceimages'
+
+        # find workspace.mel in parent folder
+        root_path = self.cmds.referenceQuery(ref_name, filename=True)
+        for i in range(len(root_path.split('/'))):
+            root_path = os.path.dirname(root_path)
+            if os.path.isfile(os.path.join(root_path, 'workspace.mel')):
+
+                # read sourceImages key
+                with open(os.path.join(root_path, 'workspace.mel')) as f:
+                    content = f.read()
+
+                m = re.search(r'"sourceImages" "([a-zA-z0-9 \\/]+)', content)
+                if m is not None:
+                    sourceimages_folder = m.group(1)
+                break
+
+        return root_path, sourceimages_folder
+
+    def get_attribute_absolute_file_path(self, node_name, attr_value):
+        """ Return absolute file path """
+        if attr_value is None:
+            return ''
+
+        if self.resolver.is_absolute(attr_value):
+            return os.path.normpath(attr_value)
+
+        if self.cmds.referenceQuery(node_name, isNodeReferenced=True):
+            is_new, ref_name, root_path, sourceimage_dir = \
+                self.get_reference_info(node_name)
+        else:
+            root_path, sourceimage_dir = self.get_root_paths()
+
+        return self.resolver.resolve(attr_value, root_path, sourceimage_dir)
+
+    def get_nicename_and_attribute_name(self, node_type):
+        for nType, tNiceName, nAttr in self.supported_types:
+            if nType == node_type:
+                type_nicename = tNiceName
+                if tNiceName is '' or tNiceName is None:
+                    type_nicename = node_type
+                return type_nicename, nAttr
+        return 'XXX', 'fileTextureName'
+
+    def get_root_paths(self):
+        """ Return project path and sourceimage folder of current scene """
+        data = self.reference_roots.get('ROOT')
+        if data is None:
+            c = self.db.cursor()
+            c.execute(
+                'SELECT RefPath, RefSourceImage '
+                'FROM RefTable '
+                'WHERE RefName="ROOT"')
+            data = self.reference_roots['ROOT'] = c.fetchone()
+
+        return data
+
+    def get_project_folders(self):
+        """ Return sourceimages folders of scene and referenced projects """
+        c = self.db.cursor()
+        c.execute('SELECT RefPath, RefSourceImage FROM RefTable')
+        folders = []
+        for root_path, sourceimages_folder in c.fetchall():
+            if not root_path:
+                continue
+            folder = os.path.normpath(
+                os.path.join(root_path, sourceimages_folder or ''))
+            if folder not in folders:
+                folders.append(folder)
+
+        return folders
+
+    def get_sourceimages_path(self):
+        """ Return source image folder full path """
+        path, sourceimage = self.get_root_paths()
+        sourceimage_folder = os.path.join(path, sourceimage)
+
+        if os.path.isdir(sourceimage_folder):
+            return sourceimage_folder
+        else:
+            return self.cmds.workspace(query=True, rootDirectory=True)
@@ -5,8 +5,7 @@ import os
 import stat
 # PySide import
 from PySide.QtGui import *
-from PySide.QtCore import (
-    Qt, QSize, QRegExp, QPoint, QRect, QModelIndex, QFileSystemWatcher)
+from PySide.QtCore import Qt, QSize, QRegExp, QPoint, QRect, QModelIndex
 # Maya import
 import __main__
 from maya import mel, cmds, OpenMaya as om
@@ -24,7 +23,7 @@ from mttConfig import (
     DEFAULT_VALUES, VIEW_COLUMN_SIZE, VIEW_COLUMN_CONTEXT,
     TAG, NODE_NAME, NODE_FILE, COLUMN_COUNT, PROMPT_INSTANCE_SESSION, THEMES,
     PROMPT_INSTANCE_WAIT_DURATION, PROMPT_INSTANCE_STATE, PROMPT_INSTANCE_ALWAYS,
-    PROMPT_INSTANCE_WAIT
+    PROMPT_INSTANCE_WAIT, IMAGE_COLUMNS, FILE_CONTENT
 )
 from mttCmd import (
     convert_to_relative_path, get_source_file,
@@ -33,8 +32,10 @@ from mttCmd import (
 from mttCmdUi import get_maya_window
 from mttCustomWidget import RightPushButton, MessageBoxWithCheckbox
 from mttDecorators import wait_cursor
+from mttEventQueue import MTTNodeEventQueue
 from mttSettingsMenu import MTTSettingsMenu
 from mttViewStatusLine import MTTStatusLine
+from mttWatcher import MTTWatchManager
 # avoid inspection error
 from mttSourceControlTemplate import checkout, submit, revert
 
@@ -87,6 +88,9 @@ class MTTView(QMainWindow):
         self.add_node_callback_id = 0
         self.remove_node_callback_id = 0
         self.attribute_callback_id = dict()
+        self.node_events = MTTNodeEventQueue(
+            self.on_flush_node_events,
+            delay=MTTSettings.value('nodeEventDelay'), parent=self)
 
         # UI variables
         self.viewer_dock = None
@@ -118,7 +122,15 @@ class MTTView(QMainWindow):
         cmds.optionVar(stringValue=('filtered_instances', ''))
 
         # main UI variables
-        self.file_watcher = QFileSystemWatcher()
+        polling = {
+            'interval': MTTSettings.value('pollInterval'),
+            'max_interval': MTTSettings.value('pollMaxInterval'),
+            'cpu_budget': MTTSettings.value('pollCpuBudget') / 100.0}
+        self.file_watcher = MTTWatchManager(
+            file_limit=MTTSettings.value('fileWatchLimit'),
+            use_inotify=MTTSettings.value('nativeFileWatch'),
+            polling=polling if MTTSettings.value('pollingFileWatch') else None,
+            overflow_polling=polling, parent=self)
         self.model = mttModel.MTTModel(watcher=self.file_watcher)
         self.delegate = mttDelegate.MTTDelegate()
         self.proxy = mttProxy.MTTProxy()
@@ -254,6 +266,7 @@ class MTTView(QMainWindow):
         self.table_view.setItemDelegate(self.delegate)
         self.model.set_table_view(self.table_view)
         self.proxy.setSourceModel(self.model)
+        self.model.set_filter_proxy(self.proxy)
 
         self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table_view.setShowGrid(False)
@@ -363,24 +376,18 @@ class MTTView(QMainWindow):
 
     # --------------------------------------------------------------------------
     # UI LOGIC
-    def _layout_changed(self):
-        cmds.optionVar(stringValue=('filtered_instances', ''))
-        self.model.layoutChanged.emit()
-        self.__update_node_file_count_ui()
-
     def _update_workspace(self):
         workspace_root = os.path.normpath(cmds.workspace(q=True, rd=True))
         self.delegate.ws_path = workspace_root
 
     def on_pin_toggle(self, state):
-        self.model.layoutAboutToBeChanged.emit()
-
         nodes = '' if not state else ';'.join(
             [node.data() for node in self.get_selected_table_nodes()])
 
         MTTSettings.set_value('pinnedNode', nodes)
 
-        self._layout_changed()
+        self.model.refresh_layout()
+        self.__update_node_file_count_ui()
 
     def on_filter_set_text(self, text=''):
         """ Set text in filter field """
@@ -401,6 +408,8 @@ class MTTView(QMainWindow):
         else:
             search = QRegExp(text, Qt.CaseInsensitive, QRegExp.Wildcard)
         self.proxy.setFilterRegExp(search)
+        if self.model.is_virtual:
+            self.model.refresh_layout()
         self.__update_node_file_count_ui()
 
     def on_filter_quick_filter_menu(self, point):
@@ -460,6 +469,8 @@ class MTTView(QMainWindow):
             self.proxy.setFilterKeyColumn(NODE_NAME)
         elif index == 1:
             self.proxy.setFilterKeyColumn(NODE_FILE)
+        if self.model.is_virtual:
+            self.model.refresh_layout()
 
     def on_column_header_context_menu(self, point):
         """ Create context menu for header visibility """
@@ -575,16 +586,23 @@ class MTTView(QMainWindow):
         state = not MTTSettings.value('columnVisibility_%s' % column_id, True)
         self.table_view.setColumnHidden(column_id, not state)
         MTTSettings.set_value('columnVisibility_%s' % column_id, state)
+        if state and column_id in IMAGE_COLUMNS:
+            self.model.request_image_infos()
+        elif state and column_id == FILE_CONTENT:
+            self.model.request_content_hashes()
 
     @wait_cursor
     def on_reload_files(self, all_node=False):
         """ Reload selected files """
-        nodes = self.get_all_table_nodes() if all_node else self.get_selected_table_nodes()
+        if all_node:
+            nodes = self.get_all_table_nodes()
+        else:
+            nodes = [data.data() for data in self.get_selected_table_nodes()]
         if nodes:
             reloaded_files = []
             reloaded_files_count = 0
             self.model.is_reloading_file = True
-            for node in [data.data() for data in nodes]:
+            for node in nodes:
                 node_attr_name = self.supported_format_dict[cmds.nodeType(node)]
                 node_attr_value = cmds.getAttr('%s.%s' % (node, node_attr_name))
                 if node_attr_value not in reloaded_files:
@@ -616,10 +634,13 @@ class MTTView(QMainWindow):
 
     @wait_cursor
     def on_rename_nodes(self, all_node=False):
-        nodes = self.get_all_table_nodes() if all_node else self.get_selected_table_nodes()
+        if all_node:
+            nodes = self.get_all_table_nodes()
+        else:
+            nodes = [mID.data() for mID in self.get_selected_table_nodes()]
         if nodes:
             rename_count = 0
-            for nodeName in [mID.data() for mID in nodes]:
+            for nodeName in nodes:
                 wanted_name = self.model.get_node_file_basename(nodeName)
                 if len(wanted_name):
                     new_name = self.model.rename_maya_node(nodeName, wanted_name)
@@ -896,21 +917,20 @@ class MTTView(QMainWindow):
             cmds.select(clear=True)
 
     def on_select_objects_with_textures(self):
-        nodes = []
+        nodes = set()
         objects = []
 
-        tmp_nodes = self.get_selected_table_nodes()
-        for tmpNode in tmp_nodes:
+        for tmpNode in self.get_selected_table_nodes():
             node_name = tmpNode.data()
+            if node_name in nodes:
+                continue
             if self.model.get_node_instance_count(node_name) > 1:
-                for iNode in self.model.get_node_instances_model_id(node_name):
-                    if iNode not in nodes:
-                        nodes.append(iNode)
+                nodes.update(self.model.get_node_instances(node_name))
             else:
-                nodes.append(tmpNode)
+                nodes.add(node_name)
 
         if nodes:
-            shading_groups = self.get_shading_group([node.data() for node in nodes])
+            shading_groups = self.get_shading_group(list(nodes))
             if shading_groups:
                 objects = cmds.sets(shading_groups, query=True)
 
@@ -922,38 +942,33 @@ class MTTView(QMainWindow):
     @wait_cursor
     def on_convert_to_relative_path(self):
         nodes = self.get_selected_table_nodes(is_instance_aware=True)
-        self.model.suspend_force_sort = True
         self.is_batching_change_attr = True
+        with self.model.batch():
+            for node in nodes:
+                node_name = node.data()
+                if node_name:
+                    if not cmds.lockNode(node_name, query=True, lock=True)[0]:
+                        node_attr_value = self.model.get_node_attribute(node_name)
+                        relative_path = convert_to_relative_path(node_attr_value)
+                        self.model.set_database_node_and_attribute(node_name, relative_path)
 
-        for node in nodes:
-            node_name = node.data()
-            if node_name:
-                if not cmds.lockNode(node_name, query=True, lock=True)[0]:
-                    node_attr_value = self.model.get_node_attribute(node_name)
-                    relative_path = convert_to_relative_path(node_attr_value)
-                    self.model.set_database_node_and_attribute(node_name, relative_path)
-
-        self.model.suspend_force_sort = False
         self.is_batching_change_attr = False
-        self.model.request_sort()
 
     @wait_cursor
     def on_convert_to_absolute_path(self):
         nodes = self.get_selected_table_nodes(is_instance_aware=True)
-        self.model.suspend_force_sort = True
         self.is_batching_change_attr = True
-        if nodes:
-            for node in nodes:
-                node_name = node.data()
-                if node_name:
-                    if not cmds.lockNode(node_name, query=True, lock=True)[0]:
-                        node_attr_value = self.model.get_node_attribute(node_name)
-                        absolute_path = self.model.get_node_file_fullpath(node_name)
-                        if absolute_path != node_attr_value:
-                            self.model.set_database_node_and_attribute(node_name, absolute_path)
-        self.model.suspend_force_sort = False
+        with self.model.batch():
+            if nodes:
+                for node in nodes:
+                    node_name = node.data()
+                    if node_name:
+                        if not cmds.lockNode(node_name, query=True, lock=True)[0]:
+                            node_attr_value = self.model.get_node_attribute(node_name)
+                            absolute_path = self.model.get_node_file_fullpath(node_name)
+                            if absolute_path != node_attr_value:
+                                self.model.set_database_node_and_attribute(node_name, absolute_path)
         self.is_batching_change_attr = False
-        self.model.request_sort()
 
     @wait_cursor
     def on_set_custom_path(self):
@@ -967,127 +982,122 @@ class MTTView(QMainWindow):
 
             if custom_path:
                 nodes = self.get_selected_table_nodes(is_instance_aware=True)
-                self.model.suspend_force_sort = True
                 self.is_batching_change_attr = True
-                if nodes:
-                    for node in nodes:
-                        node_name = node.data()
-                        if node_name:
-                            if not cmds.lockNode(node_name, query=True, lock=True)[0]:
-                                node_attr_name = self.supported_format_dict[cmds.nodeType(node_name)]
-                                node_attr_value = self.model.get_node_attribute(node_name)
-                                new_path = os.path.normpath(os.path.join(custom_path[0], os.path.basename(node_attr_value)))
-                                new_path = new_path.replace('\\', '/')
-                                set_attr(node_name, node_attr_name, new_path, type="string")
-                self.model.suspend_force_sort = False
+                with self.model.batch():
+                    if nodes:
+                        for node in nodes:
+                            node_name = node.data()
+                            if node_name:
+                                if not cmds.lockNode(node_name, query=True, lock=True)[0]:
+                                    node_attr_name = self.supported_format_dict[cmds.nodeType(node_name)]
+                                    node_attr_value = self.model.get_node_attribute(node_name)
+                                    new_path = os.path.normpath(os.path.join(custom_path[0], os.path.basename(node_attr_value)))
+                                    new_path = new_path.replace('\\', '/')
+                                    set_attr(node_name, node_attr_name, new_path, type="string")
                 self.is_batching_change_attr = False
-                self.model.request_sort()
 
     @wait_cursor
     def on_copy_files_to_workspace(self):
-        self.model.suspend_force_sort = True
-        self.is_batching_change_attr = True
         nodes = self.get_selected_table_nodes(is_instance_aware=True)
-        if nodes:
-            file_history = dict()
-            sourceimages_path = self.model.get_sourceimages_path()
-            for node in nodes:
-                node_name = node.data()
-                if not node_name:
-                    continue
-                if not cmds.lockNode(node_name, query=True, lock=True)[0]:
-                    file_fullpath = self.model.get_node_file_fullpath(node_name)
-
-                    node_attr_name = self.supported_format_dict[cmds.nodeType(node_name)]
-                    if file_fullpath not in file_history.iterkeys():
+        self.is_batching_change_attr = True
+        with self.model.batch():
+            if nodes:
+                file_history = dict()
+                sourceimages_path = self.model.get_sourceimages_path()
+                for node in nodes:
+                    node_name = node.data()
+                    if not node_name:
+                        continue
+                    if not cmds.lockNode(node_name, query=True, lock=True)[0]:
+                        file_fullpath = self.model.get_node_file_fullpath(node_name)
 
-                        if not os.path.isfile(file_fullpath) or os.path.commonprefix([sourceimages_path, file_fullpath]) == sourceimages_path:
-                            continue
+                        node_attr_name = self.supported_format_dict[cmds.nodeType(node_name)]
+                        if file_fullpath not in file_history.iterkeys():
 
-                        destination_path = (os.path.join(sourceimages_path, os.path.basename(file_fullpath))).replace('\\', '/')
+                            if not os.path.isfile(file_fullpath) or os.path.commonprefix([sourceimages_path, file_fullpath]) == sourceimages_path:
+                                continue
 
-                        if destination_path == file_fullpath.replace('\\', '/'):
-                            file_history[file_fullpath] = None
-                            continue
-                        else:
-                            file_history[file_fullpath] = destination_path
+                            destination_path = (os.path.join(sourceimages_path, os.path.basename(file_fullpath))).replace('\\', '/')
 
-                        if os.path.isfile(destination_path):
-                            is_readonly = self.model.get_file_state(destination_path) < 1
-                            if not self.__prompt_for_override_file(os.path.basename(destination_path), is_readonly):
+                            if destination_path == file_fullpath.replace('\\', '/'):
+                                file_history[file_fullpath] = None
                                 continue
-                            if is_readonly:
-                                os.chmod(destination_path, stat.S_IWRITE)
+                            else:
+                                file_history[file_fullpath] = destination_path
+
+                            if os.path.isfile(destination_path):
+                                is_readonly = self.model.get_file_state(destination_path) < 1
+                                if not self.__prompt_for_override_file(os.path.basename(destination_path), is_readonly):
+                                    continue
+                                if is_readonly:
+                                    os.chmod(destination_path, stat.S_IWRITE)
 
-                        if cmds.sysFile(file_fullpath, copy=destination_path):
-                            mtt_log('%s copied.' % os.path.basename(destination_path), verbose=False)
-                            os.chmod(destination_path, stat.S_IWRITE)
-                            set_attr(node_name, node_attr_name, destination_path, attr_type="string")
+                            if cmds.sysFile(file_fullpath, copy=destination_path):
+                                mtt_log('%s copied.' % os.path.basename(destination_path), verbose=False)
+                                os.chmod(destination_path, stat.S_IWRITE)
+                                self.model.file_states.invalidate(os.path.normpath(destination_path))
+                                set_attr(node_name, node_attr_name, destination_path, attr_type="string")
+                            else:
+                                mtt_log('%s copy failed.' % os.path.basename(destination_path), msg_type='warning', verbose=False)
                         else:
-                            mtt_log('%s copy failed.' % os.path.basename(destination_path), msg_type='warning', verbose=False)
-                    else:
-                        if file_history[file_fullpath]:
-                            set_attr(node_name, node_attr_name, file_history[file_fullpath], attr_type="string")
+                            if file_history[file_fullpath]:
+                                set_attr(node_name, node_attr_name, file_history[file_fullpath], attr_type="string")
 
-        self.model.suspend_force_sort = False
         self.is_batching_change_attr = False
-        self.model.request_sort()
 
     def on_rename_file(self, custom_name=False):
-        self.model.suspend_force_sort = True
-        self.is_batching_change_attr = True
         nodes = self.get_selected_table_nodes(is_instance_aware=True)
-        if nodes:
-            file_history = dict()
-
-            for node in nodes:
-                node_name = node.data()
-                if node_name:
-                    if cmds.lockNode(node_name, query=True, lock=True)[0]:
-                        continue
-                    file_fullpath = self.model.get_node_file_fullpath(node_name)
-                    node_attr_name = self.supported_format_dict[cmds.nodeType(node_name)]
+        self.is_batching_change_attr = True
+        with self.model.batch():
+            if nodes:
+                file_history = dict()
 
-                    if file_fullpath not in file_history.iterkeys():
-                        if file_fullpath == '.' or not os.path.isfile(file_fullpath):
+                for node in nodes:
+                    node_name = node.data()
+                    if node_name:
+                        if cmds.lockNode(node_name, query=True, lock=True)[0]:
                             continue
+                        file_fullpath = self.model.get_node_file_fullpath(node_name)
+                        node_attr_name = self.supported_format_dict[cmds.nodeType(node_name)]
 
-                        file_path = os.path.dirname(file_fullpath)
-                        filename, file_ext = os.path.splitext(os.path.basename(file_fullpath))
+                        if file_fullpath not in file_history.iterkeys():
+                            if file_fullpath == '.' or not os.path.isfile(file_fullpath):
+                                continue
 
-                        if custom_name:
-                            new_path, ok = QInputDialog.getText(
-                                self,
-                                WINDOW_TITLE,
-                                'Enter new name for "%s" :' % filename,
-                                QLineEdit.Normal,
-                                filename)
+                            file_path = os.path.dirname(file_fullpath)
+                            filename, file_ext = os.path.splitext(os.path.basename(file_fullpath))
 
-                            filename = new_path
-                            new_path = os.path.join(file_path, '%s%s' % (new_path, file_ext))
-                        else:
-                            new_path = os.path.join(file_path, '%s%s' % (node_name.replace(':', '_'), file_ext))
+                            if custom_name:
+                                new_path, ok = QInputDialog.getText(
+                                    self,
+                                    WINDOW_TITLE,
+                                    'Enter new name for "%s" :' % filename,
+                                    QLineEdit.Normal,
+                                    filename)
 
-                        if node_name == filename and not custom_name:
-                            file_history[file_fullpath] = None
-                            continue
-                        else:
-                            file_history[file_fullpath] = new_path
+                                filename = new_path
+                                new_path = os.path.join(file_path, '%s%s' % (new_path, file_ext))
+                            else:
+                                new_path = os.path.join(file_path, '%s%s' % (node_name.replace(':', '_'), file_ext))
 
-                        if self.model.get_file_state(file_fullpath) == 1:
-                            if cmds.sysFile(file_fullpath, rename=new_path):
-                                set_attr(node_name, node_attr_name, new_path, attr_type="string")
+                            if node_name == filename and not custom_name:
+                                file_history[file_fullpath] = None
+                                continue
                             else:
-                                mtt_log('%s rename failed.' % filename, msg_type='warning', verbose=False)
+                                file_history[file_fullpath] = new_path
+
+                            if self.model.get_file_state(file_fullpath) == 1:
+                                if cmds.sysFile(file_fullpath, rename=new_path):
+                                    set_attr(node_name, node_attr_name, new_path, attr_type="string")
+                                else:
+                                    mtt_log('%s rename failed.' % filename, msg_type='warning', verbose=False)
+                            else:
+                                mtt_log('%s rename aborted (read-only).' % filename, msg_type='warning', verbose=False)
                         else:
-                            mtt_log('%s rename aborted (read-only).' % filename, msg_type='warning', verbose=False)
-                    else:
-                        if file_history[file_fullpath]:
-                            set_attr(node_name, node_attr_name, file_history[file_fullpath], attr_type="string")
+                            if file_history[file_fullpath]:
+                                set_attr(node_name, node_attr_name, file_history[file_fullpath], attr_type="string")
 
-            self.model.suspend_force_sort = False
-            self.is_batching_change_attr = False
-            self.model.request_sort()
+        self.is_batching_change_attr = False
 
     @wait_cursor
     def on_rename_file_with_node_name(self):
@@ -1146,6 +1156,7 @@ class MTTView(QMainWindow):
 
                 is_readonly = self.model.get_file_state(file_fullpath) < 1
                 os.chmod(file_fullpath, (stat.S_IWRITE if is_readonly else stat.S_IREAD))
+                self.model.file_states.invalidate(file_fullpath)
                 toggled_files.append(file_fullpath)
 
     # --------------------------------------------------------------------------
@@ -1345,46 +1356,48 @@ class MTTView(QMainWindow):
 
     def get_selected_table_nodes(self, is_instance_aware=False):
         nodes = []
-        nodes_name = []
-        is_already_prompted = False
-        collect_instance = False
+        nodes_name = set()
+        result = None
 
         for index in self.table_view.selectionModel().selectedRows(NODE_NAME):
             node_name = index.data()
 
-            if node_name not in nodes_name:
-                nodes_name.append(node_name)
-                nodes.append(index)
+            if node_name in nodes_name:
+                continue
+            nodes_name.add(node_name)
+            nodes.append(index)
 
             if is_instance_aware:
                 if self.model.get_node_instance_count(node_name) > 1:
-                    if collect_instance:
-                        result = 1
-                    else:
-                        if not is_already_prompted:
-                            result = self.__prompt_for_instance_propagation()
-                        is_already_prompted = True
+                    if result is None:
+                        result = self.__prompt_for_instance_propagation()
                     if result == -1:
                         return []
                     elif result == 1:
-                        collect_instance = True
-                        for instanceIndex in self.model.get_node_instances_model_id(node_name):
-                            instance_index_name = instanceIndex.data()
-                            if instance_index_name not in nodes_name:
-                                nodes_name.append(instance_index_name)
-                                nodes.append(instanceIndex)
+                        instances = self.model.get_node_instances(node_name)
+                        for instance_name in instances - nodes_name:
+                            model_id = self.model.get_node_model_id(
+                                instance_name)
+                            # virtual rows hide instances filtered out
+                            if model_id.isValid():
+                                nodes.append(model_id)
+                        nodes_name.update(instances)
 
         return nodes
 
     def get_all_table_nodes(self):
-        nodes = []
-        for rowId in xrange(self.proxy.rowCount()):
-            midx = self.proxy.index(rowId, 0, QModelIndex())
-            node = midx.data()
-            if cmds.objExists(node):
-                nodes.append(midx)
+        """ Return names of existing nodes shown in table
 
-        return nodes
+        Virtual rows are not all fetched, their names come from database.
+        """
+        if self.model.is_virtual:
+            node_names = self.model.get_filtered_node_names()
+        else:
+            node_names = [
+                self.proxy.index(rowId, 0, QModelIndex()).data()
+                for rowId in xrange(self.proxy.rowCount())]
+
+        return [node for node in node_names if cmds.objExists(node)]
 
     @staticmethod
     def get_filter_completion_words():
@@ -1439,12 +1452,11 @@ class MTTView(QMainWindow):
         if dep_node.typeName() in self.supported_format_dict:
             new_name = dep_node.name()
             if new_name != old_name:
-                self.model.rename_database_node(old_name, new_name)
                 if self.proxy.selected_texture_nodes is not None:
                     if old_name in self.proxy.selected_texture_nodes:
                         self.proxy.selected_texture_nodes.remove(old_name)
                     self.proxy.selected_texture_nodes.add(new_name)
-                self.model.request_sort()
+                self.node_events.rename(old_name, new_name)
                 self.attribute_callback_id[new_name] = self.attribute_callback_id.pop(old_name)
 
     def callback_add_node(self, node, clientData=None):
@@ -1452,24 +1464,42 @@ class MTTView(QMainWindow):
             return
         new_node_name = om.MFnDependencyNode(node).name()
         if cmds.nodeType(new_node_name) in self.supported_format_dict.iterkeys():
-            self.model.database_add_new_node(new_node_name)
-            self.model.request_sort()
+            self.node_events.add(new_node_name, om.MObjectHandle(node))
             self.create_attribute_callback(new_node_name)
-            self.__update_node_file_count_ui()
 
     def callback_remove_node(self, node, clientData=None):
         if cmds.optionVar(query='suspendCallbacks'):
             return
         dep_node = om.MFnDependencyNode(node)
         if dep_node.typeName() in self.supported_format_dict:
-            self.model.database_remove_node(dep_node.name())
-            self.model.request_sort()
+            self.node_events.remove(dep_node.name())
             self.remove_attribute_callback(dep_node.name())
-            self.__update_node_file_count_ui()
+
+    def on_flush_node_events(self, removed, renamed, added):
+        """ Apply coalesced node events to database and model """
+        start = time()
+
+        # added nodes may have been renamed without callback since
+        added_nodes = [
+            om.MFnDependencyNode(node_handle.object()).name()
+            for node_handle in added.itervalues()
+            if node_handle.isValid() and node_handle.isAlive()]
+
+        self.model.database_apply_node_changes(removed, renamed, added_nodes)
+        self.__update_node_file_count_ui()
+
+        stats = self.node_events.get_stats()
+        mtt_log(
+            '%d node events applied in %.3fs (%d received, %d merged)' % (
+                len(removed) + len(renamed) + len(added_nodes),
+                time() - start, stats['received'], stats['merged']),
+            add_tag='PERF', verbose=False)
 
     def callback_attribute_changed(self, node_msg, plug, otherPlug, clientData=None):
         if cmds.optionVar(query='suspendCallbacks'):
             return
+        # make sure node is known by database
+        self.node_events.flush()
         node, attr = plug.name().split('.')
         if node_msg & om.MNodeMessage.kAttributeSet:
             if attr == self.supported_format_dict[cmds.nodeType(node)]:
@@ -1478,27 +1508,25 @@ class MTTView(QMainWindow):
                 if not self.is_batching_change_attr and not self.model.is_reloading_file:
                     if self.model.get_node_instance_count(node) > 1:
                         if self.__prompt_for_instance_propagation(show_cancel_button=False) == 1:
-                            instance_nodes = self.model.get_node_instances_model_id(node)
-                            for instanceNode in instance_nodes:
-                                extra_node = instanceNode.data()
-                                if extra_node != node:
-                                    extra_nodes.append(extra_node)
+                            extra_nodes = list(
+                                self.model.get_node_instances(node) - {node})
 
                 if self.model.change_node_attribute(node, new_path):
                     is_auto_rename_activated = MTTSettings.value('autoRename')
                     if is_auto_rename_activated:
                         self.on_rename_node(node)
 
+                    cmds.optionVar(intValue=('suspendCallbacks', True))
                     for extra_node in extra_nodes:
-                        cmds.optionVar(intValue=('suspendCallbacks', True))
                         node_attr_name = self.supported_format_dict[cmds.nodeType(extra_node)]
                         set_attr(extra_node, node_attr_name, new_path, attr_type="string")
-                        if self.model.change_node_attribute(extra_node, new_path):
-                            if is_auto_rename_activated:
-                                self.on_rename_node(extra_node)
+                    changed_nodes = self.model.change_nodes_attribute(
+                        [(extra_node, new_path) for extra_node in extra_nodes])
+                    if is_auto_rename_activated:
+                        for extra_node in changed_nodes:
+                            self.on_rename_node(extra_node)
                     cmds.optionVar(intValue=('suspendCallbacks', False))
 
-                    self.model.request_sort()
                     self.__update_node_file_count_ui()
 
     def callback_selection_changed_recursive(self, shading_nodes, asset_node, do_future):
@@ -1565,6 +1593,7 @@ class MTTView(QMainWindow):
         self.__update_node_file_count_ui()
 
     def reset_mtt(self, clientData=None):
+        self.node_events.clear()
         cmds.optionVar(stringValue=('filtered_instances', ''))
         self.status_line_ui.pin_btn.setChecked(False)
         MTTSettings.remove('pinnedNode')
@@ -1664,6 +1693,7 @@ class MTTView(QMainWindow):
 
     def __remove_filewatch(self):
         self.model.file_watch_remove_all()
+        self.file_watcher.close()
 
     #-------------------------------------------------------------------------------------------------------------------
     # CLEAN EXIT
@@ -1719,12 +1749,16 @@ class MTTView(QMainWindow):
 
             # remove callbacks
             self.__remove_callbacks()
+            self.node_events.clear()
 
             # remove file watch
             self.__remove_filewatch()
 
             # delete memory database
             self.model.database_close()
+            self.model.file_states.close()
+            self.model.image_infos.close()
+            self.model.content_hashes.close()
 
         # clean widget
         self.deleteLater()
@@ -66,6 +66,7 @@ class MTTStatusLine(QHBoxLayout):
         # FILTER GROUP
         self.selection_btn.setChecked(MTTSettings.value('onlySelectionState'))
         self.writable_btn.setChecked(MTTSettings.value('onlyWritableState'))
+        self.duplicate_btn.setChecked(MTTSettings.value('onlyDuplicateState'))
         self.reference_btn.setChecked(MTTSettings.value('showReferenceState'))
         self.wrong_name_btn.setChecked(MTTSettings.value('showWrongNameState'))
         self.filter_instances_btn.setChecked(
@@ -117,6 +118,11 @@ class MTTStatusLine(QHBoxLayout):
             'Hide read-only textures',
             self.on_show_only_writable,
             True)
+        self.duplicate_btn = mttCmdUi.create_status_button(
+            ':/duplicateReference.png',
+            'Show only files with duplicate content',
+            self.on_show_only_duplicates,
+            True)
         self.reference_btn = mttCmdUi.create_status_button(
             ':/tb_onlyReference',
             'Hide references',
@@ -145,6 +151,7 @@ class MTTStatusLine(QHBoxLayout):
         self.filter_grp.add_button(self.selection_btn)
         self.filter_grp.add_button(self.reference_btn)
         self.filter_grp.add_button(self.writable_btn)
+        self.filter_grp.add_button(self.duplicate_btn)
         self.filter_grp.add_button(self.wrong_name_btn)
         self.filter_grp.add_button(self.filter_instances_btn)
 
@@ -307,12 +314,8 @@ class MTTStatusLine(QHBoxLayout):
             return self.custom_grp
 
     def _set_filter_value(self, key, value):
-        self.model.layoutAboutToBeChanged.emit()
-
         MTTSettings.set_value(key, value)
-        cmds.optionVar(stringValue=('filtered_instances', ''))
-
-        self.model.layoutChanged.emit()
+        self.model.refresh_layout()
         self.update_node_file_count()
 
     def on_show_only_selection(self):
@@ -326,6 +329,12 @@ class MTTStatusLine(QHBoxLayout):
         self._set_filter_value(
             'onlyWritableState', self.writable_btn.isChecked())
 
+    def on_show_only_duplicates(self):
+        """ Filter nodes whose file content is found in another file """
+        self._set_filter_value(
+            'onlyDuplicateState', self.duplicate_btn.isChecked())
+        self.model.request_content_hashes()
+
     def on_show_reference(self):
         """ Filter referenced nodes """
         self._set_filter_value(
@@ -428,7 +437,10 @@ class MTTStatusLine(QHBoxLayout):
         file_count = self.model.get_file_count()
         file_str = 'file{}'.format(['', 's'][file_count > 1])
 
-        node_shown_count = self.proxy.rowCount()
+        if self.model.is_virtual:
+            node_shown_count = self.model.get_filtered_node_count()
+        else:
+            node_shown_count = self.proxy.rowCount()
 
         node_count = self.model.get_node_count()
         node_str = 'node' if node_count < 1 else 'nodes'
@@ -440,6 +452,7 @@ class MTTStatusLine(QHBoxLayout):
         # buttons states
         MTTSettings.set_value('onlySelectionState', self.selection_btn.isChecked())
         MTTSettings.set_value('onlyWritableState', self.writable_btn.isChecked())
+        MTTSettings.set_value('onlyDuplicateState', self.duplicate_btn.isChecked())
         MTTSettings.set_value('showReferenceState', self.reference_btn.isChecked())
         MTTSettings.set_value('showWrongNameState', self.wrong_name_btn.isChecked())
         MTTSettings.remove('pinnedNode')
@@ -0,0 +1,464 @@
+# Python import
+import os
+import sys
+import select
+import struct
+import ctypes
+import ctypes.util
+from threading import Thread, Lock, Event
+from time import time
+# PySide import
+from PySide.QtCore import QObject, QFileSystemWatcher, Qt, Signal
+# Custom import
+from mttCmd import mtt_log
+from mttEventQueue import get_file_signature
+
+# optional faster directory listing for Python 2
+try:
+    from scandir import scandir
+except ImportError:
+    scandir = None
+
+
+# inotify constants from sys/inotify.h
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ONLYDIR = 0x01000000
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+# events of entries created, deleted or renamed in a directory
+ENTRY_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class MTTInotifyReader(object):
+    """ Linux inotify directory watches read in a background thread
+
+    callback is called from the reader thread with the directory path, the
+    name of the changed entry and the inotify event mask.
+    """
+
+    def __init__(self, callback):
+        """
+        :param callback: (callable) receive directory path, entry name and
+                         event mask
+        """
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init failed')
+
+        self.callback = callback
+        self.dir_watches = dict()
+        self.watch_dirs = dict()
+        self.is_running = True
+        self.thread = Thread(target=self._read_events)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add_watch(self, dir_path):
+        """ Watch dir_path entries, return False if watch failed """
+        if dir_path in self.dir_watches:
+            return True
+
+        encoded_path = dir_path
+        if isinstance(encoded_path, unicode):
+            encoded_path = encoded_path.encode(sys.getfilesystemencoding())
+        wd = self.libc.inotify_add_watch(self.fd, encoded_path, WATCH_MASK)
+        if wd < 0:
+            return False
+
+        self.dir_watches[dir_path] = wd
+        self.watch_dirs[wd] = dir_path
+        return True
+
+    def remove_all(self):
+        for wd in self.watch_dirs.keys():
+            self.libc.inotify_rm_watch(self.fd, wd)
+        self.dir_watches.clear()
+        self.watch_dirs.clear()
+
+    def close(self):
+        """ Stop reader thread and release inotify instance """
+        self.is_running = False
+        self.thread.join()
+        self.remove_all()
+        os.close(self.fd)
+
+    def _read_events(self):
+        while self.is_running:
+            if not select.select([self.fd], [], [], 0.5)[0]:
+                continue
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(
+                    data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip('\0')
+                offset += length
+
+                dir_path = self.watch_dirs.get(wd)
+                if dir_path is not None and name:
+                    self.callback(dir_path, name, mask)
+
+
+def scan_directory(dir_path, names):
+    """ Return (size, mtime) of names found in dir_path and all entry names
+
+    Directory is listed once, only wanted entries are stat.
+
+    :param dir_path: (string) directory path
+    :param names: (set) wanted entry names
+    :return: dict of name and signature, frozenset of entry names, empty
+             if dir_path cannot be listed
+    """
+    signatures = dict()
+    entry_names = []
+    try:
+        if scandir is not None:
+            for entry in scandir(dir_path):
+                entry_names.append(entry.name)
+                if entry.name in names:
+                    entry_stat = entry.stat()
+                    signatures[entry.name] = (
+                        entry_stat.st_size, entry_stat.st_mtime)
+        else:
+            entry_names = os.listdir(dir_path)
+            for name in names.intersection(entry_names):
+                signature = get_file_signature(os.path.join(dir_path, name))
+                if signature is not None:
+                    signatures[name] = signature
+    except OSError:
+        pass
+
+    return signatures, frozenset(entry_names)
+
+
+class MTTPollingReader(object):
+    """ Poll tracked files in a background thread
+
+    Directories are scanned in batches with a sleep after each batch to keep
+    scan time under cpu_budget of wall time. When a full pass finds no
+    change, the delay before the next pass doubles up to max_interval.
+    callback is called from the polling thread with the changed file path,
+    directory_callback with the path of a directory whose entries differ
+    from the previous pass.
+    """
+
+    def __init__(self, callback, directory_callback=None, interval=2,
+                 max_interval=30, cpu_budget=0.1, batch_size=64):
+        """
+        :param callback: (callable) receive changed file path
+        :param directory_callback: (callable) receive changed directory path
+        :param interval: (float) seconds between two passes after a change
+        :param max_interval: (float) maximum seconds between two passes
+        :param cpu_budget: (float) maximum ratio of time spent scanning
+        :param batch_size: (int) directories scanned between two sleeps
+        """
+        self.callback = callback
+        self.directory_callback = directory_callback
+        self.interval = interval
+        self.max_interval = max_interval
+        self.cpu_budget = min(max(cpu_budget, 0.01), 1.0)
+        self.batch_size = batch_size
+        self.current_interval = interval
+        self.pass_count = 0
+        self.last_pass_duration = 0
+        # directory path: {file name: signature}
+        self.snapshots = dict()
+        # directory path: entry names of last pass
+        self.listings = dict()
+        self._lock = Lock()
+        self._stop = Event()
+        self.thread = Thread(target=self._poll)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add_path(self, file_path):
+        """ Poll file_path, nodes without file path ('.') and directories
+        are skipped
+        """
+        file_path = os.path.normpath(file_path)
+        if file_path == '.' or os.path.isdir(file_path):
+            return
+
+        dir_path, name = os.path.split(file_path)
+        with self._lock:
+            snapshot = self.snapshots.setdefault(dir_path, dict())
+            if name not in snapshot:
+                snapshot[name] = get_file_signature(file_path)
+
+    def remove_all(self):
+        with self._lock:
+            self.snapshots.clear()
+            self.listings.clear()
+
+    def close(self):
+        self._stop.set()
+        self.thread.join()
+
+    def _poll(self):
+        while not self._stop.wait(self.current_interval):
+            start = time()
+            with self._lock:
+                dir_paths = self.snapshots.keys()
+
+            has_changed = False
+            for i in xrange(0, len(dir_paths), self.batch_size):
+                batch_start = time()
+                for dir_path in dir_paths[i:i + self.batch_size]:
+                    has_changed |= self._scan(dir_path)
+
+                # sleep to stay in cpu budget
+                busy = time() - batch_start
+                if self._stop.wait(
+                        busy * (1 - self.cpu_budget) / self.cpu_budget):
+                    return
+
+            if has_changed:
+                self.current_interval = self.interval
+            else:
+                self.current_interval = min(
+                    self.current_interval * 2, self.max_interval)
+            self.pass_count += 1
+            self.last_pass_duration = time() - start
+
+    def _scan(self, dir_path):
+        """ Compare dir_path files with snapshot, return True if changed """
+        with self._lock:
+            snapshot = self.snapshots.get(dir_path)
+            if snapshot is None:
+                return False
+            names = set(snapshot)
+
+        signatures, entry_names = scan_directory(dir_path, names)
+        changed_names = []
+        with self._lock:
+            # skip directories removed during scan
+            if self.snapshots.get(dir_path) is not snapshot:
+                return False
+            for name in names:
+                signature = signatures.get(name)
+                if name in snapshot and snapshot[name] != signature:
+                    snapshot[name] = signature
+                    changed_names.append(name)
+            # first pass only records entries
+            old_entry_names = self.listings.get(dir_path, entry_names)
+            self.listings[dir_path] = entry_names
+
+        for name in changed_names:
+            self.callback(os.path.join(dir_path, name))
+        is_listing_changed = entry_names != old_entry_names
+        if is_listing_changed and self.directory_callback is not None:
+            self.directory_callback(dir_path)
+
+        return bool(changed_names) or is_listing_changed
+
+
+class MTTWatchManager(QObject):
+    """ Texture file watches with bounded watch usage
+
+    Files are watched one by one until file_limit watches are used. Qt
+    directory watches don't report files rewritten in place, so files added
+    after that are followed by inotify directory watches when available and
+    by polling otherwise. With the optional inotify backend, only
+    directories are watched and events are filtered back to tracked files.
+    """
+
+    fileChanged = Signal(str)
+    directoryChanged = Signal(str)
+    _threadEvent = Signal(str)
+    _threadDirectoryEvent = Signal(str)
+
+    def __init__(self, file_limit=4096, use_inotify=False, polling=None,
+                 overflow_polling=None, parent=None):
+        """
+        :param file_limit: (int) maximum file watches before following files
+                           through their directory
+        :param use_inotify: (bool) use native inotify backend if available
+        :param polling: (dict) MTTPollingReader keyword arguments, polling
+                        replaces file system notifications when set
+        :param overflow_polling: (dict) MTTPollingReader keyword arguments
+                                 used for files past file_limit when inotify
+                                 is unavailable
+        """
+        super(MTTWatchManager, self).__init__(parent)
+        self.file_limit = file_limit
+        self.overflow_polling = overflow_polling or dict()
+        # directory path: set of tracked file paths
+        self.tracked_files = dict()
+        self.watched_files = set()
+        # directories with an event queued to GUI thread
+        self._pending_dirs = set()
+        self._lock = Lock()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.fileChanged.emit)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+
+        # events of reader threads are queued to GUI thread
+        self._threadEvent.connect(self.fileChanged.emit, Qt.QueuedConnection)
+        self._threadDirectoryEvent.connect(
+            self._on_thread_directory_event, Qt.QueuedConnection)
+
+        self.poller = None
+        if polling is not None:
+            self.poller = MTTPollingReader(
+                self._threadEvent.emit, self._queue_directory_event,
+                **polling)
+        # polls files past file_limit, created when first needed
+        self.overflow_poller = None
+
+        self.inotify = None
+        if use_inotify and self.poller is None:
+            try:
+                self.inotify = MTTInotifyReader(self._filter_inotify_event)
+            except (OSError, AttributeError), e:
+                mtt_log('Native file watch unavailable : %s' % e,
+                        msg_type='warning', verbose=False)
+
+    def add_path(self, file_path):
+        """ Watch file_path, or its directory when file doesn't exist """
+        file_path = os.path.normpath(file_path)
+        # nodes without file path are stored as '.'
+        if file_path == '.':
+            return
+        if self.poller is not None:
+            # network shares may be temporarily unavailable, directories are
+            # skipped by poller
+            self.poller.add_path(file_path)
+            return
+
+        if os.path.isdir(file_path):
+            return
+
+        dir_path = os.path.dirname(file_path)
+        if not os.path.isdir(dir_path):
+            return
+        self.tracked_files.setdefault(dir_path, set()).add(file_path)
+
+        if self.inotify is not None and self.inotify.add_watch(dir_path):
+            return
+
+        if not os.path.isfile(file_path):
+            self.watcher.addPath(dir_path)
+        elif file_path in self.watched_files \
+                or len(self.watched_files) < self.file_limit:
+            self.watched_files.add(file_path)
+            self.watcher.addPath(file_path)
+        else:
+            self._add_overflow_path(file_path, dir_path)
+
+    def _add_overflow_path(self, file_path, dir_path):
+        """ Follow file_path once file watches are used up
+
+        inotify is tried first as it reports writes of directory entries,
+        polling is used if inotify is unavailable or out of watches. Qt
+        still watches the directory for created and deleted entries.
+        """
+        if self.inotify is None and self.overflow_poller is None:
+            try:
+                self.inotify = MTTInotifyReader(self._filter_inotify_event)
+            except (OSError, AttributeError):
+                pass
+        if self.inotify is not None and self.inotify.add_watch(dir_path):
+            return
+
+        if self.overflow_poller is None:
+            self.overflow_poller = MTTPollingReader(
+                self._threadEvent.emit, **self.overflow_polling)
+            mtt_log('More than %d texture files, files past the limit are '
+                    'polled' % self.file_limit, verbose=False)
+        self.overflow_poller.add_path(file_path)
+        self.watcher.addPath(dir_path)
+
+    def remove_all(self):
+        self.watcher.removePaths(self.watcher.files())
+        self.watcher.removePaths(self.watcher.directories())
+        if self.inotify is not None:
+            self.inotify.remove_all()
+        if self.poller is not None:
+            self.poller.remove_all()
+        if self.overflow_poller is not None:
+            self.overflow_poller.remove_all()
+        self.tracked_files.clear()
+        self.watched_files.clear()
+
+    def close(self):
+        self.remove_all()
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+        if self.poller is not None:
+            self.poller.close()
+            self.poller = None
+        if self.overflow_poller is not None:
+            self.overflow_poller.close()
+            self.overflow_poller = None
+
+    def get_watch_count(self):
+        """ Return number of file and directory watches in use """
+        count = len(self.watcher.files()) + len(self.watcher.directories())
+        if self.inotify is not None:
+            count += len(self.inotify.dir_watches)
+        return count
+
+    def get_tracked_count(self):
+        """ Return number of tracked files """
+        if self.poller is not None:
+            return sum([
+                len(files) for files in self.poller.snapshots.values()])
+        return sum([len(files) for files in self.tracked_files.itervalues()])
+
+    def get_backend_name(self):
+        if self.poller is not None:
+            return 'polling every %.1fs, last pass %.3fs' % (
+                self.poller.current_interval, self.poller.last_pass_duration)
+        backend_names = ['Qt']
+        if self.inotify is not None:
+            backend_names.append('inotify')
+        if self.overflow_poller is not None:
+            backend_names.append('polling past %d files' % self.file_limit)
+        return ' + '.join(backend_names)
+
+    def on_directory_changed(self, dir_path):
+        self.directoryChanged.emit(os.path.normpath(dir_path))
+
+    def _queue_directory_event(self, dir_path):
+        """ Called from reader threads, a burst of entry events of the same
+        directory is delivered once
+        """
+        with self._lock:
+            if dir_path in self._pending_dirs:
+                return
+            self._pending_dirs.add(dir_path)
+        self._threadDirectoryEvent.emit(dir_path)
+
+    def _on_thread_directory_event(self, dir_path):
+        with self._lock:
+            self._pending_dirs.discard(dir_path)
+        self.on_directory_changed(dir_path)
+
+    def _filter_inotify_event(self, dir_path, name, mask):
+        """ Called from inotify reader thread, forward tracked files and
+        entry changes of tracked directories
+        """
+        if isinstance(dir_path, unicode):
+            name = name.decode(sys.getfilesystemencoding(), 'replace')
+        file_path = os.path.join(dir_path, name)
+        if file_path in self.tracked_files.get(dir_path, ()):
+            self._threadEvent.emit(file_path)
+        if mask & ENTRY_MASK:
+            self._queue_directory_event(dir_path)